@@ -1,5 +1,18 @@
 from .config import settings
-from .security import verify_password, get_password_hash, create_access_token
-from .deps import get_current_user, get_current_user_optional
+from .security import (
+    verify_password, get_password_hash, create_access_token,
+    get_password_hash_async, verify_and_update_password_async, PasswordHasherBusy
+)
+from .deps import (
+    get_current_user, get_current_user_optional,
+    get_current_user_async, get_current_user_optional_async,
+    invalidate_user_cache
+)
 
-__all__ = ["settings", "verify_password", "get_password_hash", "create_access_token", "get_current_user", "get_current_user_optional"]
+__all__ = [
+    "settings", "verify_password", "get_password_hash", "create_access_token",
+    "get_password_hash_async", "verify_and_update_password_async", "PasswordHasherBusy",
+    "get_current_user", "get_current_user_optional",
+    "get_current_user_async", "get_current_user_optional_async",
+    "invalidate_user_cache"
+]
@@ -0,0 +1,184 @@
+"""
+回應壓縮 - 依 Accept-Encoding 協商 zstd / br / gzip，小於門檻的回應不壓縮
+
+- gzip 使用標準庫；br 需要 brotli 套件、zstd 需要 zstandard 套件，未安裝時不提供
+- 只壓縮文字類型（JSON、NDJSON、文字）；已有 Content-Encoding 的回應不處理
+- 串流回應（NDJSON）逐段壓縮並 flush，客戶端可以即時解壓；SSE 不壓縮，避免事件被緩衝
+- 壓縮後的強 ETag 改為弱 ETag（內容編碼不同，位元組也不同），If-None-Match 以弱比對驗證
+"""
+import zlib
+from typing import Callable, Dict, List, Optional
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard 為選用
+    zstandard = None
+
+# 會壓縮的回應類型（前綴比對）
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/plain", "text/html", "text/csv",
+                      "text/markdown", "application/javascript", "text/css", "image/svg+xml")
+
+class _Encoder:
+    """一種內容編碼的串流壓縮器：compress 回傳目前可送出的資料（含 flush），finish 回傳結尾"""
+
+    def __init__(self, compress: Callable[[bytes], bytes], flush: Callable[[], bytes], finish: Callable[[], bytes]):
+        self._compress = compress
+        self._flush = flush
+        self._finish = finish
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data) + self._flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compress(data) + self._finish()
+
+def _gzip_encoder() -> _Encoder:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31：gzip 格式
+    return _Encoder(compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush)
+
+def _brotli_encoder() -> _Encoder:
+    compressor = brotli.Compressor(quality=4)
+    return _Encoder(compressor.process, compressor.flush, compressor.finish)
+
+def _zstd_encoder() -> _Encoder:
+    compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    return _Encoder(
+        compressor.compress,
+        lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush
+    )
+
+def available_encoders() -> Dict[str, Callable[[], _Encoder]]:
+    """目前環境可用的內容編碼"""
+    encoders = {"gzip": _gzip_encoder}
+    if brotli is not None:
+        encoders["br"] = _brotli_encoder
+    if zstandard is not None:
+        encoders["zstd"] = _zstd_encoder
+    return encoders
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 為 {編碼: q 值}"""
+    accepted = {}
+    for item in value.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[parts[0].lower()] = quality
+    return accepted
+
+def choose_encoding(accept_encoding: str, preferred: List[str]) -> Optional[str]:
+    """依伺服器的偏好順序選擇客戶端接受（q > 0）的編碼；都不接受時回傳 None"""
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in preferred:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["etag"] = "W/" + etag
+
+class CompressionMiddleware:
+    """依 Accept-Encoding 壓縮回應（ASGI middleware）
+
+    Args:
+        encodings: 伺服器偏好的編碼順序，未安裝對應套件的編碼會被略過
+        minimum_size: 小於此位元組數的回應不壓縮（串流回應一律壓縮）
+    """
+
+    def __init__(self, app, encodings: List[str], minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.encoders = available_encoders()
+        self.encodings = [encoding for encoding in encodings if encoding in self.encoders]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding, self.encoders[encoding], self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+class _CompressionResponder:
+    """暫存回應的開頭，看到第一段本文後決定是否壓縮"""
+
+    def __init__(self, send, encoding: str, encoder_factory: Callable[[], _Encoder], minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.encoder_factory = encoder_factory
+        self.minimum_size = minimum_size
+        self.start_message: Optional[dict] = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    async def send(self, message: dict) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            if not self._should_compress(body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+            self.encoder = self.encoder_factory()
+            headers = MutableHeaders(raw=list(self.start_message["headers"]))
+            headers["content-encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            _weaken_etag(headers)
+            if more_body:
+                del headers["content-length"]
+                body = self.encoder.compress(body)
+            else:
+                body = self.encoder.finish(body)
+                headers["content-length"] = str(len(body))
+            await self._send({**self.start_message, "headers": headers.raw})
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+
+        body = self.encoder.compress(body) if more_body else self.encoder.finish(body)
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.start_message["headers"])
+        if "content-encoding" in headers or self.start_message["status"] in (204, 304):
+            return False
+        content_type = headers.get("content-type", "").lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        # 串流回應無法預先得知大小，一律壓縮
+        return more_body or len(body) >= self.minimum_size
+
+def parse_encodings(value: str) -> List[str]:
+    """COMPRESSION_ENCODINGS 設定（逗號分隔）轉為列表"""
+    return [encoding.strip().lower() for encoding in value.split(",") if encoding.strip()]
@@ -13,8 +13,66 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7天
 
+    # 密碼雜湊設定（調整 BCRYPT_ROUNDS 後，舊密碼會在下次登入時自動重新雜湊）
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt 程序池大小，0 表示改用執行緒
+    PASSWORD_HASH_MAX_PENDING: int = 32  # 超過此排隊數量時回傳 429
+
+    # 認證快取（token -> 用戶），TTL 設為 0 可停用
+    AUTH_CACHE_TTL_SECONDS: int = 300
+    AUTH_CACHE_MAX_SIZE: int = 10000
+
     # 資料庫設定
     DATABASE_URL: str = "sqlite:///./notes.db"
+    # 啟動時以 create_all 建立資料表（只用於開發與測試；正式環境請執行 alembic upgrade head）
+    DB_AUTO_CREATE: bool = False
+
+    # 非同步資料庫：啟用後改用 async 路由處理主要端點（需安裝 aiosqlite 或 asyncpg）
+    ASYNC_DB: bool = False
+    ASYNC_DATABASE_URL: str = ""  # 未設定時由 DATABASE_URL 推導
+
+    # 連線池設定
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # 等待可用連線的秒數
+    DB_POOL_RECYCLE: int = 1800  # 連線使用超過此秒數後重建，避免閒置斷線
+    DB_POOL_PRE_PING: bool = True  # 取出連線前先檢查是否仍可用
+
+    # SQLite 連線設定
+    SQLITE_WAL: bool = True  # WAL 模式 + synchronous=NORMAL
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+
+    # 搜尋設定
+    SEARCH_FULL_TEXT: bool = True  # 使用全文索引（SQLite FTS5 / PostgreSQL tsvector），關閉則使用 ILIKE
+    SEARCH_RESULT_LIMIT: int = 50
+
+    # 公開列表（GET /notes/、/collections/ 第一頁）回應快取，寫入時失效，TTL 設為 0 可停用
+    FEED_CACHE_TTL_SECONDS: int = 30
+    FEED_CACHE_MAX_ENTRIES: int = 256
+    FEED_CACHE_REDIS_URL: str = ""  # 設定時改存在 Redis 相容服務，多個 worker 共用（需安裝 redis）
+
+    # 請求效能量測：各路由的延遲、SQL 語句數與時間、回應大小（Prometheus 格式的 /metrics）
+    METRICS_ENABLED: bool = True
+    SERVER_TIMING_HEADER: bool = True  # 在回應加上 Server-Timing 標頭（db/hash/ai/app 的分項時間）
+
+    # 慢查詢記錄：超過門檻的 SQL 語句依指紋彙總（GET /metrics/slow-queries），0 表示停用
+    SLOW_QUERY_THRESHOLD_MS: float = 0
+    SLOW_QUERY_EXPLAIN: bool = False  # 擷取執行計畫（PostgreSQL 的唯讀 SELECT 會以 EXPLAIN ANALYZE 再執行一次）
+    SLOW_QUERY_MAX_FINGERPRINTS: int = 200
+
+    # 回應壓縮：依偏好順序協商（br 需安裝 brotli、zstd 需安裝 zstandard），空字串表示停用
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # 小於此位元組數的回應不壓縮
+
+    # 筆記內容儲存：超過門檻的內容壓縮後存放（zlib / zstd），空字串表示不壓縮
+    # zstd 壓縮的內容只有安裝 zstandard 的行程能讀取，所有讀取資料庫的行程都需安裝才能使用
+    NOTE_CONTENT_COMPRESSION: str = "zlib"
+    NOTE_CONTENT_COMPRESSION_MIN_BYTES: int = 4096
+
+    # 合集批次添加／移除筆記的數量上限
+    COLLECTION_BATCH_MAX_NOTES: int = 500
 
     # CORS設定
     BACKEND_CORS_ORIGINS: Union[List[str], str] = '["http://localhost:5173", "http://localhost:3000"]'
@@ -22,6 +80,27 @@ class Settings(BaseSettings):
     # Google Gemini API 設定
     GOOGLE_API_KEY: str = ""  # 從環境變數讀取或直接設定
 
+    # AI 模型提供者：gemini / fake（本機假模型，用於壓力測試，不需網路與 API 金鑰）
+    AI_PROVIDER: str = "gemini"
+    FAKE_AI_LATENCY_SECONDS: float = 0.5  # 每次呼叫輸出第一段文字前的延遲
+    FAKE_AI_TOKENS_PER_SECOND: float = 200.0  # 輸出速度，0 表示立即輸出
+    FAKE_AI_FAILURE_RATE: float = 0.0  # 呼叫失敗的機率
+    FAKE_AI_SEED: int = 0  # 失敗判定的亂數種子
+    GEMINI_CLIENT_POOL_SIZE: int = 32  # 保留連線的 API 金鑰數量上限，超過時淘汰最久未使用的
+
+    # AI 整合背景工作
+    INTEGRATION_JOB_STORE: str = "database"  # database / memory
+    INTEGRATION_WORKERS: int = 4  # 同時執行的整合工作數
+    INTEGRATION_MAX_PENDING: int = 64  # 超過此排隊數量時回傳 429
+    INTEGRATION_MAX_RETRIES: int = 2  # API 錯誤時的重試次數
+    INTEGRATION_RETRY_BACKOFF_SECONDS: float = 2.0  # 第一次重試前的等待秒數，之後加倍
+    INTEGRATION_RESULT_TTL_SECONDS: int = 24 * 60 * 60  # 已結束工作的保存時間
+    INTEGRATION_JOB_STALE_SECONDS: int = 600  # 執行中的工作超過此秒數沒有心跳（或其他行程排入的工作未開始）即視為中斷
+    INTEGRATION_CACHE_MAX_ENTRIES: int = 1000  # 整合結果快取的項目上限，0 表示停用
+    INTEGRATION_CHUNK_TOKENS: int = 30000  # 單次呼叫的筆記 token 預算，超過時分區塊 map-reduce
+    INTEGRATION_MAP_CONCURRENCY: int = 4  # map 階段同時呼叫模型的數量（全行程共用）
+    INTEGRATION_PARTIAL_MAX_ENTRIES: int = 10000  # 保存的區塊整理結果上限（增量整合），0 表示停用
+
     @field_validator('BACKEND_CORS_ORIGINS', mode='before')
     @classmethod
     def parse_cors_origins(cls, v):
@@ -1,14 +1,95 @@
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from typing import Optional
-from ..database import get_db
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from typing import Optional, Tuple
+from ..database import get_db, get_async_db
 from ..models import User
+from .cache import TTLCache
+from .config import settings
+from .metrics import register_collector
 from .security import decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
+# token -> 已驗證用戶的快照（以 user id 為 tag，方便用戶變更時失效）
+# 快取為行程內，多個 worker 之間不共享，失效最長延遲為 TTL
+user_cache = TTLCache(maxsize=settings.AUTH_CACHE_MAX_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+register_collector("auth_cache", user_cache.stats)
+
+def _snapshot_user(user: User) -> User:
+    """建立不屬於任何 session 的用戶快照，供快取跨請求使用"""
+    snapshot = User(**{
+        attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+    })
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def _decode_username(token: str) -> Tuple[Optional[str], Optional[dict]]:
+    """解碼 token，回傳 (username, payload)；無效時 username 為 None"""
+    payload = decode_access_token(token)
+    if payload is None:
+        return None, None
+
+    return payload.get("sub"), payload
+
+def _remember_user(token: str, payload: dict, user: User) -> None:
+    """快取 token 對應的用戶，直到 TTL 或 token 到期"""
+    ttl = settings.AUTH_CACHE_TTL_SECONDS
+    expire = payload.get("exp")
+    if expire is not None:
+        ttl = min(ttl, expire - time.time())
+    if ttl > 0:
+        user_cache.set(token, _snapshot_user(user), ttl=ttl, tag=user.id)
+
+def _resolve_user(db: Session, token: str) -> Optional[User]:
+    """解析 token 並取得用戶；結果會快取直到 TTL 或 token 到期"""
+    cached = user_cache.get(token)
+    if cached is not None:
+        # load=False：直接把快照放進 session，不再查詢資料庫
+        return db.merge(cached, load=False)
+
+    username, payload = _decode_username(token)
+    if username is None:
+        return None
+
+    user = db.query(User).filter(User.username == username).first()
+    if user is None:
+        return None
+
+    _remember_user(token, payload, user)
+    return user
+
+async def _resolve_user_async(db: AsyncSession, token: str) -> Optional[User]:
+    """_resolve_user 的非同步版本"""
+    cached = user_cache.get(token)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+
+    username, payload = _decode_username(token)
+    if username is None:
+        return None
+
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
+    if user is None:
+        return None
+
+    _remember_user(token, payload, user)
+    return user
+
+def invalidate_user_cache(user_id: int) -> int:
+    """移除某用戶所有已快取的 token，回傳移除數量"""
+    return user_cache.invalidate_tag(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user_cache(target.id)
+
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
@@ -20,15 +101,7 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    payload = decode_access_token(token)
-    if payload is None:
-        raise credentials_exception
-
-    username: str = payload.get("sub")
-    if username is None:
-        raise credentials_exception
-
-    user = db.query(User).filter(User.username == username).first()
+    user = _resolve_user(db, token)
     if user is None:
         raise credentials_exception
 
@@ -42,13 +115,29 @@ def get_current_user_optional(
     if token is None:
         return None
 
-    payload = decode_access_token(token)
-    if payload is None:
-        return None
+    return _resolve_user(db, token)
 
-    username: str = payload.get("sub")
-    if username is None:
-        return None
+async def get_current_user_async(
+    db: AsyncSession = Depends(get_async_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    """獲取當前登入用戶（非同步路由使用）"""
+    user = await _resolve_user_async(db, token)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="無法驗證憑證",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
-    user = db.query(User).filter(User.username == username).first()
     return user
+
+async def get_current_user_optional_async(
+    db: AsyncSession = Depends(get_async_db),
+    token: Optional[str] = Depends(oauth2_scheme_optional)
+) -> Optional[User]:
+    """獲取當前登入用戶（可選，非同步路由使用）"""
+    if token is None:
+        return None
+
+    return await _resolve_user_async(db, token)
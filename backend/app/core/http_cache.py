@@ -0,0 +1,90 @@
+"""
+HTTP 條件式請求 - 以 ETag / Last-Modified 驗證客戶端的快取，未變更時回傳 304
+
+端點先以不含大型欄位（筆記內容）的查詢取得資源的版本資訊，
+客戶端快取仍有效時直接回傳 304，不載入內容也不序列化回應。
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request, Response, status
+from .config import settings
+
+# 公開資源可由共用快取保存；兩者都要求使用前先向伺服器驗證（304 時不需重新下載）
+PUBLIC_CACHE_CONTROL = "public, no-cache"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """由資源的版本資訊（id、updated_at 等）產生強 ETag
+
+    包含 API 版本，回應格式改變後客戶端不會沿用舊的快取。
+    """
+    digest = hashlib.sha256(repr((settings.VERSION,) + parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+def _to_utc(value: datetime) -> datetime:
+    """資料庫的時間為 naive UTC；HTTP 日期只精確到秒"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+class CacheValidators:
+    """一個回應的快取驗證資訊
+
+    Args:
+        etag: make_etag 產生的 ETag
+        last_modified: 資源最後修改時間；只在任何變更都會使它遞增時提供
+        public: 是否為公開資源（決定 Cache-Control）
+    """
+
+    def __init__(self, etag: str, last_modified: Optional[datetime] = None, public: bool = True):
+        self.etag = etag
+        self.last_modified = _to_utc(last_modified) if last_modified else None
+        self.public = public
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": PUBLIC_CACHE_CONTROL if self.public else PRIVATE_CACHE_CONTROL,
+            # 私密資源與合集內可見的筆記依登入用戶而不同
+            "Vary": "Authorization",
+        }
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """客戶端的快取是否仍然有效
+
+        有 If-None-Match 時只比對 ETag（RFC 9110），否則比對 If-Modified-Since。
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            # If-None-Match 使用弱比對：W/ 前綴不影響結果
+            return "*" in tags or self.etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since is not None and self.last_modified <= _to_utc(since)
+
+        return False
+
+def check_not_modified(request: Request, response: Response, validators: CacheValidators) -> Optional[Response]:
+    """客戶端快取仍有效時回傳 304 回應；否則在 response 上設定驗證標頭並回傳 None
+
+    用法:
+        not_modified = check_not_modified(request, response, validators)
+        if not_modified:
+            return not_modified
+    """
+    if validators.matches(request):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators.headers())
+
+    response.headers.update(validators.headers())
+    return None
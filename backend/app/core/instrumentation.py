@@ -0,0 +1,185 @@
+"""
+請求效能量測 - 記錄每個請求的延遲、SQL 語句數與資料庫時間、密碼雜湊與 AI 呼叫時間、回應大小
+
+- 各路由（路徑樣板）的直方圖輸出於 Prometheus 格式的 /metrics
+- 同一請求的分項時間以 Server-Timing 標頭回傳（瀏覽器開發者工具可直接顯示）：
+  db（SQL 語句數與時間）、hash（bcrypt）、ai（模型呼叫）、app（收到請求到開始回應的總時間）；
+  app 減去其他項目即為路由本身的處理與序列化時間
+- 串流回應在開始回應之後的資料庫與 AI 時間不會出現在標頭中，但仍計入直方圖
+"""
+import time
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from sqlalchemy import event
+from .metrics import histogram
+
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_DURATION = histogram(
+    "http_request_duration_seconds", "請求處理時間（到回應完成）", ("method", "route", "status")
+)
+REQUEST_DB_STATEMENTS = histogram(
+    "http_request_db_statements", "每個請求送出的 SQL 語句數", ("method", "route"), _STATEMENT_BUCKETS
+)
+REQUEST_DB_DURATION = histogram(
+    "http_request_db_duration_seconds", "每個請求執行 SQL 的總時間", ("method", "route")
+)
+RESPONSE_SIZE = histogram(
+    "http_response_size_bytes", "回應本文大小（位元組）", ("method", "route"), _SIZE_BUCKETS
+)
+PASSWORD_HASH_DURATION = histogram(
+    "password_hash_duration_seconds", "密碼雜湊（含排隊）的時間", ("operation",)
+)
+AI_CALL_DURATION = histogram(
+    "ai_call_duration_seconds", "AI 模型呼叫的時間（串流為到輸出結束）", ("provider", "operation", "outcome"),
+    (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+
+# 找不到路由的請求統一使用此標籤，避免任意路徑讓標籤數量無限增加
+UNMATCHED_ROUTE = "unmatched"
+
+class RequestMetrics:
+    """一個請求累計的分項時間（秒）"""
+
+    __slots__ = ("scope", "db_statements", "db_seconds", "hash_seconds", "ai_seconds")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.ai_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """「方法 路徑樣板」，例如 GET /api/v1/notes/{note_id}；路由比對完成前為 unmatched"""
+        if self.scope is None:
+            return UNMATCHED_ROUTE
+        return f"{self.scope['method']} {route_template(self.scope)}"
+
+    def server_timing(self, total_seconds: float) -> str:
+        parts = [f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_statements} queries"']
+        if self.hash_seconds:
+            parts.append(f"hash;dur={self.hash_seconds * 1000:.1f}")
+        if self.ai_seconds:
+            parts.append(f"ai;dur={self.ai_seconds * 1000:.1f}")
+        parts.append(f"app;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+# 目前請求的量測；同步路由在執行緒池中執行時沿用請求的 context，
+# 背景工作（整合工作池等）沒有請求，只記錄到直方圖
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+def current_request_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+# 應用 -> {endpoint: 路徑樣板}；第一次查詢時由路由表建立
+_route_paths: "weakref.WeakKeyDictionary[object, Dict[object, str]]" = weakref.WeakKeyDictionary()
+
+def route_template(scope) -> str:
+    """路由比對後 scope 中的 endpoint 對應的路徑樣板（/api/v1/notes/{note_id}）"""
+    endpoint = scope.get("endpoint")
+    app = scope.get("app")
+    if endpoint is None or app is None:
+        return UNMATCHED_ROUTE
+    paths = _route_paths.get(app)
+    if paths is None:
+        paths = _route_paths[app] = {
+            route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")
+        }
+    return paths.get(endpoint, UNMATCHED_ROUTE)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.db_statements += 1
+        metrics.db_seconds += time.perf_counter() - started
+
+def _handle_error(exception_context):
+    # 語句失敗時不會觸發 after_cursor_execute，移除對應的開始時間
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+def instrument_engine(engine) -> None:
+    """以引擎事件計算每個請求的 SQL 語句數與時間（非同步引擎傳入 sync_engine）"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def record_password_hash(operation: str, seconds: float) -> None:
+    PASSWORD_HASH_DURATION.observe(seconds, operation)
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.hash_seconds += seconds
+
+@contextmanager
+def observe_ai_call(provider: str, operation: str) -> Iterator[None]:
+    """記錄區塊內 AI 呼叫的時間與結果（成功／失敗）"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        AI_CALL_DURATION.observe(elapsed, provider, operation, outcome)
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.ai_seconds += elapsed
+
+def observe_ai_stream(provider: str, chunks: Iterator[str]) -> Iterator[str]:
+    """逐段轉送串流輸出，記錄從開始到輸出結束的時間"""
+    with observe_ai_call(provider, "stream"):
+        yield from chunks
+
+class InstrumentationMiddleware:
+    """量測每個請求並在回應加上 Server-Timing 標頭（ASGI middleware，不緩衝串流回應）"""
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = RequestMetrics(scope)
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((
+                        b"server-timing",
+                        metrics.server_timing(time.perf_counter() - started).encode("latin-1")
+                    ))
+                    message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = route_template(scope)
+            method = scope["method"]
+            REQUEST_DURATION.observe(time.perf_counter() - started, method, route, status_code)
+            REQUEST_DB_STATEMENTS.observe(metrics.db_statements, method, route)
+            REQUEST_DB_DURATION.observe(metrics.db_seconds, method, route)
+            RESPONSE_SIZE.observe(response_size, method, route)
@@ -0,0 +1,127 @@
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# 各元件註冊的統計收集函式（名稱 -> 回傳統計 dict 的函式）
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def register_collector(name: str, collector: Callable[[], Dict[str, Any]]) -> None:
+    """註冊統計收集函式，同名會覆蓋"""
+    _collectors[name] = collector
+
+def collect_metrics() -> Dict[str, Dict[str, Any]]:
+    """收集所有已註冊元件的統計"""
+    return {name: collector() for name, collector in _collectors.items()}
+
+# Prometheus 文字格式（text/plain; version=0.0.4）
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 延遲（秒）的預設分界
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_INVALID_NAME_RE = re.compile(r"[^a-zA-Z0-9_]")
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """依標籤分組的直方圖（累計分布），以 Prometheus 格式輸出
+
+    Args:
+        name: 指標名稱
+        documentation: 說明（# HELP）
+        labelnames: 標籤名稱，observe 時依序提供
+        buckets: 由小到大的分界，自動加上 +Inf
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 標籤值 -> [各分界的次數..., 總和]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        key = tuple(str(label) for label in labelvalues)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-1] += value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, float]]:
+        """各標籤組合的次數與總和"""
+        with self._lock:
+            return {key: {"count": sum(series[:-1]), "sum": series[-1]} for key, series in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in series_items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series[:-1]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+_histograms: Dict[str, Histogram] = {}
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str],
+    buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    """建立（或取得同名的）直方圖，輸出於 Prometheus 格式的 /metrics"""
+    if name not in _histograms:
+        _histograms[name] = Histogram(name, documentation, labelnames, buckets)
+    return _histograms[name]
+
+def _flatten(prefix: str, value: Any, lines: List[str]) -> None:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}_{key}", item, lines)
+    elif isinstance(value, (bool, int, float)):
+        value = int(value) if isinstance(value, bool) else value
+        lines.append(f"{_INVALID_NAME_RE.sub('_', prefix)} {_format_value(value)}")
+
+def render_prometheus() -> str:
+    """以 Prometheus 文字格式輸出直方圖，以及各元件統計中的數值（app_<元件>_<欄位>）"""
+    lines: List[str] = []
+    for name in sorted(_histograms):
+        lines.extend(_histograms[name].render())
+    for name, stats in collect_metrics().items():
+        _flatten(f"app_{name}", stats, lines)
+    return "\n".join(lines) + "\n"
+
+def wants_prometheus(accept: str) -> bool:
+    """Prometheus 抓取時的 Accept 標頭包含 text/plain 或 OpenMetrics；瀏覽器與 curl 預設仍取得 JSON"""
+    accept = (accept or "").lower()
+    return "application/openmetrics-text" in accept or "text/plain" in accept
@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import Select
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """將 (created_at, id) 編碼成不透明的分頁游標"""
+    raw = json.dumps([created_at.isoformat(), item_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+# 游標中的 id 上限（Integer 欄位）；超出範圍的值在資料庫驅動中會溢位
+_MAX_CURSOR_ID = 2 ** 31 - 1
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="無效的分頁游標"
+    )
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解碼分頁游標；格式、型別或範圍不正確時回傳 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(created_at, str) or type(item_id) is not int:
+            raise _invalid_cursor()
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError, OverflowError):
+        raise _invalid_cursor()
+
+    # 游標由 encode_cursor 產生：naive UTC 時間與正整數 id
+    if created_at.tzinfo is not None or not 0 < item_id <= _MAX_CURSOR_ID:
+        raise _invalid_cursor()
+    return created_at, item_id
+
+def apply_cursor(query: Union[Query, Select], model, cursor: Optional[str], limit: int):
+    """在查詢（Query 或 select()）上套用游標條件、排序與 limit
+
+    會多取一筆，交由 finish_page 判斷是否還有下一頁。
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < (created_at, item_id))
+
+    return query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+def finish_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """截取本頁資料並產生下一頁游標"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return rows, next_cursor
+
+def paginate_by_cursor(
+    query: Query,
+    model,
+    cursor: Optional[str],
+    limit: int
+) -> Tuple[List, Optional[str]]:
+    """以 (created_at, id) 做鍵集分頁（由新到舊）
+
+    Args:
+        query: 已套用篩選條件、尚未排序的查詢
+        model: 具有 created_at 與 id 欄位的模型
+        cursor: 上一頁回傳的 next_cursor，空字串或 None 表示第一頁
+        limit: 每頁數量
+
+    Returns:
+        (本頁資料, 下一頁游標；沒有下一頁時為 None)
+    """
+    rows = apply_cursor(query, model, cursor, limit).all()
+    return finish_page(rows, limit)
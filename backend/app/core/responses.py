@@ -0,0 +1,39 @@
+"""
+JSON 回應 - 預設回應類別與列表端點的直接序列化
+
+- 安裝 orjson 時預設回應類別改用 ORJSONResponse，否則使用標準庫 json
+- 回傳大量筆記的端點以 json_response 直接輸出：FastAPI 對 response_model 的端點會先以
+  response_model 重新驗證回傳值、再以 jsonable_encoder 轉成 dict，最後才序列化；
+  json_response 由 pydantic-core 直接把 schema 物件寫成 JSON，省去中間的兩次轉換。
+  端點仍保留 response_model，只用於 API 文件
+"""
+from typing import Any, Dict, Optional
+import pydantic_core
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+
+class ORJSONResponse(JSONResponse):
+    """以 orjson 序列化的 JSON 回應（未安裝 orjson 時與 JSONResponse 相同）"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+def dump_json(content: Any) -> bytes:
+    """序列化回應內容（pydantic 模型、列表、dict 與 datetime 等），格式與 JSONResponse 相同"""
+    return pydantic_core.to_json(content)
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """直接回傳已序列化的 JSON，不經過 response_model 驗證與 jsonable_encoder
+
+    直接回傳 Response 時，注入的 response 參數上設定的標頭不會被帶入，需要由 headers 傳入。
+    """
+    return Response(content=dump_json(content), status_code=status_code, headers=headers, media_type=JSON_MEDIA_TYPE)
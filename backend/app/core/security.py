@@ -1,10 +1,20 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from .config import settings
+from .instrumentation import record_password_hash
+from .metrics import register_collector
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt__rounds 改變時，舊成本的雜湊會被 needs_update 標記，登入時自動重新雜湊
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+class PasswordHasherBusy(Exception):
+    """密碼雜湊工作池已滿"""
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """驗證密碼"""
@@ -14,6 +24,101 @@ def get_password_hash(password: str) -> str:
     """Hash密碼"""
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """驗證密碼；若雜湊成本與目前設定不同，另外回傳新的雜湊"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasher:
+    """在獨立的程序池中執行 bcrypt，避免佔用請求執行緒
+
+    同時執行與排隊中的工作數超過 workers + max_pending 時直接拒絕
+    （PasswordHasherBusy），讓登入尖峰不會拖垮其他端點。
+    workers 為 0 時改用執行緒池（適用無法建立子程序的環境）。
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.capacity = max(workers, 1) + max_pending
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.workers > 0:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=1)
+            return self._executor
+
+    def start(self) -> None:
+        """預先啟動工作程序（於應用啟動時呼叫，避免第一次登入才建立子程序）"""
+        executor = self._get_executor()
+        for future in [executor.submit(int) for _ in range(max(self.workers, 1))]:
+            future.result()
+
+    async def run(self, func, *args):
+        """提交雜湊工作並等待結果；工作池已滿時拋出 PasswordHasherBusy
+
+        等待時間（含排隊）記錄為請求的 hash 分項時間。
+        """
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise PasswordHasherBusy()
+            self.in_flight += 1
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            record_password_hash(func.__name__, time.perf_counter() - started)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """工作池統計（供監控使用）"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
+register_collector("password_hasher", password_hasher.stats)
+
+async def get_password_hash_async(password: str) -> str:
+    """在雜湊工作池中 Hash 密碼"""
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_and_update_password_async(
+    plain_password: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """在雜湊工作池中驗證密碼，並在成本設定改變時回傳新的雜湊"""
+    return await password_hasher.run(verify_and_update_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """創建JWT token"""
     to_encode = data.copy()
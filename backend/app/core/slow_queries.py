@@ -0,0 +1,227 @@
+"""
+慢查詢記錄 - 記錄執行時間超過門檻的 SQL 語句，依正規化後的語句指紋彙總
+
+- 以引擎的 cursor 事件計時；超過 SLOW_QUERY_THRESHOLD_MS 時印出語句、參數與發出請求的路由
+- 同一指紋（數值、字串與 IN 清單替換為 ? 後的語句）累計次數、總時間與最長時間
+- SLOW_QUERY_EXPLAIN 開啟時，每個指紋第一次變慢時在同一連線上擷取執行計畫：
+  SQLite 使用 EXPLAIN QUERY PLAN；PostgreSQL 的唯讀 SELECT 使用 EXPLAIN ANALYZE（會再執行一次查詢），
+  其他語句（含 WITH、SELECT ... FOR UPDATE）只使用 EXPLAIN，不會重複寫入；
+  PostgreSQL 的 EXPLAIN 在 SAVEPOINT 中執行，失敗時不會中止請求的交易
+- 彙總結果由 GET /metrics/slow-queries 查看（不含參數，參數只印在伺服器紀錄中）
+"""
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from .config import settings
+from .instrumentation import current_request_metrics
+from .metrics import register_collector
+
+# 參數與語句在紀錄中保留的長度
+_MAX_PARAMETERS_CHARS = 500
+_MAX_STATEMENT_CHARS = 2000
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%\([^)]*\)s|%s|\$\d+|:\w+|\?")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# EXPLAIN ANALYZE 會實際執行語句：只用於不會寫入或鎖定資料列的 SELECT
+_LOCKING_SELECT_RE = re.compile(r"\bFOR\s+(?:NO\s+KEY\s+)?(?:UPDATE|SHARE|KEY\s+SHARE)\b|\bINTO\b", re.IGNORECASE)
+_EXPLAIN_SAVEPOINT = "slow_query_explain"
+_VALUES_RE = re.compile(r"(VALUES\s*\(\?(?:\.\.\.)?\))(?:\s*,\s*\(\?(?:\.\.\.)?\))+", re.IGNORECASE)
+
+def normalize_statement(statement: str) -> str:
+    """將語句中的常數與參數替換為 ?，合併 IN 清單與多列 VALUES，使相同形狀的查詢得到相同的指紋"""
+    normalized = _WHITESPACE_RE.sub(" ", statement).strip()
+    normalized = _STRING_RE.sub("?", normalized)
+    normalized = _PLACEHOLDER_RE.sub("?", normalized)
+    normalized = _NUMBER_RE.sub("?", normalized)
+    normalized = _IN_LIST_RE.sub("(?...)", normalized)
+    return _VALUES_RE.sub(r"\1...", normalized)
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode("utf-8")).hexdigest()[:16]
+
+def _truncate(value: str, limit: int) -> str:
+    return value if len(value) <= limit else value[:limit] + "…"
+
+def _explain_sql(dialect: str, statement: str) -> Optional[str]:
+    """執行計畫的查詢；不支援的資料庫回傳 None"""
+    if dialect == "sqlite":
+        return "EXPLAIN QUERY PLAN " + statement
+    if dialect == "postgresql":
+        # WITH 可能包含寫入的 CTE（WITH ... DELETE ... RETURNING），只使用 EXPLAIN
+        if statement.lstrip().upper().startswith("SELECT") and not _LOCKING_SELECT_RE.search(statement):
+            return "EXPLAIN (ANALYZE, BUFFERS) " + statement
+        return "EXPLAIN " + statement
+    return None
+
+class SlowQueryLog:
+    """慢查詢記錄與彙總
+
+    Args:
+        threshold_ms: 超過此毫秒數的語句視為慢查詢，0 表示停用
+        explain: 是否擷取執行計畫
+        max_fingerprints: 保留的指紋數量上限，超過時移除累計時間最少的指紋
+    """
+
+    def __init__(self, threshold_ms: float, explain: bool = False, max_fingerprints: int = 200):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.max_fingerprints = max(max_fingerprints, 1)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.slow_statements = 0
+        self.evictions = 0
+        self.explain_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def instrument(self, engine) -> None:
+        """在引擎上註冊計時事件（非同步引擎傳入 sync_engine）"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def remove(self, engine) -> None:
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start_time", []).append(time.perf_counter())
+
+    def _handle_error(self, exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("slow_query_start_time"):
+            connection.info["slow_query_start_time"].pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - conn.info["slow_query_start_time"].pop()) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        metrics = current_request_metrics()
+        route = metrics.route if metrics is not None else None
+        key = fingerprint(statement)
+        with self._lock:
+            needs_plan = self.explain and (key not in self._entries or self._entries[key]["plan"] is None)
+        plan = self._capture_plan(conn, statement, parameters, executemany) if needs_plan else None
+        self.record(key, statement, parameters, duration_ms, route, plan)
+
+    def _capture_plan(self, conn, statement, parameters, executemany) -> Optional[List[str]]:
+        """在同一個 DBAPI 連線上執行 EXPLAIN（不經過引擎，不會觸發事件或被計入請求的查詢數）
+
+        PostgreSQL 的交易中任何錯誤都會使整個交易中止，因此在 SAVEPOINT 中執行並在結束後回復，
+        EXPLAIN 失敗時請求的交易不受影響。
+        """
+        sql = _explain_sql(conn.dialect.name, statement)
+        if sql is None or executemany:
+            return None
+        savepoint = conn.dialect.name == "postgresql"
+        try:
+            cursor = conn.connection.cursor()
+            try:
+                if savepoint:
+                    cursor.execute(f"SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                try:
+                    cursor.execute(sql, parameters)
+                    return [" | ".join(str(column) for column in row) for row in cursor.fetchall()]
+                finally:
+                    if savepoint:
+                        cursor.execute(f"ROLLBACK TO SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+                        cursor.execute(f"RELEASE SAVEPOINT {_EXPLAIN_SAVEPOINT}")
+            finally:
+                cursor.close()
+        except Exception as e:
+            with self._lock:
+                self.explain_errors += 1
+            print(f"警告：擷取慢查詢的執行計畫失敗：{e}")
+            # 記為空的執行計畫，同一指紋之後不再重試
+            return []
+
+    def record(
+        self,
+        key: str,
+        statement: str,
+        parameters: Any,
+        duration_ms: float,
+        route: Optional[str],
+        plan: Optional[List[str]] = None
+    ) -> None:
+        """累計一次慢查詢並印出紀錄"""
+        print(
+            f"警告：慢查詢 {duration_ms:.1f} ms（{route or '非請求'}）[{key}]："
+            f"{_truncate(_WHITESPACE_RE.sub(' ', statement).strip(), _MAX_STATEMENT_CHARS)} "
+            f"參數：{_truncate(repr(parameters), _MAX_PARAMETERS_CHARS)}"
+        )
+        with self._lock:
+            self.slow_statements += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    smallest = min(self._entries, key=lambda k: self._entries[k]["total_ms"])
+                    del self._entries[smallest]
+                    self.evictions += 1
+                entry = self._entries[key] = {
+                    "fingerprint": key,
+                    "statement": _truncate(normalize_statement(statement), _MAX_STATEMENT_CHARS),
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": {},
+                    "plan": None,
+                    "last_seen": None,
+                }
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            route_key = route or "-"
+            entry["routes"][route_key] = entry["routes"].get(route_key, 0) + 1
+            entry["last_seen"] = datetime.utcnow().isoformat(timespec="seconds")
+            if plan is not None:
+                entry["plan"] = plan
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """依累計時間排序的慢查詢指紋"""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: entry["total_ms"], reverse=True)[:limit]
+            return [
+                {
+                    **entry,
+                    "total_ms": round(entry["total_ms"], 3),
+                    "max_ms": round(entry["max_ms"], 3),
+                    "mean_ms": round(entry["total_ms"] / entry["count"], 3),
+                    "routes": dict(entry["routes"]),
+                }
+                for entry in entries
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """慢查詢統計（供監控使用）"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "threshold_ms": self.threshold_ms,
+                "slow_statements": self.slow_statements,
+                "fingerprints": len(self._entries),
+                "evictions": self.evictions,
+                "explain_errors": self.explain_errors,
+            }
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    max_fingerprints=settings.SLOW_QUERY_MAX_FINGERPRINTS
+)
+register_collector("slow_queries", slow_query_log.stats)
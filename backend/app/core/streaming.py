@@ -0,0 +1,56 @@
+import json
+from typing import AsyncIterator, Callable, Iterator, Optional
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from .. import database
+from ..database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+# 串流時每次從資料庫游標取回的筆數
+STREAM_BATCH_SIZE = 100
+
+def ndjson_response(produce: Callable[[Session], Iterator[BaseModel]]) -> StreamingResponse:
+    """以 NDJSON（每行一個 JSON 物件）串流回應
+
+    請求的資料庫 session 在回應送出前就會關閉，因此 produce 會在串流期間
+    取得一個獨立的 session，並應以 yield_per 等方式逐批讀取資料列。
+    """
+    def generate():
+        db = SessionLocal()
+        try:
+            for item in produce(db):
+                yield item.model_dump_json() + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+def async_ndjson_response(produce: Callable[..., AsyncIterator[BaseModel]]) -> StreamingResponse:
+    """ndjson_response 的非同步版本，produce 會取得獨立的 AsyncSession"""
+    async def generate():
+        async with database.AsyncSessionLocal() as db:
+            async for item in produce(db):
+                yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+def sse_event(event: str, data: dict) -> str:
+    """格式化一則 Server-Sent Event（data 為單行 JSON）"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+def sse_response(events: Iterator[str], background: Optional[BackgroundTask] = None) -> StreamingResponse:
+    """以 Server-Sent Events 串流回應
+
+    X-Accel-Buffering 關閉 nginx 等反向代理的緩衝，讓事件即時送達。
+    background 在串流結束（包含客戶端中途斷線）後執行。
+    """
+    return StreamingResponse(
+        events,
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background
+    )
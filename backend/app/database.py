@@ -1,21 +1,142 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import List
+from sqlalchemy import create_engine, event, exc, inspect, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from .core.config import settings
+from .core.instrumentation import instrument_engine
+from .core.metrics import register_collector
+from .core.slow_queries import slow_query_log
 
-# 根據資料庫類型設定 connect_args
-connect_args = {}
-if settings.DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+class _PoolStatsMixin:
+    """記錄連線取得次數、等待時間與逾時次數的連線池"""
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args=connect_args
-)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def stats(self) -> dict:
+        """連線池統計（供監控使用）"""
+        with self._stats_lock:
+            return {
+                "size": self.size(),
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_avg": round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+class InstrumentedQueuePool(_PoolStatsMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_PoolStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and make_url(url).database in (None, "", ":memory:")
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    """依資料庫類型產生 create_engine 參數"""
+    options = {}
+    if _is_sqlite(url) and not is_async:
+        options["connect_args"] = {"check_same_thread": False}
+
+    # 記憶體 SQLite 使用 SQLAlchemy 預設的單連線池
+    if not _is_sqlite_memory(url):
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 連線設定：WAL 讓讀寫可並行，synchronous=NORMAL 減少 fsync"""
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def _instrument(engine, name: str) -> None:
+    """套用 SQLite 連線設定、註冊連線池統計、請求的 SQL 量測與慢查詢記錄"""
+    if engine.dialect.name == "sqlite" and not _is_sqlite_memory(str(engine.url)):
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    if settings.METRICS_ENABLED:
+        instrument_engine(engine)
+    if slow_query_log.enabled:
+        slow_query_log.instrument(engine)
+    if isinstance(engine.pool, _PoolStatsMixin):
+        register_collector(name, lambda: engine.pool.stats())
+
+engine = create_engine(settings.DATABASE_URL, **_engine_options(settings.DATABASE_URL))
+_instrument(engine, "db_pool")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+def add_missing_columns(bind, metadata) -> List[str]:
+    """為既有資料表補上模型新增、可為空的欄位，回傳新增的欄位（table.column）
+
+    只處理 nullable 且沒有 server_default 的欄位；其他結構變更需手動遷移。
+    """
+    added = []
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+
+    with bind.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable or column.server_default is not None:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                ))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
 def get_db():
     """依賴注入:獲取資料庫session"""
     db = SessionLocal()
@@ -23,3 +144,50 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_async_database_url() -> str:
+    """取得非同步資料庫連線字串
+
+    未設定 ASYNC_DATABASE_URL 時由 DATABASE_URL 推導：
+    SQLite 使用 aiosqlite，PostgreSQL 使用 asyncpg。
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+
+    url = settings.DATABASE_URL
+    for prefix, async_prefix in (
+        ("sqlite://", "sqlite+aiosqlite://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+    ):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+# 非同步引擎（ASYNC_DB 啟用時才建立，避免未安裝 aiosqlite/asyncpg 時無法啟動）
+async_engine = None
+AsyncSessionLocal = None
+
+def init_async_engine():
+    """建立非同步引擎與 session factory（重複呼叫時沿用已建立的引擎）"""
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        return async_engine
+
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    async_url = get_async_database_url()
+    async_engine = create_async_engine(async_url, **_engine_options(async_url, is_async=True))
+    _instrument(async_engine.sync_engine, "async_db_pool")
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+    return async_engine
+
+if settings.ASYNC_DB:
+    init_async_engine()
+
+async def get_async_db():
+    """依賴注入:獲取非同步資料庫session"""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,40 +1,153 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import inspect
+from .core.compression import CompressionMiddleware, parse_encodings
 from .core.config import settings
-from .database import engine, Base
-from .routers import auth_router, notes_router, collections_router
+from .core.instrumentation import InstrumentationMiddleware
+from .core.metrics import PROMETHEUS_CONTENT_TYPE, collect_metrics, render_prometheus, wants_prometheus
+from .core.responses import ORJSONResponse
+from .core.security import PasswordHasherBusy, password_hasher
+from .core.slow_queries import slow_query_log
+from .database import engine, Base, add_missing_columns, init_async_engine
+from .routers import (
+    auth_router, notes_router, collections_router, integrations_router,
+    auth_async_router, notes_async_router, collections_async_router
+)
+from .services.integration_jobs import integration_queue
+from .services.search import configure_search, create_search_index, rebuild_search_index
 
-# 創建資料庫表
-Base.metadata.create_all(bind=engine)
+def create_schema():
+    """以 create_all 建立資料表並補建欄位與索引（DB_AUTO_CREATE，只用於開發與測試）
 
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
-)
+    正式環境的資料表結構由 Alembic 遷移管理（alembic upgrade head），
+    應用啟動時不再執行 DDL 與結構檢查。
+    """
+    Base.metadata.create_all(bind=engine)
 
-# CORS設定
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.BACKEND_CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    # 為既有資料表補建新增的欄位與索引（create_all 不會更新已存在的資料表）
+    add_missing_columns(engine, Base.metadata)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                # 例如既有資料違反唯一索引（重複加入合集的筆記）；不自動刪除資料，需手動清理
+                print(f"警告：無法建立索引 {index.name}: {e}")
+
+    # 全文索引（正式環境由遷移 0004 建立）；新建立時寫入既有的筆記
+    with engine.begin() as connection:
+        if not inspect(connection).has_table("notes_fts") and create_search_index(connection):
+            rebuild_search_index(connection)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.DB_AUTO_CREATE:
+        create_schema()
+    # 依 SEARCH_FULL_TEXT 決定是否使用全文索引（只設定狀態，不執行 DDL）
+    configure_search(engine)
+    # 啟動密碼雜湊程序池
+    password_hasher.start()
+    # 啟動 AI 整合工作池
+    integration_queue.start()
+    yield
+    # 關閉密碼雜湊程序池與整合工作池
+    password_hasher.shutdown()
+    integration_queue.shutdown()
+
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    """密碼雜湊工作池已滿：請客戶端稍後重試"""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "目前登入請求過多，請稍後再試"},
+        headers={"Retry-After": "1"}
+    )
+
+def create_app(async_db: bool = None) -> FastAPI:
+    """建立 FastAPI 應用
+
+    Args:
+        async_db: 是否由非同步路由處理主要端點，未提供時使用 ASYNC_DB 設定
+    """
+    if async_db is None:
+        async_db = settings.ASYNC_DB
+    if async_db:
+        init_async_engine()
+
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        version=settings.VERSION,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        lifespan=lifespan,
+        # 安裝 orjson 時以 orjson 序列化回應
+        default_response_class=ORJSONResponse
+    )
+
+    app.add_exception_handler(PasswordHasherBusy, password_hasher_busy_handler)
+
+    # 回應壓縮（在 CORS 之內，CORS 與量測看到的是壓縮後的回應）
+    app.add_middleware(
+        CompressionMiddleware,
+        encodings=parse_encodings(settings.COMPRESSION_ENCODINGS),
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE
+    )
+
+    # CORS設定
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.BACKEND_CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # 讓前端可以讀取各請求的分項時間
+        expose_headers=["Server-Timing"],
+    )
+
+    # 請求效能量測（最後加入的 middleware 在最外層，量測包含 CORS 在內的整個請求）
+    if settings.METRICS_ENABLED:
+        app.add_middleware(InstrumentationMiddleware, server_timing=settings.SERVER_TIMING_HEADER)
+
+    # 路由
+    if async_db:
+        # 非同步路由先註冊、優先匹配；沒有非同步版本的端點仍由下方同步路由處理
+        app.include_router(auth_async_router, prefix=settings.API_V1_STR)
+        app.include_router(notes_async_router, prefix=settings.API_V1_STR)
+        app.include_router(collections_async_router, prefix=settings.API_V1_STR)
+
+    app.include_router(auth_router, prefix=settings.API_V1_STR)
+    app.include_router(notes_router, prefix=settings.API_V1_STR)
+    app.include_router(collections_router, prefix=settings.API_V1_STR)
+    app.include_router(integrations_router, prefix=settings.API_V1_STR)
+
+    @app.get("/")
+    def root():
+        return {
+            "message": "Welcome to Roll Call AI - Note Sharing Platform",
+            "docs": "/docs",
+            "version": settings.VERSION
+        }
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/metrics")
+    def metrics(request: Request, format: str = ""):
+        """各元件的執行統計（快取命中率等）
+
+        Prometheus 抓取（Accept 為 text/plain 或 OpenMetrics）或 ?format=prometheus 時，
+        改以 Prometheus 文字格式回傳各路由的直方圖與各元件統計；其他情況維持 JSON。
+        """
+        if format == "prometheus" or (format != "json" and wants_prometheus(request.headers.get("accept"))):
+            return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
+        return collect_metrics()
+
+    @app.get("/metrics/slow-queries")
+    def slow_queries(limit: int = 20):
+        """依累計時間排序的慢查詢指紋（需設定 SLOW_QUERY_THRESHOLD_MS）"""
+        return {"stats": slow_query_log.stats(), "queries": slow_query_log.top(limit)}
+
+    return app
 
-# 路由
-app.include_router(auth_router, prefix=settings.API_V1_STR)
-app.include_router(notes_router, prefix=settings.API_V1_STR)
-app.include_router(collections_router, prefix=settings.API_V1_STR)
-
-@app.get("/")
-def root():
-    return {
-        "message": "Welcome to Roll Call AI - Note Sharing Platform",
-        "docs": "/docs",
-        "version": settings.VERSION
-    }
-
-@app.get("/health")
-def health_check():
-    return {"status": "healthy"}
+app = create_app()
@@ -1,5 +1,9 @@
 from .user import User
+from .note_content import NoteContent
 from .note import Note
 from .collection import Collection, CollectionNote
+from .integration_job import IntegrationJob
+from .integration_cache import IntegrationCacheEntry, IntegrationPartialSummary
 
-__all__ = ["User", "Note", "Collection", "CollectionNote"]
+__all__ = ["User", "Note", "NoteContent", "Collection", "CollectionNote", "IntegrationJob",
+           "IntegrationCacheEntry", "IntegrationPartialSummary"]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
@@ -21,6 +21,13 @@ class Collection(Base):
     # 關聯到 CollectionNote（合集中的筆記）
     collection_notes = relationship("CollectionNote", back_populates="collection", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # 公開合集列表的游標分頁（is_public + created_at, id）
+        Index("ix_collections_public_created_at_id", "is_public", "created_at", "id"),
+        # 我的合集列表（user_id + created_at, id）
+        Index("ix_collections_user_created_at_id", "user_id", "created_at", "id"),
+    )
+
 
 class CollectionNote(Base):
     __tablename__ = "collection_notes"
@@ -34,3 +41,12 @@ class CollectionNote(Base):
     # 關聯
     collection = relationship("Collection", back_populates="collection_notes")
     note = relationship("Note")
+
+    __table_args__ = (
+        # 合集內筆記依位置排序
+        Index("ix_collection_notes_collection_position", "collection_id", "position"),
+        # 同一筆記在合集中只能出現一次（以唯一索引實作，既有資料表也能補建）
+        Index("uq_collection_notes_collection_note", "collection_id", "note_id", unique=True),
+        # 依筆記反查所屬合集（筆記修改或刪除時清除合集的整合快取）
+        Index("ix_collection_notes_note_id", "note_id"),
+    )
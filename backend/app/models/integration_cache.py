@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
+from datetime import datetime
+from ..database import Base
+
+class IntegrationCacheEntry(Base):
+    """AI 整合結果快取，以筆記內容、提示詞與模型的雜湊為鍵"""
+    __tablename__ = "integration_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 hex
+    collection_id = Column(Integer, ForeignKey("collections.id", ondelete="CASCADE"), nullable=False, index=True)
+    model = Column(String, nullable=False)
+    integrated_content = Column(Text, nullable=False)
+    note_count = Column(Integer, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU 淘汰依據
+
+class IntegrationPartialSummary(Base):
+    """大型合集 map 階段各區塊的整理結果，以區塊內容的雜湊為鍵，供增量整合重用"""
+    __tablename__ = "integration_partials"
+
+    collection_id = Column(Integer, ForeignKey("collections.id", ondelete="CASCADE"), primary_key=True)
+    key = Column(String(64), primary_key=True)  # sha256 hex（模型、提示詞與區塊內容）
+    scope = Column(String(64), nullable=False)  # sha256 hex（模型與提示詞），清除舊區塊時的範圍
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)  # LRU 淘汰依據
+
+    __table_args__ = (
+        Index("ix_integration_partials_collection_scope", "collection_id", "scope"),
+    )
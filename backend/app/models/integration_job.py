@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, JSON
+from datetime import datetime
+from ..database import Base
+
+class IntegrationJob(Base):
+    """AI 整合背景工作（API 金鑰只保留在記憶體中，不寫入資料庫）"""
+    __tablename__ = "integration_jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    collection_id = Column(Integer, ForeignKey("collections.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True)  # 匿名整合公開合集時為空
+    status = Column(String(16), nullable=False, default="queued")  # queued / running / succeeded / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    note_count = Column(Integer, nullable=False, default=0)
+    integrated_content = Column(Text, nullable=True)
+    chunk_count = Column(Integer, nullable=True)  # map-reduce 的區塊數
+    timings = Column(JSON, nullable=True)  # 各階段耗時（毫秒）
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # 清除過期工作時依狀態與更新時間篩選
+        Index("ix_integration_jobs_status_updated_at", "status", "updated_at"),
+    )
@@ -1,14 +1,24 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import (
+    Column, Integer, String, Boolean, DateTime, ForeignKey, Index, delete, event, exists, inspect, select
+)
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import List
 from ..database import Base
+from .note_content import NoteContent, content_hash, load_content, storage_stats, store_contents
+
+# 摘要模式的內容片段長度
+EXCERPT_LENGTH = 200
 
 class Note(Base):
     __tablename__ = "notes"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
-    content = Column(Text, nullable=False)
+    # 內容存於 note_contents（見 note_content.py），這裡只保存雜湊與開頭片段
+    content_hash = Column(String(64), ForeignKey("note_contents.hash"), nullable=False, index=True)
+    excerpt = Column(String, nullable=False, default="")
     file_type = Column(String, default="md")  # md 或 txt
     is_public = Column(Boolean, default=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -17,3 +27,72 @@ class Note(Base):
 
     # 關聯到用戶
     owner = relationship("User", back_populates="notes")
+
+    # 筆記內容，存取 content 時才載入；需要內容的列表查詢以 joinedload(Note.body) 一併讀取
+    body = relationship(NoteContent, lazy="select")
+
+    __table_args__ = (
+        # 公開筆記列表的游標分頁（is_public + created_at, id）
+        Index("ix_notes_public_created_at_id", "is_public", "created_at", "id"),
+        # 我的筆記列表（user_id + created_at, id）
+        Index("ix_notes_user_created_at_id", "user_id", "created_at", "id"),
+    )
+
+    @property
+    def content(self) -> str:
+        # 本次設定或讀取過的內容，雜湊相同時直接使用
+        cached = self.__dict__.get("_content")
+        if cached is not None and cached[0] == self.content_hash:
+            return cached[1]
+        value = self.body.read()
+        self._content = (self.content_hash, value)
+        return value
+
+    @content.setter
+    def content(self, value: str) -> None:
+        # 內容在 flush 時寫入 note_contents（_store_content）
+        self.content_hash = content_hash(value)
+        self.excerpt = value[:EXCERPT_LENGTH]
+        self._content = (self.content_hash, value)
+
+def read_note_content(connection: Connection, note: Note) -> str:
+    """在 flush 事件中取得筆記內容：本次設定過的內容直接使用，否則以同一連線讀取"""
+    cached = note.__dict__.get("_content")
+    if cached is not None and cached[0] == note.content_hash:
+        return cached[1]
+    return load_content(connection, note.content_hash)
+
+def purge_contents(connection: Connection, hashes: List[str]) -> int:
+    """刪除不再被任何筆記引用的內容，回傳刪除的數量"""
+    hashes = sorted({value for value in hashes if value})
+    if not hashes:
+        return 0
+    if connection.dialect.name == "postgresql":
+        # 先鎖定內容列：同時寫入相同內容的交易（store_contents 會更新並鎖定該列）提交後，
+        # 下面的 DELETE 才以新的快照檢查引用，不會刪除剛被新筆記引用的內容
+        connection.execute(
+            select(NoteContent.hash).where(NoteContent.hash.in_(hashes)).order_by(NoteContent.hash).with_for_update()
+        )
+    purged = connection.execute(
+        delete(NoteContent).where(
+            NoteContent.hash.in_(hashes),
+            ~exists().where(Note.content_hash == NoteContent.hash)
+        )
+    ).rowcount
+    storage_stats.record_purge(purged)
+    return purged
+
+@event.listens_for(Note, "before_insert")
+@event.listens_for(Note, "before_update")
+def _store_content(mapper, connection, target):
+    cached = target.__dict__.get("_content")
+    if cached is not None and inspect(target).attrs.content_hash.history.has_changes():
+        store_contents(connection, [cached[1]])
+
+@event.listens_for(Note, "after_update")
+def _purge_replaced_content(mapper, connection, target):
+    purge_contents(connection, list(inspect(target).attrs.content_hash.history.deleted))
+
+@event.listens_for(Note, "after_delete")
+def _purge_deleted_content(mapper, connection, target):
+    purge_contents(connection, [inspect(target).dict.get("content_hash")])
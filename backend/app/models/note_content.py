@@ -0,0 +1,199 @@
+"""
+筆記內容儲存 - 筆記本文存於獨立的 note_contents 資料表，以內容的 sha256 為主鍵
+
+- notes 只保存內容的雜湊與開頭片段，列表、權限檢查等查詢不會讀到完整本文
+- 相同的內容（複製或重複匯入的筆記）共用同一列；不再被任何筆記引用時刪除
+- 超過 NOTE_CONTENT_COMPRESSION_MIN_BYTES 的內容壓縮後存於 data（預設 zlib；zstd 需安裝 zstandard）；
+  較小或壓縮後沒有變小的內容以原文存於 text
+- 只在使用全文索引時壓縮：全文索引停用（SEARCH_FULL_TEXT=false 或資料庫不支援）時搜尋以 ILIKE 比對 text，
+  壓縮的內容只能比對開頭片段，因此改以原文存放；啟用期間已壓縮的內容不會還原
+"""
+import hashlib
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import Column, Integer, String, Text, LargeBinary, DateTime, literal_column, select
+from sqlalchemy.engine import Connection
+from ..core.config import settings
+from ..core.metrics import register_collector
+from ..database import Base
+
+try:
+    import zstandard
+except ImportError:  # zstandard 為選用
+    zstandard = None
+
+# 內容編碼：identity 為原文（text），其他為壓縮後的位元組（data）
+IDENTITY = "identity"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+# 支援全文索引的資料庫（app.services.search）
+FULL_TEXT_DIALECTS = ("sqlite", "postgresql")
+
+class NoteContent(Base):
+    """筆記本文，以內容的 sha256 為主鍵"""
+    __tablename__ = "note_contents"
+
+    hash = Column(String(64), primary_key=True)  # sha256 hex（原文的 UTF-8）
+    encoding = Column(String(16), nullable=False, default=IDENTITY)
+    text = Column(Text, nullable=True)  # 未壓縮的內容
+    data = Column(LargeBinary, nullable=True)  # 壓縮後的內容
+    size = Column(Integer, nullable=False)  # 原文的 UTF-8 位元組數
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def read(self) -> str:
+        return decode_content(self.encoding, self.text, self.data)
+
+def content_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+def compression_codec(dialect: Optional[str] = None) -> Optional[str]:
+    """目前設定的壓縮方式；設定 zstd 但未安裝 zstandard 時改用 zlib
+
+    全文索引停用（SEARCH_FULL_TEXT=false，或 dialect 不支援全文索引）時回傳 None，內容以原文存放。
+    """
+    if not settings.SEARCH_FULL_TEXT or (dialect is not None and dialect not in FULL_TEXT_DIALECTS):
+        return None
+    codec = settings.NOTE_CONTENT_COMPRESSION.strip().lower()
+    if codec == ZSTD and zstandard is None:
+        return ZLIB
+    return codec if codec in (ZLIB, ZSTD) else None
+
+def _compress(codec: str, raw: bytes) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+def encode_content(value: str, dialect: Optional[str] = None) -> Dict[str, object]:
+    """內容對應的 note_contents 資料列（hash、encoding、text、data、size）"""
+    raw = value.encode("utf-8")
+    row = {"hash": content_hash(value), "encoding": IDENTITY, "text": value, "data": None, "size": len(raw)}
+    codec = compression_codec(dialect)
+    if codec is not None and len(raw) >= settings.NOTE_CONTENT_COMPRESSION_MIN_BYTES:
+        compressed = _compress(codec, raw)
+        if len(compressed) < len(raw):
+            row.update(encoding=codec, text=None, data=compressed)
+    return row
+
+def decode_content(encoding: str, text: Optional[str], data: Optional[bytes]) -> str:
+    if encoding == IDENTITY:
+        return text
+    if encoding == ZLIB:
+        return zlib.decompress(data).decode("utf-8")
+    if encoding == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("讀取 zstd 壓縮的筆記內容需要安裝 zstandard")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"未知的筆記內容編碼：{encoding}")
+
+class _StorageStats:
+    """內容寫入的統計：寫入次數、因內容相同而共用的次數、原文與實際儲存的位元組數"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.deduplicated = 0
+        self.compressed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.purged = 0
+
+    def record_writes(self, rows: List[Dict[str, object]], inserted: Optional[List[Dict[str, object]]]) -> None:
+        """inserted 為實際寫入的資料列；無法得知時為 None（視為全部寫入）"""
+        stored = rows if inserted is None else inserted
+        with self._lock:
+            self.writes += len(rows)
+            self.deduplicated += len(rows) - len(stored)
+            for row in stored:
+                self.raw_bytes += row["size"]
+                self.stored_bytes += len(row["data"]) if row["data"] is not None else row["size"]
+                self.compressed += row["encoding"] != IDENTITY
+
+    def record_purge(self, count: int) -> None:
+        with self._lock:
+            self.purged += count
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "compression": compression_codec() or IDENTITY,
+                "writes": self.writes,
+                "deduplicated": self.deduplicated,
+                "compressed": self.compressed,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "purged": self.purged,
+            }
+
+storage_stats = _StorageStats()
+register_collector("note_contents", storage_stats.stats)
+
+def _insert_statement(dialect: str):
+    """寫入 note_contents 的 INSERT，已存在的雜湊不重複寫入；不支援 ON CONFLICT 的資料庫回傳 None
+
+    PostgreSQL 對已存在的列做不改變內容的 UPDATE：該列被鎖定到交易結束，
+    同時進行的 purge_contents（先以 FOR UPDATE 鎖定）會等這個交易提交後才檢查引用，
+    不會在新筆記寫入引用前刪除它；已被刪除（尚未提交）的列則會等待後重新寫入。
+    SQLite 的寫入交易本來就互斥，略過已存在的列即可。
+    """
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        return insert(NoteContent).on_conflict_do_update(
+            index_elements=["hash"], set_={"encoding": NoteContent.encoding}
+        )
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+
+        return insert(NoteContent).on_conflict_do_nothing(index_elements=["hash"])
+    return None
+
+def _insert_ignoring_existing(
+    connection: Connection,
+    rows: List[Dict[str, object]]
+) -> Optional[List[Dict[str, object]]]:
+    """寫入資料列，已存在的雜湊略過；回傳實際寫入的資料列（批次寫入無法得知時為 None）"""
+    dialect = connection.dialect.name
+    statement = _insert_statement(dialect)
+    if statement is not None:
+        if len(rows) == 1:
+            if dialect == "postgresql":
+                # xmax = 0 表示這次新寫入的列（而不是更新已存在的列）
+                inserted = connection.execute(
+                    statement.values(**rows[0]).returning(literal_column("xmax = 0"))
+                ).scalar()
+                return rows if inserted else []
+            return rows if connection.execute(statement.values(**rows[0])).rowcount == 1 else []
+        connection.execute(statement, rows)
+        return None
+
+    existing = set(connection.execute(
+        select(NoteContent.hash).where(NoteContent.hash.in_([row["hash"] for row in rows]))
+    ).scalars())
+    missing = [row for row in rows if row["hash"] not in existing]
+    if missing:
+        connection.execute(NoteContent.__table__.insert(), missing)
+    return missing
+
+def store_contents(connection: Connection, values: List[str]) -> List[str]:
+    """在目前的交易中寫入內容（相同內容只存一份），回傳各內容的雜湊"""
+    rows = {}
+    hashes = []
+    for value in values:
+        row = encode_content(value, connection.dialect.name)
+        rows.setdefault(row["hash"], row)
+        hashes.append(row["hash"])
+    if rows:
+        # 依雜湊排序寫入，同時寫入多筆內容的交易以相同順序鎖定，避免死結
+        row_list = [rows[key] for key in sorted(rows)]
+        storage_stats.record_writes(row_list, _insert_ignoring_existing(connection, row_list))
+    return hashes
+
+def load_content(connection: Connection, hash: str) -> str:
+    """以連線讀取內容（flush 事件與重建索引時使用，不經過 Session）"""
+    row = connection.execute(
+        select(NoteContent.encoding, NoteContent.text, NoteContent.data).where(NoteContent.hash == hash)
+    ).first()
+    return decode_content(row.encoding, row.text, row.data)
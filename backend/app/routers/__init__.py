@@ -1,5 +1,12 @@
 from .auth import router as auth_router
 from .notes import router as notes_router
 from .collections import router as collections_router
+from .integrations import router as integrations_router
+from .auth_async import router as auth_async_router
+from .notes_async import router as notes_async_router
+from .collections_async import router as collections_async_router
 
-__all__ = ["auth_router", "notes_router", "collections_router"]
+__all__ = [
+    "auth_router", "notes_router", "collections_router", "integrations_router",
+    "auth_async_router", "notes_async_router", "collections_async_router"
+]
@@ -1,59 +1,83 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import User
 from ..schemas import UserCreate, UserResponse, Token
-from ..core import get_password_hash, verify_password, create_access_token, get_current_user
+from ..core import (
+    create_access_token, get_current_user,
+    get_password_hash_async, verify_and_update_password_async
+)
 
 router = APIRouter(prefix="/auth", tags=["認證"])
 
+# register / login 為 async：bcrypt 交給密碼雜湊工作池（滿載時回傳 429），
+# 資料庫操作交給執行緒池，等待雜湊時不佔用執行緒
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """註冊新用戶"""
-    # 檢查用戶名是否已存在
-    if db.query(User).filter(User.username == user_data.username).first():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="用戶名已被使用"
-        )
+    def check_existing():
+        # 檢查用戶名是否已存在
+        if db.query(User).filter(User.username == user_data.username).first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="用戶名已被使用"
+            )
 
-    # 檢查email是否已存在
-    if db.query(User).filter(User.email == user_data.email).first():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email已被使用"
-        )
+        # 檢查email是否已存在
+        if db.query(User).filter(User.email == user_data.email).first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email已被使用"
+            )
+
+    await run_in_threadpool(check_existing)
 
     # 創建新用戶
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     new_user = User(
         username=user_data.username,
         email=user_data.email,
         hashed_password=hashed_password
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    def save():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(save)
 
     return new_user
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
     """用戶登入"""
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.username == form_data.username).first()
+    )
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用戶名或密碼錯誤",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # bcrypt 成本設定已變更，以新成本重新儲存密碼雜湊
+    if new_hash:
+        user.hashed_password = new_hash
+        await run_in_threadpool(db.commit)
+
     # 創建access token
     access_token = create_access_token(data={"sub": user.username})
 
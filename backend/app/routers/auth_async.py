@@ -0,0 +1,87 @@
+"""
+認證端點的非同步版本（ASYNC_DB 啟用時使用）
+
+bcrypt 計算為 CPU 密集工作，交給密碼雜湊工作池處理以免阻塞事件迴圈。
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
+from ..models import User
+from ..schemas import UserCreate, UserResponse, Token
+from ..core import (
+    create_access_token, get_current_user_async,
+    get_password_hash_async, verify_and_update_password_async
+)
+
+router = APIRouter(prefix="/auth", tags=["認證"])
+
+async def _get_user_by(db: AsyncSession, condition) -> User:
+    result = await db.execute(select(User).where(condition))
+    return result.scalars().first()
+
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register_async(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """註冊新用戶"""
+    # 檢查用戶名是否已存在
+    if await _get_user_by(db, User.username == user_data.username):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="用戶名已被使用"
+        )
+
+    # 檢查email是否已存在
+    if await _get_user_by(db, User.email == user_data.email):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email已被使用"
+        )
+
+    # 創建新用戶
+    hashed_password = await get_password_hash_async(user_data.password)
+    new_user = User(
+        username=user_data.username,
+        email=user_data.email,
+        hashed_password=hashed_password
+    )
+
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+
+    return new_user
+
+@router.post("/login", response_model=Token)
+async def login_async(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """用戶登入"""
+    user = await _get_user_by(db, User.username == form_data.username)
+
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="用戶名或密碼錯誤",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # bcrypt 成本設定已變更，以新成本重新儲存密碼雜湊
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    # 創建access token
+    access_token = create_access_token(data={"sub": user.username})
+
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.get("/me", response_model=UserResponse)
+async def get_current_user_info_async(current_user: User = Depends(get_current_user_async)):
+    """獲取當前用戶信息"""
+    return current_user
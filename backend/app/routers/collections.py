@@ -1,20 +1,166 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
-from typing import List
+import time
 from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from starlette.background import BackgroundTask
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import or_, func, select, insert, delete, update, case
+from typing import Dict, List, Optional, Tuple, Union
 from ..database import get_db
 from ..models import Collection, CollectionNote, Note, User
 from ..schemas import (
     CollectionCreate, CollectionUpdate, CollectionResponse,
-    CollectionNoteAdd, CollectionNoteReorder, NoteResponse,
-    CollectionIntegrationRequest, CollectionIntegrationResponse
+    CollectionSummary, CollectionPage, CollectionSummaryPage,
+    CollectionNoteAdd, CollectionNoteReorder, CollectionNoteMove, NoteResponse,
+    CollectionNotesBatch, CollectionNoteBatchItem, CollectionNotesBatchResponse,
+    CollectionIntegrationRequest, IntegrationJobResponse
 )
 from ..core import get_current_user, get_current_user_optional
-from ..services.ai_integration import ai_service
+from ..core.config import settings
+from ..core.http_cache import CacheValidators, check_not_modified, make_etag
+from ..core.pagination import paginate_by_cursor
+from ..core.responses import json_response
+from ..core.streaming import ndjson_response, sse_event, sse_response, STREAM_BATCH_SIZE
+from ..services.ai_integration import AIIntegrationService, IntegrationResult
+from ..services.ai_providers import get_provider_class
+from ..services.feed_cache import feed_cache, COLLECTIONS_FEED
+from ..services.integration_cache import integration_cache, integration_cache_key, integration_partials
+from ..services.integration_jobs import integration_queue, IntegrationQueueFull
+from .integrations import integration_job_response
 
 router = APIRouter(prefix="/collections", tags=["合集"])
 
+# 游標分頁未指定 limit 時的每頁數量
+DEFAULT_PAGE_SIZE = 20
+
+# 合集內筆記位置的間隔：移動單一筆記時放在前後兩筆中間，不必改寫其他筆記
+POSITION_GAP = 1024
+
+# 摘要模式只查詢這些欄位，不載入描述與封面圖片
+COLLECTION_SUMMARY_COLUMNS = (
+    Collection.id,
+    Collection.name,
+    Collection.is_public,
+    Collection.user_id,
+    Collection.created_at,
+    Collection.updated_at,
+)
+
+def note_counts_statement(collection_ids: List[int]):
+    """多個合集筆記數量的分組查詢"""
+    return select(
+        CollectionNote.collection_id,
+        func.count(CollectionNote.id)
+    ).where(
+        CollectionNote.collection_id.in_(collection_ids)
+    ).group_by(CollectionNote.collection_id)
+
+def _get_note_counts(db: Session, collection_ids: List[int]) -> Dict[int, int]:
+    """以單一分組查詢取得多個合集的筆記數量"""
+    if not collection_ids:
+        return {}
+
+    rows = db.execute(note_counts_statement(collection_ids)).all()
+    return {collection_id: count for collection_id, count in rows}
+
+def collection_responses(
+    collections: List,
+    note_counts: Dict[int, int],
+    schema=CollectionResponse,
+    owner_username: Optional[str] = None
+) -> List:
+    """建立合集回應列表
+
+    未提供 owner_username 時使用 collection.owner（需已預先載入）。
+    """
+    result = []
+    for collection in collections:
+        collection_response = schema.from_orm(collection)
+        collection_response.owner_username = owner_username or collection.owner.username
+        collection_response.note_count = note_counts.get(collection.id, 0)
+        result.append(collection_response)
+
+    return result
+
+def collection_validators(collection_response: CollectionResponse) -> CacheValidators:
+    """合集的快取驗證資訊
+
+    加入或移除筆記不會更新合集的 updated_at，因此 ETag 另外包含筆記數量，
+    也不提供 Last-Modified（否則 If-Modified-Since 會漏掉這類變更）。
+    """
+    return CacheValidators(
+        make_etag(
+            "collection", collection_response.id, collection_response.updated_at, collection_response.note_count
+        ),
+        public=collection_response.is_public
+    )
+
+def collection_notes_metadata_statement(collection_id: int):
+    """合集與其中筆記的版本資訊（不含筆記內容），依 position 排序
+
+    以外部連接查詢，合集沒有筆記時仍回傳一列（筆記欄位為 NULL）。
+    """
+    return select(
+        Collection.is_public,
+        Collection.user_id,
+        Note.id,
+        Note.updated_at,
+        Note.is_public,
+        Note.user_id
+    ).select_from(Collection).outerjoin(
+        CollectionNote, CollectionNote.collection_id == Collection.id
+    ).outerjoin(
+        Note, Note.id == CollectionNote.note_id
+    ).where(
+        Collection.id == collection_id
+    ).order_by(CollectionNote.position, CollectionNote.id)
+
+def visible_collection_notes(
+    rows: List,
+    current_user: Optional[User]
+) -> Tuple[List[int], CacheValidators]:
+    """由版本資訊判斷讀取權限並計算可見筆記與快取驗證資訊
+
+    Args:
+        rows: collection_notes_metadata_statement 的查詢結果（不可為空）
+
+    Returns:
+        (依順序排列的可見筆記 id, 快取驗證資訊)
+    """
+    collection_is_public, collection_user_id = rows[0][0], rows[0][1]
+    # 檢查權限
+    if not collection_is_public:
+        if not current_user or collection_user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="此合集為私密合集"
+            )
+
+    visible = []
+    for _, _, note_id, updated_at, note_is_public, note_user_id in rows:
+        if note_id is None:
+            continue
+        # 如果是公開合集，只顯示公開筆記
+        if not collection_is_public or note_is_public or (current_user and note_user_id == current_user.id):
+            visible.append((note_id, updated_at, note_is_public))
+
+    # 可見筆記的集合與順序依登入用戶而不同，ETag 依實際回傳的筆記計算；
+    # 移除或重新排序筆記不會留下更新時間，因此不提供 Last-Modified
+    validators = CacheValidators(
+        make_etag("collection_notes", collection_is_public, [(note_id, updated_at) for note_id, updated_at, _ in visible]),
+        public=collection_is_public and all(note_is_public for _, _, note_is_public in visible)
+    )
+    return [note_id for note_id, _, _ in visible], validators
+
+def _build_collection_responses(
+    db: Session,
+    collections: List,
+    schema=CollectionResponse,
+    owner_username: Optional[str] = None
+) -> List:
+    """查詢筆記數量並建立合集回應列表"""
+    note_counts = _get_note_counts(db, [collection.id for collection in collections])
+    return collection_responses(collections, note_counts, schema, owner_username)
+
 @router.post("/", response_model=CollectionResponse, status_code=status.HTTP_201_CREATED)
 def create_collection(
     collection_data: CollectionCreate,
@@ -31,6 +177,7 @@ def create_collection(
 
     db.add(new_collection)
     db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
     db.refresh(new_collection)
 
     response = CollectionResponse.from_orm(new_collection)
@@ -38,59 +185,129 @@ def create_collection(
     response.note_count = 0
     return response
 
-@router.get("/", response_model=List[CollectionResponse])
+@router.get("/", response_model=Union[List[CollectionResponse], CollectionPage])
 def get_public_collections(
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """獲取所有公開合集"""
-    collections = db.query(Collection).filter(
-        Collection.is_public == True
-    ).order_by(Collection.created_at.desc()).offset(skip).limit(limit).all()
+    """獲取所有公開合集
 
-    result = []
-    for collection in collections:
-        collection_response = CollectionResponse.from_orm(collection)
-        collection_response.owner_username = collection.owner.username
-        # 計算筆記數量
-        collection_response.note_count = db.query(CollectionNote).filter(
-            CollectionNote.collection_id == collection.id
-        ).count()
-        result.append(collection_response)
+    Args:
+        skip: 略過筆數（偏移分頁）
+        limit: 每頁數量
+        cursor: 游標分頁，第一頁傳空字串，之後傳上一頁的 next_cursor；
+            使用時回傳 {items, next_cursor} 且忽略 skip
 
-    return result
+    第一頁的回應會被快取（feed_cache），合集或其中的筆記有增刪改時失效。
+    """
+    def build():
+        query = db.query(Collection).options(joinedload(Collection.owner)).filter(
+            Collection.is_public == True
+        )
+
+        if cursor is not None:
+            collections, next_cursor = paginate_by_cursor(query, Collection, cursor, limit)
+            return CollectionPage(
+                items=_build_collection_responses(db, collections),
+                next_cursor=next_cursor
+            )
+
+        collections = query.order_by(Collection.created_at.desc()).offset(skip).limit(limit).all()
+
+        return _build_collection_responses(db, collections)
 
-@router.get("/my", response_model=List[CollectionResponse])
+    if feed_cache.cacheable(skip, cursor):
+        return feed_cache.respond(COLLECTIONS_FEED, ("cursor" if cursor is not None else "offset", limit), build)
+    return json_response(build())
+
+@router.get(
+    "/my",
+    response_model=Union[
+        List[CollectionResponse], List[CollectionSummary], CollectionPage, CollectionSummaryPage
+    ]
+)
 def get_my_collections(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    stream: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """獲取當前用戶的所有合集"""
-    collections = db.query(Collection).filter(
-        Collection.user_id == current_user.id
-    ).order_by(Collection.created_at.desc()).all()
+    """獲取當前用戶的所有合集
 
-    result = []
-    for collection in collections:
-        collection_response = CollectionResponse.from_orm(collection)
-        collection_response.owner_username = current_user.username
-        # 計算筆記數量
-        collection_response.note_count = db.query(CollectionNote).filter(
-            CollectionNote.collection_id == collection.id
-        ).count()
-        result.append(collection_response)
+    Args:
+        skip: 略過筆數（偏移分頁）
+        limit: 每頁數量，未提供時回傳全部
+        cursor: 游標分頁（同公開合集列表），回傳 {items, next_cursor}
+        view: full 回傳完整合集；summary 不含描述與封面圖片
+        stream: 以 NDJSON 逐筆串流回傳（套用 skip/limit，不使用游標）
+    """
+    if view not in ("full", "summary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="無效的 view，請使用 full/summary"
+        )
 
-    return result
+    user_id = current_user.id
+    owner_username = current_user.username
+    schema = CollectionSummary if view == "summary" else CollectionResponse
+
+    def build_query(session: Session):
+        if view == "summary":
+            return session.query(*COLLECTION_SUMMARY_COLUMNS).filter(Collection.user_id == user_id)
+        return session.query(Collection).filter(Collection.user_id == user_id)
+
+    if stream:
+        def produce(session: Session):
+            query = build_query(session).order_by(
+                Collection.created_at.desc(), Collection.id.desc()
+            ).offset(skip)
+            if limit is not None:
+                query = query.limit(limit)
+
+            # 每批資料列以一次分組查詢取得筆記數量
+            batch = []
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                batch.append(row)
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    yield from _build_collection_responses(session, batch, schema, owner_username)
+                    batch = []
+            yield from _build_collection_responses(session, batch, schema, owner_username)
+
+        return ndjson_response(produce)
+
+    if cursor is not None:
+        rows, next_cursor = paginate_by_cursor(
+            build_query(db), Collection, cursor, limit or DEFAULT_PAGE_SIZE
+        )
+        page_schema = CollectionSummaryPage if view == "summary" else CollectionPage
+        return json_response(page_schema(
+            items=_build_collection_responses(db, rows, schema, owner_username),
+            next_cursor=next_cursor
+        ))
+
+    query = build_query(db).order_by(Collection.created_at.desc()).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return json_response(_build_collection_responses(db, query.all(), schema, owner_username))
 
 @router.get("/{collection_id}", response_model=CollectionResponse)
 def get_collection(
     collection_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional)
 ):
-    """獲取單個合集"""
-    collection = db.query(Collection).filter(Collection.id == collection_id).first()
+    """獲取單個合集（支援 If-None-Match，未變更時回傳 304）"""
+    collection = db.query(Collection).options(joinedload(Collection.owner)).filter(
+        Collection.id == collection_id
+    ).first()
 
     if not collection:
         raise HTTPException(
@@ -113,6 +330,10 @@ def get_collection(
         CollectionNote.collection_id == collection.id
     ).count()
 
+    not_modified = check_not_modified(request, response, collection_validators(collection_response))
+    if not_modified:
+        return not_modified
+
     return collection_response
 
 @router.put("/{collection_id}", response_model=CollectionResponse)
@@ -149,6 +370,7 @@ def update_collection(
         collection.is_public = collection_data.is_public
 
     db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
     db.refresh(collection)
 
     collection_response = CollectionResponse.from_orm(collection)
@@ -183,47 +405,52 @@ def delete_collection(
 
     db.delete(collection)
     db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
 
     return None
 
 @router.get("/{collection_id}/notes", response_model=List[NoteResponse])
 def get_collection_notes(
     collection_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user_optional)
 ):
-    """獲取合集內的所有筆記"""
-    collection = db.query(Collection).filter(Collection.id == collection_id).first()
+    """獲取合集內的所有筆記
 
-    if not collection:
+    先以不含筆記內容的查詢計算 ETag，客戶端快取有效時回傳 304，不載入筆記內容。
+    """
+    rows = db.execute(collection_notes_metadata_statement(collection_id)).all()
+
+    if not rows:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="合集不存在"
         )
 
-    # 檢查權限
-    if not collection.is_public:
-        if not current_user or collection.user_id != current_user.id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="此合集為私密合集"
-            )
+    note_ids, validators = visible_collection_notes(rows, current_user)
+    not_modified = check_not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
 
-    # 獲取合集中的筆記（按 position 排序）
-    collection_notes = db.query(CollectionNote).filter(
-        CollectionNote.collection_id == collection_id
-    ).order_by(CollectionNote.position).all()
+    if not note_ids:
+        return json_response([], headers=validators.headers())
+
+    # 獲取可見的筆記（連同作者），依合集中的順序排列
+    notes = db.query(Note).options(joinedload(Note.owner), joinedload(Note.body)).filter(Note.id.in_(note_ids)).all()
+    notes_by_id = {note.id: note for note in notes}
 
     result = []
-    for cn in collection_notes:
-        note = cn.note
-        # 如果是公開合集，只顯示公開筆記
-        if not collection.is_public or note.is_public or (current_user and note.user_id == current_user.id):
-            note_response = NoteResponse.from_orm(note)
-            note_response.owner_username = note.owner.username
-            result.append(note_response)
+    for note_id in note_ids:
+        note = notes_by_id.get(note_id)
+        if note is None:
+            continue
+        note_response = NoteResponse.from_orm(note)
+        note_response.owner_username = note.owner.username
+        result.append(note_response)
 
-    return result
+    return json_response(result, headers=validators.headers())
 
 @router.post("/{collection_id}/notes", status_code=status.HTTP_201_CREATED)
 def add_note_to_collection(
@@ -271,20 +498,155 @@ def add_note_to_collection(
     # 獲取當前最大 position
     max_position = db.query(func.max(CollectionNote.position)).filter(
         CollectionNote.collection_id == collection_id
-    ).scalar() or -1
+    ).scalar()
 
     # 添加筆記到合集
     collection_note = CollectionNote(
         collection_id=collection_id,
         note_id=note_data.note_id,
-        position=max_position + 1
+        position=0 if max_position is None else max_position + POSITION_GAP
     )
 
     db.add(collection_note)
     db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
 
     return {"message": "筆記已添加到合集"}
 
+def _get_batch_collection(
+    db: Session,
+    collection_id: int,
+    batch: CollectionNotesBatch,
+    current_user: User,
+    forbidden_detail: str
+) -> List[int]:
+    """檢查批次請求（合集存在且為擁有者），回傳去除重複後的筆記 ID（保留請求順序）"""
+    if len(batch.note_ids) > settings.COLLECTION_BATCH_MAX_NOTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"一次最多處理 {settings.COLLECTION_BATCH_MAX_NOTES} 則筆記"
+        )
+
+    collection = db.query(Collection).filter(Collection.id == collection_id).first()
+
+    if not collection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合集不存在"
+        )
+
+    # 檢查是否為合集擁有者
+    if collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=forbidden_detail
+        )
+
+    return list(dict.fromkeys(batch.note_ids))
+
+@router.post("/{collection_id}/notes:batch", response_model=CollectionNotesBatchResponse)
+def add_notes_to_collection_batch(
+    collection_id: int,
+    batch: CollectionNotesBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批次添加筆記到合集
+
+    以集合查詢檢查所有筆記、一次寫入並只提交一次；依請求順序放到合集最後。
+    每個筆記 ID 回傳各自的結果：added / already_in_collection /
+    not_found / forbidden（他人的私密筆記）。
+    """
+    note_ids = _get_batch_collection(
+        db, collection_id, batch, current_user, "只能添加筆記到自己的合集"
+    )
+
+    notes = dict(db.execute(
+        select(Note.id, or_(Note.is_public, Note.user_id == current_user.id)).where(Note.id.in_(note_ids))
+    ).all())
+    existing = set(db.execute(
+        select(CollectionNote.note_id).where(
+            CollectionNote.collection_id == collection_id,
+            CollectionNote.note_id.in_(note_ids)
+        )
+    ).scalars())
+
+    results = []
+    to_add = []
+    for note_id in note_ids:
+        if note_id not in notes:
+            item_status = "not_found"
+        elif not notes[note_id]:
+            item_status = "forbidden"
+        elif note_id in existing:
+            item_status = "already_in_collection"
+        else:
+            item_status = "added"
+            to_add.append(note_id)
+        results.append(CollectionNoteBatchItem(note_id=note_id, status=item_status))
+
+    if to_add:
+        max_position = db.query(func.max(CollectionNote.position)).filter(
+            CollectionNote.collection_id == collection_id
+        ).scalar()
+        start = -POSITION_GAP if max_position is None else max_position
+        now = datetime.utcnow()
+        db.execute(insert(CollectionNote), [
+            {"collection_id": collection_id, "note_id": note_id, "position": start + i * POSITION_GAP, "added_at": now}
+            for i, note_id in enumerate(to_add, 1)
+        ])
+        # 集合寫入不會觸發 mapper 事件，需自行清除整合結果快取
+        if integration_cache.enabled:
+            integration_cache.invalidate_collections(db.connection(), [collection_id])
+        db.commit()
+        feed_cache.invalidate(COLLECTIONS_FEED)
+
+    return CollectionNotesBatchResponse(succeeded=len(to_add), results=results)
+
+@router.delete("/{collection_id}/notes:batch", response_model=CollectionNotesBatchResponse)
+def remove_notes_from_collection_batch(
+    collection_id: int,
+    batch: CollectionNotesBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """批次從合集移除筆記
+
+    每個筆記 ID 回傳各自的結果：removed / not_in_collection。
+    """
+    note_ids = _get_batch_collection(
+        db, collection_id, batch, current_user, "只能從自己的合集移除筆記"
+    )
+
+    existing = set(db.execute(
+        select(CollectionNote.note_id).where(
+            CollectionNote.collection_id == collection_id,
+            CollectionNote.note_id.in_(note_ids)
+        )
+    ).scalars())
+
+    if existing:
+        db.execute(
+            delete(CollectionNote).where(
+                CollectionNote.collection_id == collection_id,
+                CollectionNote.note_id.in_(existing)
+            )
+        )
+        # 集合刪除不會觸發 mapper 事件，需自行清除整合結果快取
+        if integration_cache.enabled:
+            integration_cache.invalidate_collections(db.connection(), [collection_id])
+        db.commit()
+        feed_cache.invalidate(COLLECTIONS_FEED)
+
+    results = [
+        CollectionNoteBatchItem(
+            note_id=note_id,
+            status="removed" if note_id in existing else "not_in_collection"
+        )
+        for note_id in note_ids
+    ]
+    return CollectionNotesBatchResponse(succeeded=len(existing), results=results)
+
 @router.delete("/{collection_id}/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remove_note_from_collection(
     collection_id: int,
@@ -322,6 +684,7 @@ def remove_note_from_collection(
 
     db.delete(collection_note)
     db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
 
     return None
 
@@ -348,39 +711,130 @@ def reorder_collection_notes(
             detail="只能排序自己的合集"
         )
 
-    # 更新每個筆記的 position
-    for index, note_id in enumerate(reorder_data.note_ids):
-        collection_note = db.query(CollectionNote).filter(
+    # 以單一 UPDATE ... CASE 更新所有筆記的 position（不在合集中的 ID 會被忽略）
+    note_ids = list(dict.fromkeys(reorder_data.note_ids))
+    if note_ids:
+        _set_positions(db, collection_id, note_ids)
+        db.commit()
+
+    return {"message": "排序已更新"}
+
+def _set_positions(db: Session, collection_id: int, note_ids: List[int]) -> None:
+    """依 note_ids 的順序以間隔的位置改寫合集內筆記，只送出一個 UPDATE"""
+    positions = {note_id: index * POSITION_GAP for index, note_id in enumerate(note_ids)}
+    db.execute(
+        update(CollectionNote).where(
             CollectionNote.collection_id == collection_id,
-            CollectionNote.note_id == note_id
-        ).first()
+            CollectionNote.note_id.in_(note_ids)
+        ).values(position=case(positions, value=CollectionNote.note_id)),
+        execution_options={"synchronize_session": False}
+    )
+    # 集合更新不會觸發 mapper 事件，需自行清除整合結果快取
+    if integration_cache.enabled:
+        integration_cache.invalidate_collections(db.connection(), [collection_id])
+
+@router.put("/{collection_id}/notes/{note_id}/position", status_code=status.HTTP_200_OK)
+def move_collection_note(
+    collection_id: int,
+    note_id: int,
+    move_data: CollectionNoteMove,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """移動合集中的單一筆記到另一筆記之後（after_note_id 為 None 時移到最前面）
+
+    新位置取前後兩筆的中間值，通常只更新這一筆；位置之間沒有空隙時才重新編號整個合集。
+    """
+    collection = db.query(Collection).filter(Collection.id == collection_id).first()
+
+    if not collection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合集不存在"
+        )
+
+    # 檢查是否為合集擁有者
+    if collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="只能排序自己的合集"
+        )
+
+    if move_data.after_note_id == note_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不能移到自己之後"
+        )
 
-        if collection_note:
-            collection_note.position = index
+    positions = dict(db.execute(
+        select(CollectionNote.note_id, CollectionNote.position).where(
+            CollectionNote.collection_id == collection_id,
+            CollectionNote.note_id.in_([note_id, move_data.after_note_id or note_id])
+        )
+    ).all())
+    if note_id not in positions or (move_data.after_note_id is not None and move_data.after_note_id not in positions):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="筆記不在此合集中"
+        )
 
+    # 目標位置前一筆（after_note_id）與後一筆的位置
+    lower = positions[move_data.after_note_id] if move_data.after_note_id is not None else None
+    upper_query = select(CollectionNote.position).where(
+        CollectionNote.collection_id == collection_id,
+        CollectionNote.note_id != note_id
+    )
+    if lower is not None:
+        # 與 after_note_id 位置相同的筆記（舊資料）也算在後面，沒有空隙時改為重新編號
+        upper_query = upper_query.where(
+            CollectionNote.position >= lower,
+            CollectionNote.note_id != move_data.after_note_id
+        )
+    upper = db.execute(upper_query.order_by(CollectionNote.position).limit(1)).scalar()
+
+    if lower is None:
+        new_position = upper - POSITION_GAP if upper is not None else 0
+    elif upper is None:
+        new_position = lower + POSITION_GAP
+    elif upper - lower > 1:
+        new_position = (lower + upper) // 2
+    else:
+        new_position = None
+
+    if new_position is None:
+        # 沒有空隙：依新順序重新編號整個合集
+        ordered = db.execute(
+            select(CollectionNote.note_id).where(
+                CollectionNote.collection_id == collection_id,
+                CollectionNote.note_id != note_id
+            ).order_by(CollectionNote.position, CollectionNote.id)
+        ).scalars().all()
+        ordered.insert(ordered.index(move_data.after_note_id) + 1, note_id)
+        _set_positions(db, collection_id, ordered)
+    else:
+        db.execute(
+            update(CollectionNote).where(
+                CollectionNote.collection_id == collection_id,
+                CollectionNote.note_id == note_id
+            ).values(position=new_position),
+            execution_options={"synchronize_session": False}
+        )
+        if integration_cache.enabled:
+            integration_cache.invalidate_collections(db.connection(), [collection_id])
     db.commit()
 
     return {"message": "排序已更新"}
 
-@router.post("/{collection_id}/integrate", response_model=CollectionIntegrationResponse)
-def integrate_collection_notes(
+def _load_integration_notes(
+    db: Session,
     collection_id: int,
     request_data: CollectionIntegrationRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user_optional)
-):
-    """使用 AI 整合合集中的所有筆記
-
-    將合集中的多個筆記內容送給 AI 進行整合，生成一份統整後的完整筆記。
-
-    Args:
-        collection_id: 合集 ID
-        request_data: 包含可選的自訂提示詞
-        db: 資料庫 session
-        current_user: 當前用戶（可選，用於存取私密合集）
+    current_user: Optional[User]
+) -> Tuple[List[Dict[str, str]], List[Note]]:
+    """檢查整合請求並取得參與整合的筆記
 
     Returns:
-        整合後的筆記內容及相關資訊
+        (送給 AI 的筆記資料, 對應的筆記物件；用於計算快取鍵)
     """
     # 檢查合集是否存在
     collection = db.query(Collection).filter(Collection.id == collection_id).first()
@@ -400,7 +854,9 @@ def integrate_collection_notes(
             )
 
     # 獲取合集中的所有筆記（按 position 排序）
-    collection_notes = db.query(CollectionNote).filter(
+    collection_notes = db.query(CollectionNote).options(
+        joinedload(CollectionNote.note).joinedload(Note.body)
+    ).filter(
         CollectionNote.collection_id == collection_id
     ).order_by(CollectionNote.position).all()
 
@@ -412,6 +868,7 @@ def integrate_collection_notes(
 
     # 準備筆記資料
     notes_data = []
+    included_notes = []
     for cn in collection_notes:
         note = cn.note
         # 如果是公開合集，只處理公開筆記或自己的筆記
@@ -423,6 +880,7 @@ def integrate_collection_notes(
             "title": note.title,
             "content": note.content
         })
+        included_notes.append(note)
 
     if not notes_data:
         raise HTTPException(
@@ -430,31 +888,176 @@ def integrate_collection_notes(
             detail="合集中沒有可用的筆記進行整合"
         )
 
-    # 呼叫 AI 服務進行整合（使用前端傳入的 API key）
-    try:
-        from ..services.ai_integration import AIIntegrationService
+    if get_provider_class().requires_api_key and not request_data.api_key.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="請提供 Gemini API 金鑰"
+        )
 
-        # 使用前端傳入的 API key 建立服務實例
-        ai_integration_service = AIIntegrationService(api_key=request_data.api_key)
+    return notes_data, included_notes
 
-        integrated_content = ai_integration_service.integrate_notes(
+@router.post(
+    "/{collection_id}/integrate",
+    response_model=IntegrationJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+def integrate_collection_notes(
+    collection_id: int,
+    request_data: CollectionIntegrationRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_optional)
+):
+    """使用 AI 整合合集中的所有筆記
+
+    將合集中的多個筆記內容送給 AI 進行整合，生成一份統整後的完整筆記。
+    整合在背景工作池中執行，此端點立即回傳工作資訊（202），
+    之後以 GET /integrations/{job_id} 查詢狀態與結果。
+
+    Args:
+        collection_id: 合集 ID
+        request_data: 包含可選的自訂提示詞
+        db: 資料庫 session
+        current_user: 當前用戶（可選，用於存取私密合集）
+
+    Returns:
+        整合工作（job_id 與目前狀態）
+    """
+    notes_data, included_notes = _load_integration_notes(db, collection_id, request_data, current_user)
+
+    user_id = current_user.id if current_user else None
+    custom_prompt = request_data.custom_prompt
+
+    # API 金鑰只保留在服務物件（工作的閉包）中，不寫入工作儲存
+    ai_integration_service = AIIntegrationService(api_key=request_data.api_key)
+
+    # 筆記、順序、提示詞與模型都沒變時直接使用快取的結果
+    model_name = ai_integration_service.model_name
+    cache_key = integration_cache_key(included_notes, custom_prompt, model_name)
+    cached = integration_cache.get(cache_key)
+    if cached is not None:
+        job = integration_queue.complete(
+            cached.integrated_content,
+            collection_id=collection_id,
+            note_count=cached.note_count,
+            user_id=user_id
+        )
+        return integration_job_response(job)
+
+    partials = integration_partials.for_collection(collection_id, custom_prompt, model_name)
+
+    def integrate() -> IntegrationResult:
+        result = ai_integration_service.integrate_notes_chunked(
             notes_data=notes_data,
-            integration_prompt=request_data.custom_prompt
+            integration_prompt=custom_prompt,
+            partials=partials,
+            progress=integration_queue.heartbeat
         )
+        integration_cache.set(cache_key, collection_id, model_name, result.content, len(notes_data))
+        return result
 
-        return CollectionIntegrationResponse(
-            integrated_content=integrated_content,
+    try:
+        job = integration_queue.submit(
+            integrate,
+            collection_id=collection_id,
             note_count=len(notes_data),
-            created_at=datetime.utcnow()
+            user_id=user_id
         )
-
-    except RuntimeError as e:
+    except IntegrationQueueFull:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="目前整合請求過多，請稍後再試",
+            headers={"Retry-After": "5"}
         )
-    except ValueError as e:
+
+    return integration_job_response(job)
+
+@router.post("/{collection_id}/integrate/stream")
+def integrate_collection_notes_stream(
+    collection_id: int,
+    request_data: CollectionIntegrationRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_optional)
+):
+    """使用 AI 整合合集中的所有筆記（Server-Sent Events 串流）
+
+    參數同 POST /{collection_id}/integrate，模型產生文字時即送出，事件依序為：
+    - chunk: {"text": "..."}，可能有多則
+    - done: {"note_count", "cached", "created_at", "chunk_count", "timings",
+      "first_chunk_ms", "total_ms"}；大型合集會先完成 map 階段才開始送出文字
+    - error: {"detail": "..."}（發生錯誤時取代 done）
+
+    請求檢查（合集不存在、無權限等）仍以一般的 HTTP 錯誤回應；
+    與背景整合工作共用名額上限，已滿時回傳 429。
+    """
+    notes_data, included_notes = _load_integration_notes(db, collection_id, request_data, current_user)
+
+    custom_prompt = request_data.custom_prompt
+    ai_integration_service = AIIntegrationService(api_key=request_data.api_key)
+    model_name = ai_integration_service.model_name
+    cache_key = integration_cache_key(included_notes, custom_prompt, model_name)
+    start = time.perf_counter()
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    def done(note_count: int, cached: bool, first_chunk_ms: Optional[float], timings: dict) -> str:
+        return sse_event("done", {
+            "note_count": note_count,
+            "cached": cached,
+            "created_at": datetime.utcnow().isoformat(),
+            "chunk_count": timings.pop("chunk_count", None),
+            "timings": timings or None,
+            "first_chunk_ms": first_chunk_ms,
+            "total_ms": elapsed_ms(),
+        })
+
+    cached = integration_cache.get(cache_key)
+    if cached is not None:
+        def cached_events():
+            first_chunk_ms = elapsed_ms()
+            yield sse_event("chunk", {"text": cached.integrated_content})
+            yield done(cached.note_count, True, first_chunk_ms, {})
+
+        return sse_response(cached_events())
+
+    # 串流在請求中直接呼叫模型，與背景整合工作共用名額上限，避免佔滿執行緒
+    try:
+        release = integration_queue.reserve()
+    except IntegrationQueueFull:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=str(e)
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="目前整合請求過多，請稍後再試",
+            headers={"Retry-After": "5"}
         )
+
+    def events():
+        first_chunk_ms = None
+        timings = {}
+        parts = []
+        try:
+            for text in ai_integration_service.integrate_notes_stream(
+                notes_data=notes_data,
+                integration_prompt=custom_prompt,
+                timings=timings,
+                partials=integration_partials.for_collection(collection_id, custom_prompt, model_name)
+            ):
+                if first_chunk_ms is None:
+                    first_chunk_ms = elapsed_ms()
+                parts.append(text)
+                yield sse_event("chunk", {"text": text})
+        except (RuntimeError, ValueError) as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        finally:
+            release()
+
+        integrated_content = "".join(parts).strip()
+        if not integrated_content:
+            yield sse_event("error", {"detail": "AI 回應為空"})
+            return
+
+        integration_cache.set(cache_key, collection_id, model_name, integrated_content, len(notes_data))
+        yield done(len(notes_data), False, first_chunk_ms, timings)
+
+    # 串流尚未開始客戶端就斷線時產生器不會執行 finally，由背景工作確保釋放名額
+    return sse_response(events(), background=BackgroundTask(release))
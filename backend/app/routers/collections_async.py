@@ -0,0 +1,307 @@
+"""
+合集端點的非同步版本（ASYNC_DB 啟用時使用）
+
+涵蓋合集的讀取與增刪改；合集內筆記的新增、移除、排序與 AI 整合
+仍由 collections.py 的同步路由處理。
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import Dict, List, Optional, Union
+from ..database import get_async_db
+from ..models import Collection, Note, User
+from ..schemas import (
+    CollectionCreate, CollectionUpdate, CollectionResponse,
+    CollectionSummary, CollectionPage, CollectionSummaryPage, NoteResponse
+)
+from ..core import get_current_user_async, get_current_user_optional_async
+from ..core.http_cache import check_not_modified
+from ..core.pagination import apply_cursor, finish_page
+from ..core.responses import json_response
+from ..core.streaming import async_ndjson_response, STREAM_BATCH_SIZE
+from ..services.feed_cache import feed_cache, COLLECTIONS_FEED
+from .collections import (
+    DEFAULT_PAGE_SIZE, COLLECTION_SUMMARY_COLUMNS,
+    note_counts_statement, collection_responses, collection_validators,
+    collection_notes_metadata_statement, visible_collection_notes
+)
+
+router = APIRouter(prefix="/collections", tags=["合集"])
+
+async def _get_note_counts(db: AsyncSession, collection_ids: List[int]) -> Dict[int, int]:
+    """以單一分組查詢取得多個合集的筆記數量"""
+    if not collection_ids:
+        return {}
+
+    result = await db.execute(note_counts_statement(collection_ids))
+    return {collection_id: count for collection_id, count in result.all()}
+
+async def _build_collection_responses(
+    db: AsyncSession,
+    collections: List,
+    schema=CollectionResponse,
+    owner_username: Optional[str] = None
+) -> List:
+    """查詢筆記數量並建立合集回應列表"""
+    note_counts = await _get_note_counts(db, [collection.id for collection in collections])
+    return collection_responses(collections, note_counts, schema, owner_username)
+
+async def _get_collection_or_404(db: AsyncSession, collection_id: int, with_owner: bool = False) -> Collection:
+    statement = select(Collection).where(Collection.id == collection_id)
+    if with_owner:
+        statement = statement.options(joinedload(Collection.owner))
+
+    collection = (await db.execute(statement)).scalars().first()
+    if not collection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合集不存在"
+        )
+
+    return collection
+
+def _check_readable(collection: Collection, current_user: Optional[User]) -> None:
+    if not collection.is_public:
+        if not current_user or collection.user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="此合集為私密合集"
+            )
+
+@router.post("/", response_model=CollectionResponse, status_code=status.HTTP_201_CREATED)
+async def create_collection_async(
+    collection_data: CollectionCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """創建新合集"""
+    new_collection = Collection(
+        name=collection_data.name,
+        description=collection_data.description,
+        is_public=collection_data.is_public,
+        user_id=current_user.id
+    )
+
+    db.add(new_collection)
+    await db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
+    await db.refresh(new_collection)
+
+    return collection_responses([new_collection], {}, owner_username=current_user.username)[0]
+
+@router.get("/", response_model=Union[List[CollectionResponse], CollectionPage])
+async def get_public_collections_async(
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """獲取所有公開合集（參數同同步版本）"""
+    async def build():
+        statement = select(Collection).options(joinedload(Collection.owner)).where(
+            Collection.is_public == True
+        )
+
+        if cursor is not None:
+            result = await db.execute(apply_cursor(statement, Collection, cursor, limit))
+            collections, next_cursor = finish_page(result.scalars().all(), limit)
+            return CollectionPage(
+                items=await _build_collection_responses(db, collections),
+                next_cursor=next_cursor
+            )
+
+        result = await db.execute(
+            statement.order_by(Collection.created_at.desc()).offset(skip).limit(limit)
+        )
+        return await _build_collection_responses(db, result.scalars().all())
+
+    if feed_cache.cacheable(skip, cursor):
+        return await feed_cache.respond_async(
+            COLLECTIONS_FEED, ("cursor" if cursor is not None else "offset", limit), build
+        )
+    return json_response(await build())
+
+@router.get(
+    "/my",
+    response_model=Union[
+        List[CollectionResponse], List[CollectionSummary], CollectionPage, CollectionSummaryPage
+    ]
+)
+async def get_my_collections_async(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """獲取當前用戶的所有合集（參數同同步版本）"""
+    if view not in ("full", "summary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="無效的 view，請使用 full/summary"
+        )
+
+    owner_username = current_user.username
+    summary = view == "summary"
+    schema = CollectionSummary if summary else CollectionResponse
+
+    if summary:
+        statement = select(*COLLECTION_SUMMARY_COLUMNS).where(Collection.user_id == current_user.id)
+    else:
+        statement = select(Collection).where(Collection.user_id == current_user.id)
+
+    def rows_of(result):
+        return result.all() if summary else result.scalars().all()
+
+    if stream:
+        statement = statement.order_by(Collection.created_at.desc(), Collection.id.desc()).offset(skip)
+        if limit is not None:
+            statement = statement.limit(limit)
+
+        async def produce(session: AsyncSession):
+            result = await session.stream(
+                statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            partitions = result.partitions() if summary else result.scalars().partitions()
+
+            # 每批資料列以一次分組查詢取得筆記數量
+            async for batch in partitions:
+                for item in await _build_collection_responses(session, batch, schema, owner_username):
+                    yield item
+
+        return async_ndjson_response(produce)
+
+    if cursor is not None:
+        page_size = limit or DEFAULT_PAGE_SIZE
+        result = await db.execute(apply_cursor(statement, Collection, cursor, page_size))
+        rows, next_cursor = finish_page(rows_of(result), page_size)
+        page_schema = CollectionSummaryPage if summary else CollectionPage
+        return json_response(page_schema(
+            items=await _build_collection_responses(db, rows, schema, owner_username),
+            next_cursor=next_cursor
+        ))
+
+    statement = statement.order_by(Collection.created_at.desc()).offset(skip)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    result = await db.execute(statement)
+    return json_response(await _build_collection_responses(db, rows_of(result), schema, owner_username))
+
+@router.get("/{collection_id:int}", response_model=CollectionResponse)
+async def get_collection_async(
+    collection_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """獲取單個合集（支援 If-None-Match，未變更時回傳 304）"""
+    collection = await _get_collection_or_404(db, collection_id, with_owner=True)
+    _check_readable(collection, current_user)
+
+    collection_response = (await _build_collection_responses(db, [collection]))[0]
+    not_modified = check_not_modified(request, response, collection_validators(collection_response))
+    if not_modified:
+        return not_modified
+
+    return collection_response
+
+@router.put("/{collection_id:int}", response_model=CollectionResponse)
+async def update_collection_async(
+    collection_id: int,
+    collection_data: CollectionUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """更新合集"""
+    collection = await _get_collection_or_404(db, collection_id)
+
+    if collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="無權限修改此合集"
+        )
+
+    if collection_data.name is not None:
+        collection.name = collection_data.name
+    if collection_data.description is not None:
+        collection.description = collection_data.description
+    if collection_data.cover_image is not None:
+        collection.cover_image = collection_data.cover_image
+    if collection_data.is_public is not None:
+        collection.is_public = collection_data.is_public
+
+    await db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
+    await db.refresh(collection)
+
+    return (await _build_collection_responses(db, [collection], owner_username=current_user.username))[0]
+
+@router.delete("/{collection_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_collection_async(
+    collection_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """刪除合集"""
+    collection = await _get_collection_or_404(db, collection_id)
+
+    if collection.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="無權限刪除此合集"
+        )
+
+    # AsyncSession.delete 會載入 collection_notes 以套用 cascade
+    await db.delete(collection)
+    await db.commit()
+    feed_cache.invalidate(COLLECTIONS_FEED)
+
+    return None
+
+@router.get("/{collection_id:int}/notes", response_model=List[NoteResponse])
+async def get_collection_notes_async(
+    collection_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """獲取合集內的所有筆記
+
+    先以不含筆記內容的查詢計算 ETag，客戶端快取有效時回傳 304，不載入筆記內容。
+    """
+    rows = (await db.execute(collection_notes_metadata_statement(collection_id))).all()
+
+    if not rows:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="合集不存在"
+        )
+
+    note_ids, validators = visible_collection_notes(rows, current_user)
+    not_modified = check_not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+
+    if not note_ids:
+        return json_response([], headers=validators.headers())
+
+    result = await db.execute(
+        select(Note).options(joinedload(Note.owner), joinedload(Note.body)).where(Note.id.in_(note_ids))
+    )
+    notes_by_id = {note.id: note for note in result.scalars().all()}
+
+    notes = []
+    for note_id in note_ids:
+        note = notes_by_id.get(note_id)
+        if note is not None:
+            note_response = NoteResponse.from_orm(note)
+            note_response.owner_username = note.owner.username
+            notes.append(note_response)
+
+    return json_response(notes, headers=validators.headers())
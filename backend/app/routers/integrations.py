@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from ..models import IntegrationJob, User
+from ..schemas import CollectionIntegrationResponse, IntegrationJobResponse
+from ..core import get_current_user_optional
+from ..services.integration_jobs import integration_queue, SUCCEEDED
+
+router = APIRouter(prefix="/integrations", tags=["AI 整合"])
+
+def integration_job_response(job: IntegrationJob) -> IntegrationJobResponse:
+    """將整合工作轉為回應格式，成功時附上整合結果"""
+    result = None
+    if job.status == SUCCEEDED:
+        result = CollectionIntegrationResponse(
+            integrated_content=job.integrated_content,
+            note_count=job.note_count,
+            created_at=job.finished_at or job.updated_at,
+            chunk_count=job.chunk_count,
+            timings=job.timings
+        )
+
+    return IntegrationJobResponse(
+        job_id=job.id,
+        collection_id=job.collection_id,
+        status=job.status,
+        attempts=job.attempts,
+        note_count=job.note_count,
+        error=job.error,
+        result=result,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+@router.get("/{job_id}", response_model=IntegrationJobResponse)
+def get_integration_job(
+    job_id: str,
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """查詢整合工作的狀態與結果
+
+    登入用戶建立的工作只有本人可以查詢；匿名建立的工作憑工作 ID 即可查詢。
+    """
+    job = integration_queue.get(job_id)
+
+    if job is None or (job.user_id is not None and (not current_user or job.user_id != current_user.id)):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="整合工作不存在"
+        )
+
+    return integration_job_response(job)
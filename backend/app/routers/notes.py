@@ -1,14 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import or_
-from typing import List, Optional
+from typing import List, Optional, Union
 from ..database import get_db
 from ..models import Note, User
-from ..schemas import NoteCreate, NoteUpdate, NoteResponse
-from ..core import get_current_user, get_current_user_optional
+from ..models.note import EXCERPT_LENGTH
+from ..schemas import NoteCreate, NoteUpdate, NoteResponse, NoteSummary, NotePage, NoteSummaryPage
+from ..core import settings, get_current_user, get_current_user_optional
+from ..core.http_cache import CacheValidators, check_not_modified, make_etag
+from ..core.pagination import paginate_by_cursor
+from ..core.responses import json_response
+from ..core.streaming import ndjson_response, STREAM_BATCH_SIZE
+from ..services.feed_cache import feed_cache, NOTES_FEED
+from ..services.search import apply_search
 
 router = APIRouter(prefix="/notes", tags=["筆記"])
 
+# 游標分頁未指定 limit 時的每頁數量
+DEFAULT_PAGE_SIZE = 20
+
+# 摘要模式只查詢這些欄位，不載入完整 content（excerpt 為寫入時保存的前 EXCERPT_LENGTH 個字）
+NOTE_SUMMARY_COLUMNS = (
+    Note.id,
+    Note.title,
+    Note.excerpt,
+    Note.file_type,
+    Note.is_public,
+    Note.user_id,
+    Note.created_at,
+    Note.updated_at,
+)
+
+def note_validators(note: Note) -> CacheValidators:
+    """筆記的快取驗證資訊；內容、標題與公開設定的任何修改都會更新 updated_at"""
+    modified = note.updated_at or note.created_at
+    return CacheValidators(make_etag("note", note.id, modified), last_modified=modified, public=note.is_public)
+
 @router.post("/", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
 def create_note(
     note_data: NoteCreate,
@@ -26,6 +53,7 @@ def create_note(
 
     db.add(new_note)
     db.commit()
+    feed_cache.invalidate(NOTES_FEED)
     db.refresh(new_note)
 
     # 添加owner_username
@@ -33,39 +61,109 @@ def create_note(
     response.owner_username = current_user.username
     return response
 
-@router.get("/", response_model=List[NoteResponse])
+@router.get("/", response_model=Union[List[NoteResponse], NotePage])
 def get_public_notes(
     skip: int = 0,
     limit: int = 20,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """獲取所有公開筆記"""
-    notes = db.query(Note).filter(Note.is_public == True).order_by(Note.created_at.desc()).offset(skip).limit(limit).all()
+    """獲取所有公開筆記
 
-    # 添加owner_username
-    result = []
-    for note in notes:
-        note_response = NoteResponse.from_orm(note)
-        note_response.owner_username = note.owner.username
-        result.append(note_response)
+    Args:
+        skip: 略過筆數（偏移分頁）
+        limit: 每頁數量
+        cursor: 游標分頁，第一頁傳空字串，之後傳上一頁的 next_cursor；
+            使用時回傳 {items, next_cursor} 且忽略 skip
+
+    第一頁的回應會被快取（feed_cache），筆記新增、修改或刪除時失效。
+    """
+    def build():
+        query = db.query(Note).options(joinedload(Note.owner), joinedload(Note.body)).filter(Note.is_public == True)
+
+        next_cursor = None
+        if cursor is not None:
+            notes, next_cursor = paginate_by_cursor(query, Note, cursor, limit)
+        else:
+            notes = query.order_by(Note.created_at.desc()).offset(skip).limit(limit).all()
+
+        # 添加owner_username
+        result = []
+        for note in notes:
+            note_response = NoteResponse.from_orm(note)
+            note_response.owner_username = note.owner.username
+            result.append(note_response)
 
-    return result
+        if cursor is not None:
+            return NotePage(items=result, next_cursor=next_cursor)
+        return result
 
-@router.get("/my", response_model=List[NoteResponse])
+    if feed_cache.cacheable(skip, cursor):
+        return feed_cache.respond(NOTES_FEED, ("cursor" if cursor is not None else "offset", limit), build)
+    return json_response(build())
+
+@router.get(
+    "/my",
+    response_model=Union[List[NoteResponse], List[NoteSummary], NotePage, NoteSummaryPage]
+)
 def get_my_notes(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    stream: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """獲取當前用戶的所有筆記"""
-    notes = db.query(Note).filter(Note.user_id == current_user.id).order_by(Note.created_at.desc()).all()
+    """獲取當前用戶的所有筆記
 
-    result = []
-    for note in notes:
-        note_response = NoteResponse.from_orm(note)
-        note_response.owner_username = current_user.username
-        result.append(note_response)
+    Args:
+        skip: 略過筆數（偏移分頁）
+        limit: 每頁數量，未提供時回傳全部
+        cursor: 游標分頁（同公開筆記列表），回傳 {items, next_cursor}
+        view: full 回傳完整筆記；summary 只回傳摘要，不載入完整內容
+        stream: 以 NDJSON 逐筆串流回傳（套用 skip/limit，不使用游標）
+    """
+    if view not in ("full", "summary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="無效的 view，請使用 full/summary"
+        )
+
+    user_id = current_user.id
+    owner_username = current_user.username
+    schema = NoteSummary if view == "summary" else NoteResponse
+
+    def build_query(session: Session):
+        if view == "summary":
+            return session.query(*NOTE_SUMMARY_COLUMNS).filter(Note.user_id == user_id)
+        return session.query(Note).options(joinedload(Note.body)).filter(Note.user_id == user_id)
+
+    def to_response(row):
+        note_response = schema.from_orm(row)
+        note_response.owner_username = owner_username
+        return note_response
 
-    return result
+    if stream:
+        def produce(session: Session):
+            query = build_query(session).order_by(Note.created_at.desc(), Note.id.desc()).offset(skip)
+            if limit is not None:
+                query = query.limit(limit)
+            for row in query.yield_per(STREAM_BATCH_SIZE):
+                yield to_response(row)
+
+        return ndjson_response(produce)
+
+    if cursor is not None:
+        rows, next_cursor = paginate_by_cursor(build_query(db), Note, cursor, limit or DEFAULT_PAGE_SIZE)
+        page_schema = NoteSummaryPage if view == "summary" else NotePage
+        return json_response(page_schema(items=[to_response(row) for row in rows], next_cursor=next_cursor))
+
+    query = build_query(db).order_by(Note.created_at.desc()).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return json_response([to_response(row) for row in query.all()])
 
 @router.get("/search", response_model=List[NoteResponse])
 def search_notes(
@@ -83,19 +181,10 @@ def search_notes(
     if not q or len(q.strip()) == 0:
         return []
 
-    # 建立基礎查詢條件（標題或內容包含關鍵字）
-    search_condition = or_(
-        Note.title.ilike(f"%{q}%"),
-        Note.content.ilike(f"%{q}%")
-    )
-
     # 根據 scope 決定搜尋範圍
     if scope == "public":
         # 搜尋公開筆記
-        notes = db.query(Note).filter(
-            Note.is_public == True,
-            search_condition
-        ).order_by(Note.updated_at.desc()).limit(50).all()
+        scope_condition = Note.is_public == True
     elif scope == "my":
         # 搜尋我的筆記（需要登入）
         if not current_user:
@@ -103,10 +192,7 @@ def search_notes(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="需要登入才能搜尋個人筆記"
             )
-        notes = db.query(Note).filter(
-            Note.user_id == current_user.id,
-            search_condition
-        ).order_by(Note.updated_at.desc()).limit(50).all()
+        scope_condition = Note.user_id == current_user.id
     elif scope == "all":
         # 搜尋所有可見筆記（我的 + 公開）
         if not current_user:
@@ -114,19 +200,22 @@ def search_notes(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="需要登入才能使用全域搜尋"
             )
-        notes = db.query(Note).filter(
-            or_(
-                Note.user_id == current_user.id,
-                Note.is_public == True
-            ),
-            search_condition
-        ).order_by(Note.updated_at.desc()).limit(50).all()
+        scope_condition = or_(
+            Note.user_id == current_user.id,
+            Note.is_public == True
+        )
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="無效的搜尋範圍，請使用 public/my/all"
         )
 
+    # 全文檢索（依相關度排序），不支援時退回標題／內容的 ILIKE 比對
+    query = db.query(Note).options(joinedload(Note.owner), joinedload(Note.body)).filter(scope_condition)
+    notes = apply_search(query, q.strip(), db.get_bind().dialect.name).limit(
+        settings.SEARCH_RESULT_LIMIT
+    ).all()
+
     # 構建返回結果
     result = []
     for note in notes:
@@ -134,16 +223,22 @@ def search_notes(
         note_response.owner_username = note.owner.username
         result.append(note_response)
 
-    return result
+    return json_response(result)
 
 @router.get("/{note_id}", response_model=NoteResponse)
 def get_note(
     note_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
-    """獲取單個筆記"""
-    note = db.query(Note).filter(Note.id == note_id).first()
+    """獲取單個筆記
+
+    支援 If-None-Match / If-Modified-Since：筆記未修改時回傳 304，不載入內容。
+    """
+    # 內容（Note.body）在序列化時才載入，客戶端快取有效時不需要讀取
+    note = db.query(Note).options(joinedload(Note.owner)).filter(Note.id == note_id).first()
 
     if not note:
         raise HTTPException(
@@ -159,9 +254,14 @@ def get_note(
                 detail="此筆記為私密筆記"
             )
 
+    validators = note_validators(note)
+    not_modified = check_not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+
     note_response = NoteResponse.from_orm(note)
     note_response.owner_username = note.owner.username
-    return note_response
+    return json_response(note_response, headers=validators.headers())
 
 @router.put("/{note_id}", response_model=NoteResponse)
 def update_note(
@@ -195,6 +295,7 @@ def update_note(
         note.is_public = note_data.is_public
 
     db.commit()
+    feed_cache.invalidate(NOTES_FEED)
     db.refresh(note)
 
     note_response = NoteResponse.from_orm(note)
@@ -225,5 +326,6 @@ def delete_note(
 
     db.delete(note)
     db.commit()
+    feed_cache.invalidate(NOTES_FEED)
 
     return None
@@ -0,0 +1,293 @@
+"""
+筆記端點的非同步版本（ASYNC_DB 啟用時使用）
+
+行為與 notes.py 相同，改用 AsyncSession，等待資料庫 I/O 時不佔用執行緒池。
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from typing import List, Optional, Union
+from ..database import get_async_db
+from ..models import Note, User
+from ..schemas import NoteCreate, NoteUpdate, NoteResponse, NoteSummary, NotePage, NoteSummaryPage
+from ..core import settings, get_current_user_async, get_current_user_optional_async
+from ..core.http_cache import check_not_modified
+from ..core.pagination import apply_cursor, finish_page
+from ..core.responses import json_response
+from ..core.streaming import async_ndjson_response, STREAM_BATCH_SIZE
+from ..services.feed_cache import feed_cache, NOTES_FEED
+from ..services.search import apply_search
+from .notes import DEFAULT_PAGE_SIZE, NOTE_SUMMARY_COLUMNS, note_validators
+
+router = APIRouter(prefix="/notes", tags=["筆記"])
+
+async def _get_note_or_404(
+    db: AsyncSession,
+    note_id: int,
+    with_owner: bool = False,
+    with_content: bool = False
+) -> Note:
+    statement = select(Note).where(Note.id == note_id)
+    if with_owner:
+        statement = statement.options(joinedload(Note.owner))
+    if with_content:
+        statement = statement.options(joinedload(Note.body))
+
+    note = (await db.execute(statement)).scalars().first()
+    if not note:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="筆記不存在"
+        )
+
+    return note
+
+def _to_response(note: Note, owner_username: str) -> NoteResponse:
+    note_response = NoteResponse.from_orm(note)
+    note_response.owner_username = owner_username
+    return note_response
+
+@router.post("/", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
+async def create_note_async(
+    note_data: NoteCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """創建新筆記"""
+    new_note = Note(
+        title=note_data.title,
+        content=note_data.content,
+        file_type=note_data.file_type,
+        is_public=note_data.is_public,
+        user_id=current_user.id
+    )
+
+    db.add(new_note)
+    await db.commit()
+    feed_cache.invalidate(NOTES_FEED)
+    await db.refresh(new_note)
+
+    return _to_response(new_note, current_user.username)
+
+@router.get("/", response_model=Union[List[NoteResponse], NotePage])
+async def get_public_notes_async(
+    skip: int = 0,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """獲取所有公開筆記（參數同同步版本）"""
+    async def build():
+        statement = select(Note).options(joinedload(Note.owner), joinedload(Note.body)).where(
+            Note.is_public == True
+        )
+
+        if cursor is not None:
+            result = await db.execute(apply_cursor(statement, Note, cursor, limit))
+            notes, next_cursor = finish_page(result.scalars().all(), limit)
+            return NotePage(
+                items=[_to_response(note, note.owner.username) for note in notes],
+                next_cursor=next_cursor
+            )
+
+        result = await db.execute(
+            statement.order_by(Note.created_at.desc()).offset(skip).limit(limit)
+        )
+        return [_to_response(note, note.owner.username) for note in result.scalars().all()]
+
+    if feed_cache.cacheable(skip, cursor):
+        return await feed_cache.respond_async(
+            NOTES_FEED, ("cursor" if cursor is not None else "offset", limit), build
+        )
+    return json_response(await build())
+
+@router.get(
+    "/my",
+    response_model=Union[List[NoteResponse], List[NoteSummary], NotePage, NoteSummaryPage]
+)
+async def get_my_notes_async(
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    view: str = "full",
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """獲取當前用戶的所有筆記（參數同同步版本）"""
+    if view not in ("full", "summary"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="無效的 view，請使用 full/summary"
+        )
+
+    owner_username = current_user.username
+    summary = view == "summary"
+    schema = NoteSummary if summary else NoteResponse
+
+    if summary:
+        statement = select(*NOTE_SUMMARY_COLUMNS).where(Note.user_id == current_user.id)
+    else:
+        statement = select(Note).options(joinedload(Note.body)).where(Note.user_id == current_user.id)
+
+    def to_response(row):
+        note_response = schema.from_orm(row)
+        note_response.owner_username = owner_username
+        return note_response
+
+    def rows_of(result):
+        return result.all() if summary else result.scalars().all()
+
+    if stream:
+        statement = statement.order_by(Note.created_at.desc(), Note.id.desc()).offset(skip)
+        if limit is not None:
+            statement = statement.limit(limit)
+
+        async def produce(session: AsyncSession):
+            result = await session.stream(
+                statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            rows = result if summary else result.scalars()
+            async for row in rows:
+                yield to_response(row)
+
+        return async_ndjson_response(produce)
+
+    if cursor is not None:
+        page_size = limit or DEFAULT_PAGE_SIZE
+        result = await db.execute(apply_cursor(statement, Note, cursor, page_size))
+        rows, next_cursor = finish_page(rows_of(result), page_size)
+        page_schema = NoteSummaryPage if summary else NotePage
+        return json_response(page_schema(items=[to_response(row) for row in rows], next_cursor=next_cursor))
+
+    statement = statement.order_by(Note.created_at.desc()).offset(skip)
+    if limit is not None:
+        statement = statement.limit(limit)
+
+    result = await db.execute(statement)
+    return json_response([to_response(row) for row in rows_of(result)])
+
+@router.get("/search", response_model=List[NoteResponse])
+async def search_notes_async(
+    q: str,
+    scope: str = "public",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """搜尋筆記（參數同同步版本）"""
+    if not q or len(q.strip()) == 0:
+        return []
+
+    if scope == "public":
+        scope_condition = Note.is_public == True
+    elif scope == "my":
+        if not current_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="需要登入才能搜尋個人筆記"
+            )
+        scope_condition = Note.user_id == current_user.id
+    elif scope == "all":
+        if not current_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="需要登入才能使用全域搜尋"
+            )
+        scope_condition = or_(
+            Note.user_id == current_user.id,
+            Note.is_public == True
+        )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="無效的搜尋範圍，請使用 public/my/all"
+        )
+
+    statement = select(Note).options(joinedload(Note.owner), joinedload(Note.body)).where(scope_condition)
+    statement = apply_search(statement, q.strip(), db.bind.dialect.name)
+    result = await db.execute(statement.limit(settings.SEARCH_RESULT_LIMIT))
+
+    return json_response([_to_response(note, note.owner.username) for note in result.scalars().all()])
+
+@router.get("/{note_id:int}", response_model=NoteResponse)
+async def get_note_async(
+    note_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[User] = Depends(get_current_user_optional_async)
+):
+    """獲取單個筆記
+
+    支援 If-None-Match / If-Modified-Since：筆記未修改時回傳 304，不載入內容。
+    """
+    note = await _get_note_or_404(db, note_id, with_owner=True)
+
+    # 檢查筆記是否公開，如果是私密筆記則需要是擁有者才能訪問
+    if not note.is_public:
+        if not current_user or note.user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="此筆記為私密筆記"
+            )
+
+    validators = note_validators(note)
+    not_modified = check_not_modified(request, response, validators)
+    if not_modified:
+        return not_modified
+
+    # AsyncSession 不能延遲載入關聯，明確讀取內容
+    await db.refresh(note, ["body"])
+    return json_response(_to_response(note, note.owner.username), headers=validators.headers())
+
+@router.put("/{note_id:int}", response_model=NoteResponse)
+async def update_note_async(
+    note_id: int,
+    note_data: NoteUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """更新筆記"""
+    # 未修改內容時回應需要原本的內容，一併讀取
+    note = await _get_note_or_404(db, note_id, with_content=note_data.content is None)
+
+    if note.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="無權限修改此筆記"
+        )
+
+    if note_data.title is not None:
+        note.title = note_data.title
+    if note_data.content is not None:
+        note.content = note_data.content
+    if note_data.is_public is not None:
+        note.is_public = note_data.is_public
+
+    await db.commit()
+    feed_cache.invalidate(NOTES_FEED)
+    await db.refresh(note)
+
+    return _to_response(note, current_user.username)
+
+@router.delete("/{note_id:int}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_note_async(
+    note_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
+):
+    """刪除筆記"""
+    note = await _get_note_or_404(db, note_id)
+
+    if note.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="無權限刪除此筆記"
+        )
+
+    await db.delete(note)
+    await db.commit()
+    feed_cache.invalidate(NOTES_FEED)
+
+    return None
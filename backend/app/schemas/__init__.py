@@ -1,15 +1,19 @@
 from .user import UserBase, UserCreate, UserLogin, UserResponse, Token, TokenData
-from .note import NoteBase, NoteCreate, NoteUpdate, NoteResponse
+from .note import NoteBase, NoteCreate, NoteUpdate, NoteResponse, NoteSummary, NotePage, NoteSummaryPage
 from .collection import (
     CollectionBase, CollectionCreate, CollectionUpdate, CollectionResponse,
+    CollectionSummary, CollectionPage, CollectionSummaryPage,
     CollectionNoteAdd, CollectionNoteReorder, CollectionNoteResponse,
-    CollectionIntegrationRequest, CollectionIntegrationResponse
+    CollectionNoteMove, CollectionNotesBatch, CollectionNoteBatchItem, CollectionNotesBatchResponse,
+    CollectionIntegrationRequest, CollectionIntegrationResponse, IntegrationJobResponse
 )
 
 __all__ = [
     "UserBase", "UserCreate", "UserLogin", "UserResponse", "Token", "TokenData",
-    "NoteBase", "NoteCreate", "NoteUpdate", "NoteResponse",
+    "NoteBase", "NoteCreate", "NoteUpdate", "NoteResponse", "NoteSummary", "NotePage", "NoteSummaryPage",
     "CollectionBase", "CollectionCreate", "CollectionUpdate", "CollectionResponse",
+    "CollectionSummary", "CollectionPage", "CollectionSummaryPage",
     "CollectionNoteAdd", "CollectionNoteReorder", "CollectionNoteResponse",
-    "CollectionIntegrationRequest", "CollectionIntegrationResponse"
+    "CollectionNoteMove", "CollectionNotesBatch", "CollectionNoteBatchItem", "CollectionNotesBatchResponse",
+    "CollectionIntegrationRequest", "CollectionIntegrationResponse", "IntegrationJobResponse"
 ]
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 class CollectionBase(BaseModel):
     name: str
@@ -28,9 +28,46 @@ class CollectionResponse(CollectionBase):
     class Config:
         from_attributes = True
 
+class CollectionSummary(BaseModel):
+    """合集摘要（不含描述與封面圖片）"""
+    id: int
+    name: str
+    is_public: bool = True
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    owner_username: Optional[str] = None
+    note_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+class CollectionPage(BaseModel):
+    items: List[CollectionResponse]
+    next_cursor: Optional[str] = None  # 下一頁游標，None 表示已到最後一頁
+
+class CollectionSummaryPage(BaseModel):
+    items: List[CollectionSummary]
+    next_cursor: Optional[str] = None
+
 class CollectionNoteAdd(BaseModel):
     note_id: int
 
+class CollectionNoteMove(BaseModel):
+    after_note_id: Optional[int] = None  # 移到此筆記之後，None 表示移到最前面
+
+class CollectionNotesBatch(BaseModel):
+    note_ids: List[int]  # 要添加（依此順序放到合集最後）或移除的筆記 ID 列表
+
+class CollectionNoteBatchItem(BaseModel):
+    note_id: int
+    # added / removed / already_in_collection / not_in_collection / not_found / forbidden
+    status: str
+
+class CollectionNotesBatchResponse(BaseModel):
+    succeeded: int  # 成功添加或移除的筆記數量
+    results: List[CollectionNoteBatchItem]  # 每個筆記 ID 的結果（依請求順序、重複的 ID 只列一次）
+
 class CollectionNoteReorder(BaseModel):
     note_ids: List[int]  # 按照新順序排列的筆記 ID 列表
 
@@ -46,9 +83,22 @@ class CollectionNoteResponse(BaseModel):
 
 class CollectionIntegrationRequest(BaseModel):
     custom_prompt: Optional[str] = None  # 自訂整合提示詞（選填）
-    api_key: str  # Gemini API 金鑰（必填）
+    api_key: str = ""  # Gemini API 金鑰（AI_PROVIDER 為 gemini 時必填）
 
 class CollectionIntegrationResponse(BaseModel):
     integrated_content: str  # 整合後的內容
     note_count: int  # 參與整合的筆記數量
     created_at: datetime  # 整合時間
+    chunk_count: Optional[int] = None  # 分區塊整合的區塊數（1 表示一次完成，快取結果為空）
+    timings: Optional[Dict[str, float]] = None  # 各階段耗時（毫秒）：pack/map/reduce/total
+
+class IntegrationJobResponse(BaseModel):
+    job_id: str  # 工作 ID，用於查詢 GET /integrations/{job_id}
+    collection_id: int
+    status: str  # queued / running / succeeded / failed
+    attempts: int  # 已嘗試次數（含重試）
+    note_count: int
+    error: Optional[str] = None  # 失敗原因
+    result: Optional[CollectionIntegrationResponse] = None  # 成功時的整合結果
+    created_at: datetime
+    updated_at: datetime
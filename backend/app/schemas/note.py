@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class NoteBase(BaseModel):
     title: str
@@ -25,3 +25,26 @@ class NoteResponse(NoteBase):
 
     class Config:
         from_attributes = True
+
+class NoteSummary(BaseModel):
+    """筆記摘要（不含完整內容）"""
+    id: int
+    title: str
+    excerpt: str = ""  # 內容開頭片段
+    file_type: str = "md"
+    is_public: bool = True
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    owner_username: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class NotePage(BaseModel):
+    items: List[NoteResponse]
+    next_cursor: Optional[str] = None  # 下一頁游標，None 表示已到最後一頁
+
+class NoteSummaryPage(BaseModel):
+    items: List[NoteSummary]
+    next_cursor: Optional[str] = None
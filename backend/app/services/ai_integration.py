@@ -1,25 +1,172 @@
 """
 AI 整合服務 - 用於將多個筆記合併整合
+
+筆記總量超過單次呼叫的預算時改用 map-reduce：先依估計的 token 數把筆記
+分成多個區塊並行整理（map），再合併各區塊的結果（reduce）；合併的輸入
+仍然過大時會逐層重複，直到可以一次完成。
+
+提供 PartialSummaryStore 時為增量整合：區塊邊界由筆記內容決定，各區塊的
+整理結果以內容雜湊保存，之後只重新整理內容有變動的區塊，再重跑最後的合併。
 """
 import os
 import json
-from typing import List, Dict
-import google.generativeai as genai
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from ..core.config import settings
+from ..core.instrumentation import observe_ai_call, observe_ai_stream
+from .ai_providers import AIProvider, create_provider, estimate_tokens
+
+# 每則筆記在提示詞中的格式開銷（標題行、分隔線）
+_NOTE_OVERHEAD_TOKENS = 16
+
+# reduce 最多的層數，超過後直接合併剩餘的部分
+_MAX_REDUCE_LEVELS = 3
+
+# 全行程 map 呼叫的並行上限（多個整合工作共用），避免同時送出過多請求而被限流
+_map_slots = threading.BoundedSemaphore(max(settings.INTEGRATION_MAP_CONCURRENCY, 1))
+
+def note_fingerprint(note: Dict[str, str]) -> str:
+    """筆記內容（標題與內文）的指紋"""
+    raw = f"{note.get('title', '')}\0{note.get('content', '')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _is_anchor(note: Dict[str, str]) -> bool:
+    """依內容決定的區塊邊界（約一半的筆記）：邊界不受前面筆記增刪的影響"""
+    return int(note_fingerprint(note)[:8], 16) % 2 == 0
+
+def _split_content(
+    content: str,
+    max_tokens: int,
+    count_tokens: Callable[[str], int] = estimate_tokens
+) -> List[str]:
+    """將過長的內容依段落切成不超過 max_tokens 的片段"""
+    parts = []
+    current = []
+    current_tokens = 0
+
+    for paragraph in content.split("\n\n"):
+        tokens = count_tokens(paragraph)
+        if tokens > max_tokens:
+            # 單一段落仍然過長：依字元數硬切
+            step = max(max_tokens, 1)
+            pieces = [paragraph[i:i + step] for i in range(0, len(paragraph), step)]
+        else:
+            pieces = [paragraph]
+
+        for piece in pieces:
+            piece_tokens = count_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                parts.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        parts.append("\n\n".join(current))
+    return parts
+
+def pack_notes(
+    notes_data: List[Dict[str, str]],
+    max_tokens: int,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+    stable: bool = False
+) -> List[List[Dict[str, str]]]:
+    """依原本順序把筆記裝進估計 token 數不超過 max_tokens 的區塊
+
+    單則筆記超過預算時切成多個部分，各自成為獨立的筆記。
+    stable 為 True 時，區塊裝到一半以上後遇到依內容決定的邊界筆記即結束，
+    某則筆記被修改、新增或刪除時，通常只有它所在的區塊（與下一個區塊）改變。
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for note in notes_data:
+        title = note.get("title", "")
+        content = note.get("content", "")
+        overhead = count_tokens(title) + _NOTE_OVERHEAD_TOKENS
+        tokens = overhead + count_tokens(content)
+
+        if tokens > max_tokens:
+            parts = _split_content(content, max(max_tokens - overhead, 1), count_tokens)
+            pieces = [
+                {"title": f"{title}（第 {i} 部分）", "content": part}
+                for i, part in enumerate(parts, 1)
+            ]
+        else:
+            pieces = [note]
+
+        for piece in pieces:
+            piece_tokens = count_tokens(piece["title"]) + _NOTE_OVERHEAD_TOKENS + count_tokens(piece["content"])
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+            if stable and current_tokens * 2 >= max_tokens and _is_anchor(piece):
+                chunks.append(current)
+                current, current_tokens = [], 0
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+class IntegrationResult(NamedTuple):
+    """整合結果與各階段耗時"""
+    content: str
+    chunk_count: int  # map 階段的區塊數，1 表示一次完成
+    timings: Dict[str, float]  # 各階段耗時（毫秒）
+
+class PartialSummaryStore:
+    """map 階段各區塊整理結果的儲存介面（增量整合使用）"""
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """取得已保存的整理結果（鍵 -> 內容），不存在的鍵不會出現在結果中"""
+        raise NotImplementedError
+
+    def put_many(self, summaries: Dict[str, str]) -> None:
+        raise NotImplementedError
+
+    def retain(self, keys: List[str]) -> None:
+        """整合成功後呼叫：保留這次用到的項目，同一範圍內其餘的項目可刪除"""
+        raise NotImplementedError
 
 class AIIntegrationService:
     """AI 整合服務類別"""
 
-    def __init__(self, api_key: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        chunk_tokens: int = None,
+        map_concurrency: int = None,
+        map_retries: int = None,
+        retry_backoff: float = None,
+        provider: AIProvider = None
+    ):
         """初始化 AI 服務
 
         Args:
             api_key: Google Gemini API 金鑰，若未提供則從環境變數讀取
+            chunk_tokens: 單次呼叫的筆記 token 預算，未提供則使用設定值
+            map_concurrency: 單一整合在 map 階段同時呼叫的數量，未提供則使用設定值
+            map_retries: map 階段每個區塊失敗時的重試次數，未提供則使用設定值
+            retry_backoff: 第一次重試前的等待秒數（之後加倍），未提供則使用設定值
+            provider: 模型提供者，未提供則依 AI_PROVIDER 設定建立
         """
         self.api_key = api_key or os.getenv("GOOGLE_API_KEY", "")
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-        else:
-            print("警告：未設定 GOOGLE_API_KEY，AI 整合功能將無法使用")
+        self.chunk_tokens = chunk_tokens or settings.INTEGRATION_CHUNK_TOKENS
+        self.map_concurrency = map_concurrency or settings.INTEGRATION_MAP_CONCURRENCY
+        self.map_retries = settings.INTEGRATION_MAX_RETRIES if map_retries is None else map_retries
+        self.retry_backoff = settings.INTEGRATION_RETRY_BACKOFF_SECONDS if retry_backoff is None else retry_backoff
+        self.provider = provider or create_provider(self.api_key)
+
+    @property
+    def model_name(self) -> str:
+        """使用的模型（也是整合結果快取鍵的一部分）"""
+        return self.provider.model_name
 
     def integrate_notes(self, notes_data: List[Dict[str, str]], integration_prompt: str = None) -> str:
         """整合多個筆記內容
@@ -34,35 +181,213 @@ class AIIntegrationService:
         Raises:
             RuntimeError: 當 API 金鑰未設定或 API 呼叫失敗
         """
-        if not self.api_key:
-            raise RuntimeError("未設定 GOOGLE_API_KEY，無法使用 AI 整合功能")
+        return self._generate(self._build_prompt(notes_data, integration_prompt))
 
-        if not notes_data:
-            raise ValueError("筆記資料不能為空")
+    def integrate_notes_chunked(
+        self,
+        notes_data: List[Dict[str, str]],
+        integration_prompt: str = None,
+        partials: Optional[PartialSummaryStore] = None,
+        progress: Optional[Callable[[], None]] = None
+    ) -> IntegrationResult:
+        """整合多個筆記內容，超過 token 預算時使用 map-reduce
 
-        # 建構提示詞
-        notes_content = self._format_notes_for_prompt(notes_data)
+        參數與例外同 integrate_notes；回傳內容、區塊數與各階段耗時。
+        提供 partials 時重用內容未變的區塊整理結果（timings 的 chunks_reused）。
+        progress 在每個區塊整理完成與 map 階段結束時呼叫（背景工作以此更新心跳）。
+        """
+        start = time.perf_counter()
+        timings = {}
+        used_keys = []
+        reduce_notes, chunk_count = self._map_stage(
+            notes_data, integration_prompt, timings, partials, used_keys, progress
+        )
+        if progress is not None:
+            progress()
 
-        if integration_prompt is None:
-            integration_prompt = self._get_default_integration_prompt()
+        reduce_start = time.perf_counter()
+        content = self._generate(self._reduce_prompt(reduce_notes, integration_prompt, chunk_count))
+        timings["reduce_ms"] = _elapsed_ms(reduce_start)
+        timings["total_ms"] = _elapsed_ms(start)
 
-        full_prompt = f"{integration_prompt}\n\n{notes_content}"
+        if partials is not None and chunk_count > 1:
+            partials.retain(used_keys)
+        return IntegrationResult(content=content, chunk_count=chunk_count, timings=timings)
 
-        try:
-            # 使用 Gemini 2.0 Flash 進行整合
-            model = genai.GenerativeModel("gemini-2.0-flash-lite")
-            response = model.generate_content(full_prompt)
+    def integrate_notes_stream(
+        self,
+        notes_data: List[Dict[str, str]],
+        integration_prompt: str = None,
+        timings: Optional[Dict[str, float]] = None,
+        partials: Optional[PartialSummaryStore] = None
+    ) -> Iterator[str]:
+        """整合多個筆記內容（串流版本），依模型產生的順序逐段回傳文字
 
-            if not response or not response.text:
-                raise RuntimeError("AI 回應為空")
+        參數與例外同 integrate_notes_chunked；例外在開始迭代後才會拋出。
+        筆記需要分區塊時先完成 map 階段，再串流 reduce 的輸出；
+        傳入 timings 時會寫入 chunk_count 與 map 階段耗時。
+        """
+        timings = timings if timings is not None else {}
+        used_keys = []
+        reduce_notes, chunk_count = self._map_stage(notes_data, integration_prompt, timings, partials, used_keys)
+        timings["chunk_count"] = chunk_count
+        full_prompt = self._reduce_prompt(reduce_notes, integration_prompt, chunk_count)
+        yield from observe_ai_stream(self.provider.name, self.provider.stream(full_prompt))
 
-            integrated_content = response.text.strip()
-            return integrated_content
+        if partials is not None and chunk_count > 1:
+            partials.retain(used_keys)
 
-        except Exception as e:
-            error_msg = f"呼叫 Gemini API 時發生錯誤: {str(e)}"
-            print(error_msg)
-            raise RuntimeError(error_msg)
+    def _generate(self, full_prompt: str) -> str:
+        """呼叫模型並回傳完整文字"""
+        with observe_ai_call(self.provider.name, "generate"):
+            return self.provider.generate(full_prompt)
+
+    def _map_stage(
+        self,
+        notes_data: List[Dict[str, str]],
+        integration_prompt: Optional[str],
+        timings: Dict[str, float],
+        partials: Optional[PartialSummaryStore] = None,
+        used_keys: Optional[List[str]] = None,
+        progress: Optional[Callable[[], None]] = None
+    ):
+        """分區塊並行整理筆記，直到剩下的內容可以一次合併
+
+        used_keys 會加入這次用到的區塊整理結果的鍵（提供 partials 時）；
+        progress 在每個區塊整理完成時呼叫。
+
+        Returns:
+            (交給最後一次呼叫的筆記, 第一層的區塊數)
+        """
+        # 先檢查輸入，避免空合集或缺少金鑰時仍進入 map 階段
+        self._build_prompt(notes_data, integration_prompt)
+
+        pack_start = time.perf_counter()
+        count_tokens = self.provider.count_tokens
+        budget = max(self.chunk_tokens - count_tokens(self._instruction(integration_prompt)), 1)
+        stable = partials is not None
+        chunks = pack_notes(notes_data, budget, count_tokens, stable)
+        timings["pack_ms"] = _elapsed_ms(pack_start)
+        chunk_count = len(chunks)
+
+        map_start = time.perf_counter()
+        level = 0
+        reused = 0
+        while len(chunks) > 1 and level < _MAX_REDUCE_LEVELS:
+            level += 1
+            summaries, level_reused = self._summarize_chunks(
+                chunks, integration_prompt, partials, used_keys, progress
+            )
+            reused += level_reused
+            notes_data = [
+                {"title": f"第 {i} 部分的整理結果", "content": summary}
+                for i, summary in enumerate(summaries, 1)
+            ]
+            chunks = pack_notes(notes_data, budget, count_tokens, stable)
+        timings["map_ms"] = _elapsed_ms(map_start)
+        timings["map_levels"] = level
+        if stable:
+            timings["chunks_reused"] = reused
+
+        return [note for chunk in chunks for note in chunk], chunk_count
+
+    def _summarize_chunks(
+        self,
+        chunks: List[List[Dict[str, str]]],
+        integration_prompt: Optional[str],
+        partials: Optional[PartialSummaryStore] = None,
+        used_keys: Optional[List[str]] = None,
+        progress: Optional[Callable[[], None]] = None
+    ) -> Tuple[List[str], int]:
+        """以有上限的執行緒池並行整理各區塊，結果依區塊順序回傳
+
+        Returns:
+            (各區塊的整理結果, 從 partials 重用的區塊數)
+        """
+        instruction = self._instruction(integration_prompt)
+        formatted = [self._format_notes_for_prompt(chunk) for chunk in chunks]
+
+        summaries: List[Optional[str]] = [None] * len(chunks)
+        keys = []
+        if partials is not None:
+            keys = [self._partial_key(instruction, text) for text in formatted]
+            saved = partials.get_many(keys)
+            summaries = [saved.get(key) for key in keys]
+            if used_keys is not None:
+                used_keys.extend(keys)
+        missing = [index for index, summary in enumerate(summaries) if summary is None]
+
+        def summarize(index: int) -> str:
+            prompt = (
+                f"以下是一份大型筆記集的第 {index + 1}/{len(chunks)} 部分。"
+                "請依照下方的整合要求整理這部分的內容，保留所有重要的概念、定義、公式與範例，"
+                "整理結果之後會與其他部分再合併。\n\n"
+                f"{instruction}\n\n{formatted[index]}"
+            )
+            return self._generate_with_retry(prompt)
+
+        if missing:
+            workers = max(min(self.map_concurrency, len(missing)), 1)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="integration-map") as executor:
+                for index, summary in zip(missing, executor.map(summarize, missing)):
+                    summaries[index] = summary
+                    if progress is not None:
+                        progress()
+
+        if partials is not None and missing:
+            partials.put_many({keys[index]: summaries[index] for index in missing})
+        return summaries, len(chunks) - len(missing)
+
+    def _partial_key(self, instruction: str, formatted_chunk: str) -> str:
+        """區塊整理結果的鍵：模型、整合要求與區塊內容都相同才重用"""
+        raw = f"{self.model_name}\0{instruction}\0{formatted_chunk}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _generate_with_retry(self, full_prompt: str) -> str:
+        """map 階段的單次呼叫：受全行程的並行上限約束，失敗時只重試這個區塊
+
+        避免一個區塊失敗就讓整個整合工作重跑、重新呼叫所有區塊。
+        """
+        for attempt in range(self.map_retries + 1):
+            try:
+                with _map_slots:
+                    return self._generate(full_prompt)
+            except RuntimeError:
+                if attempt >= self.map_retries:
+                    raise
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _reduce_prompt(
+        self,
+        notes_data: List[Dict[str, str]],
+        integration_prompt: Optional[str],
+        chunk_count: int
+    ) -> str:
+        """最後一次呼叫的提示詞；有經過 map 階段時說明輸入為各部分的整理結果"""
+        if chunk_count <= 1:
+            return self._build_prompt(notes_data, integration_prompt)
+
+        instruction = (
+            "以下是同一份筆記集分成多個部分後各自的整理結果。請把它們合併成一份完整的整合筆記，"
+            "去除各部分之間重複的內容，並依照下方的整合要求組織結構。\n\n"
+            f"{self._instruction(integration_prompt)}"
+        )
+        return self._build_prompt(notes_data, instruction)
+
+    def _instruction(self, integration_prompt: Optional[str]) -> str:
+        return integration_prompt if integration_prompt is not None else self._get_default_integration_prompt()
+
+    def _build_prompt(self, notes_data: List[Dict[str, str]], integration_prompt: str = None) -> str:
+        """檢查輸入並組合完整的提示詞"""
+        if self.provider.requires_api_key and not self.api_key:
+            raise RuntimeError("未設定 GOOGLE_API_KEY，無法使用 AI 整合功能")
+
+        if not notes_data:
+            raise ValueError("筆記資料不能為空")
+
+        # 建構提示詞
+        notes_content = self._format_notes_for_prompt(notes_data)
+        return f"{self._instruction(integration_prompt)}\n\n{notes_content}"
 
     def _format_notes_for_prompt(self, notes_data: List[Dict[str, str]]) -> str:
         """將筆記資料格式化為提示詞格式"""
@@ -101,11 +426,5 @@ class AIIntegrationService:
 以下是需要整合的筆記："""
 
 
-# 延遲初始化，從設定讀取 API key
-def get_ai_service():
-    """取得 AI 服務實例（從設定檔讀取 API key）"""
-    from ..core.config import settings
-    return AIIntegrationService(api_key=settings.GOOGLE_API_KEY)
-
-# 建立全域實例（從環境變數或設定檔讀取）
-ai_service = get_ai_service()
\ No newline at end of file
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+AI 模型提供者 - 整合服務透過此介面呼叫模型，依 AI_PROVIDER 設定選擇
+
+- gemini：Google Gemini（預設）
+- fake：本機的假模型，不需網路與配額；依設定模擬回應延遲、輸出速度與失敗率，
+  輸出只由提示詞決定，用於壓力測試與量測排隊、並行上限與快取的效果
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional, Type
+from ..core.config import settings
+from ..core.metrics import register_collector
+
+# 中日韓文字大約一字一個 token，其他文字大約四個字元一個 token
+_CJK_RE = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估計文字的 token 數（不呼叫 API）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+class AIProvider:
+    """模型提供者介面
+
+    generate / stream 失敗時拋出 RuntimeError（整合工作會依此重試）。
+    """
+
+    name = ""
+    model_name = ""  # 也是整合結果快取鍵的一部分
+    requires_api_key = True
+
+    def generate(self, prompt: str) -> str:
+        """回傳完整的模型輸出"""
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """依產生的順序逐段回傳模型輸出"""
+        raise NotImplementedError
+
+    def count_tokens(self, text: Optional[str]) -> int:
+        """估計文字的 token 數，用於分區塊；預設使用本機估計，不呼叫 API"""
+        return estimate_tokens(text)
+
+class _GeminiResponse:
+    """模型回應；text 為第一個候選回應的文字（沒有候選回應時為空字串）"""
+
+    def __init__(self, response):
+        candidates = response.candidates
+        parts = candidates[0].content.parts if candidates else []
+        self.text = "".join(part.text for part in parts)
+
+class GeminiModel:
+    """綁定一個 API 金鑰的 Gemini 模型
+
+    直接使用 google.ai.generativelanguage 的公開客戶端（GenerativeServiceClient）：
+    genai.GenerativeModel 只能使用 genai.configure 設定的全行程共用客戶端，
+    不同用戶的金鑰會互相覆蓋。每個金鑰的客戶端各自保有 gRPC 連線。
+    """
+
+    def __init__(self, client, model_name: str):
+        self.client = client
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+
+    def _request(self, prompt: str):
+        from google.ai import generativelanguage as glm
+
+        return glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])]
+        )
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        """回傳回應（stream 時為依產生順序的回應片段）"""
+        request = self._request(prompt)
+        if stream:
+            return (_GeminiResponse(chunk) for chunk in self.client.stream_generate_content(request=request))
+        return _GeminiResponse(self.client.generate_content(request=request))
+
+def _create_gemini_model(api_key: str, model_name: str) -> GeminiModel:
+    """建立綁定指定 API 金鑰的模型；SDK 在第一次建立模型時才匯入，啟動應用不需要載入"""
+    from google.ai import generativelanguage as glm
+
+    return GeminiModel(glm.GenerativeServiceClient(client_options={"api_key": api_key}), model_name)
+
+class GeminiModelPool:
+    """依 API 金鑰保存已建立的模型（含連線），最多 max_size 個，超過時淘汰最久未使用的金鑰"""
+
+    def __init__(self, max_size: int, factory: Callable[[str, str], Any] = _create_gemini_model):
+        self.max_size = max(max_size, 1)
+        self.factory = factory
+        self._models: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, api_key: str, model_name: str):
+        """取得金鑰對應的模型，不存在時建立"""
+        key = (api_key, model_name)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+            self.misses += 1
+
+        # 建立模型不持有鎖；同一金鑰同時建立時保留先完成的那一個
+        model = self.factory(api_key, model_name)
+        with self._lock:
+            existing = self._models.get(key)
+            if existing is not None:
+                return existing
+            self._models[key] = model
+            while len(self._models) > self.max_size:
+                self._models.popitem(last=False)
+                self.evictions += 1
+        return model
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict:
+        """模型池統計（供監控使用）"""
+        with self._lock:
+            return {
+                "size": len(self._models),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+gemini_models = GeminiModelPool(max_size=settings.GEMINI_CLIENT_POOL_SIZE)
+register_collector("gemini_models", gemini_models.stats)
+
+class GeminiProvider(AIProvider):
+    """Google Gemini"""
+
+    name = "gemini"
+    MODEL_NAME = "gemini-2.0-flash-lite"
+
+    def __init__(self, api_key: str, model_name: str = None):
+        self.api_key = api_key
+        self.model_name = model_name or self.MODEL_NAME
+        if not self.api_key:
+            print("警告：未設定 GOOGLE_API_KEY，AI 整合功能將無法使用")
+
+    def generate(self, prompt: str) -> str:
+        try:
+            model = gemini_models.get(self.api_key, self.model_name)
+            response = model.generate_content(prompt)
+
+            if not response or not response.text:
+                raise RuntimeError("AI 回應為空")
+
+            return response.text.strip()
+
+        except Exception as e:
+            error_msg = f"呼叫 Gemini API 時發生錯誤: {str(e)}"
+            print(error_msg)
+            raise RuntimeError(error_msg)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        try:
+            model = gemini_models.get(self.api_key, self.model_name)
+            for chunk in model.generate_content(prompt, stream=True):
+                text = chunk.text
+                if text:
+                    yield text
+
+        except Exception as e:
+            error_msg = f"呼叫 Gemini API 時發生錯誤: {str(e)}"
+            print(error_msg)
+            raise RuntimeError(error_msg)
+
+class FakeProvider(AIProvider):
+    """本機假模型：相同提示詞得到相同輸出，依設定模擬延遲、輸出速度與失敗
+
+    Args:
+        latency: 每次呼叫在輸出第一段文字前等待的秒數
+        tokens_per_second: 輸出速度，0 表示立即輸出
+        failure_rate: 呼叫失敗（RuntimeError）的機率
+        seed: 失敗判定的亂數種子，相同的呼叫順序得到相同的失敗序列
+    """
+
+    name = "fake"
+    model_name = "fake-integration"
+    requires_api_key = False
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def generate(self, prompt: str) -> str:
+        return "".join(self.stream(prompt)).strip()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        self._start_call()
+        time.sleep(self.latency)
+        for line in self._respond(prompt).splitlines(keepends=True):
+            if self.tokens_per_second > 0:
+                time.sleep(self.count_tokens(line) / self.tokens_per_second)
+            yield line
+
+    def _start_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+        if failed:
+            raise RuntimeError("模擬的 AI 呼叫失敗")
+
+    def _respond(self, prompt: str) -> str:
+        """列出提示詞中各筆記的標題，並附上提示詞的摘要值"""
+        titles = re.findall(r"^## 筆記 \d+: (.*)$", prompt, re.MULTILINE)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        lines = ["# 整合筆記", "", f"共整合 {len(titles)} 份內容（{digest}）", ""]
+        lines.extend(f"- {title}" for title in titles)
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        """呼叫統計（供監控使用）"""
+        with self._lock:
+            return {"calls": self.calls, "failures": self.failures}
+
+PROVIDERS: Dict[str, Type[AIProvider]] = {
+    GeminiProvider.name: GeminiProvider,
+    FakeProvider.name: FakeProvider,
+}
+
+# 假模型全行程共用一個實例，失敗序列與統計才會跨請求累計
+_fake_provider: Optional[FakeProvider] = None
+_fake_provider_lock = threading.Lock()
+
+def get_provider_class(name: str = None) -> Type[AIProvider]:
+    """依名稱（預設為 AI_PROVIDER 設定）取得提供者類別"""
+    name = name or settings.AI_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"未知的 AI_PROVIDER: {name}")
+    return PROVIDERS[name]
+
+def create_provider(api_key: str, name: str = None) -> AIProvider:
+    """依設定建立提供者"""
+    global _fake_provider
+    provider_class = get_provider_class(name)
+    if provider_class is FakeProvider:
+        with _fake_provider_lock:
+            if _fake_provider is None:
+                _fake_provider = FakeProvider(
+                    latency=settings.FAKE_AI_LATENCY_SECONDS,
+                    tokens_per_second=settings.FAKE_AI_TOKENS_PER_SECOND,
+                    failure_rate=settings.FAKE_AI_FAILURE_RATE,
+                    seed=settings.FAKE_AI_SEED
+                )
+                register_collector("fake_ai_provider", _fake_provider.stats)
+            return _fake_provider
+    return provider_class(api_key=api_key)
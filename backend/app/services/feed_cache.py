@@ -0,0 +1,251 @@
+"""
+公開列表快取 - 快取 GET /notes/ 與 GET /collections/ 第一頁序列化後的回應
+
+公開列表對所有訪客都相同，只在寫入後改變：
+- 以 (列表, 世代, 分頁模式, limit) 為鍵保存回應的 JSON；寫入後遞增世代（invalidate），
+  舊世代的項目不再被讀取，之後由 TTL／LRU 自然淘汰
+- 同一個鍵同時未命中時只由一個請求查詢資料庫，其餘請求等待結果（single-flight）
+- 預設存在行程記憶體中；設定 FEED_CACHE_REDIS_URL 時改存在 Redis 相容的服務，
+  多個 worker 共用快取與世代
+"""
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from fastapi import Response
+from fastapi.concurrency import run_in_threadpool
+from ..core.cache import TTLCache
+from ..core.config import settings
+from ..core.metrics import register_collector
+from ..core.responses import JSON_MEDIA_TYPE, dump_json
+
+NOTES_FEED = "notes"
+COLLECTIONS_FEED = "collections"
+
+# 等待其他請求建立回應的最長秒數，逾時後自行查詢
+SINGLE_FLIGHT_TIMEOUT = 10.0
+
+def _json_response(body: bytes) -> Response:
+    return Response(content=body, media_type=JSON_MEDIA_TYPE)
+
+class LocalFeedStore:
+    """行程內的快取儲存"""
+
+    name = "local"
+
+    def __init__(self, max_entries: int):
+        self._entries = TTLCache(maxsize=max_entries, ttl=0)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, feed: str) -> int:
+        with self._lock:
+            return self._generations.get(feed, 0)
+
+    def bump(self, feed: str) -> None:
+        with self._lock:
+            self._generations[feed] = self._generations.get(feed, 0) + 1
+        # 舊世代的項目已不會被讀取，直接移除以釋放記憶體
+        self._entries.invalidate_tag(feed)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._entries.get(key)
+
+    def set(self, feed: str, key: str, body: bytes, ttl: float) -> None:
+        self._entries.set(key, body, ttl=ttl, tag=feed)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+class RedisFeedStore:
+    """Redis（或相容服務）中的快取儲存；需要安裝 redis 套件"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def generation(self, feed: str) -> int:
+        return int(self._client.get(f"feed:{feed}:generation") or 0)
+
+    def bump(self, feed: str) -> None:
+        self._client.incr(f"feed:{feed}:generation")
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, feed: str, key: str, body: bytes, ttl: float) -> None:
+        self._client.set(key, body, px=max(int(ttl * 1000), 1))
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter("feed:*"):
+            self._client.delete(key)
+
+class FeedCache:
+    """公開列表第一頁的回應快取
+
+    Args:
+        ttl: 項目存活秒數，0 表示停用快取
+        store: 快取儲存（LocalFeedStore 或 RedisFeedStore）
+    """
+
+    def __init__(self, ttl: float, store):
+        self.ttl = ttl
+        self.store = store
+        self._flights: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # 等待其他請求建立回應後直接命中
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def cacheable(self, skip: int, cursor: Optional[str]) -> bool:
+        """是否為可快取的第一頁請求（偏移分頁 skip=0，或游標分頁的第一頁）"""
+        return self.enabled and skip == 0 and cursor in (None, "")
+
+    def invalidate(self, *feeds: str) -> None:
+        """寫入後使列表快取失效；必須在 commit 之後呼叫，才不會在提交前被重新快取舊資料"""
+        if not self.enabled:
+            return
+        for feed in feeds:
+            try:
+                self.store.bump(feed)
+            except Exception as e:
+                self._error("使列表快取失效", e)
+        with self._lock:
+            self.invalidations += len(feeds)
+
+    def respond(self, feed: str, params: Tuple[Hashable, ...], build: Callable[[], Any]) -> Response:
+        """取得快取的回應，未命中時以 build() 的結果建立並寫入快取"""
+        key = self._key(feed, params)
+        if key is None:
+            return _json_response(dump_json(build()))
+
+        body = self._lookup(key)
+        if body is None:
+            flight = self._join(key)
+            if flight is not None:
+                if not flight.wait(SINGLE_FLIGHT_TIMEOUT):
+                    print(f"警告：等待列表快取逾時，改為直接查詢：{key}")
+                body = self._lookup(key, coalesced=True)
+            if body is None:
+                try:
+                    body = dump_json(build())
+                    self._store(feed, key, body)
+                finally:
+                    if flight is None:
+                        self._finish(key)
+        return _json_response(body)
+
+    async def respond_async(
+        self,
+        feed: str,
+        params: Tuple[Hashable, ...],
+        build: Callable[[], Awaitable[Any]]
+    ) -> Response:
+        """respond 的非同步版本；等待其他請求時不佔用事件迴圈"""
+        key = self._key(feed, params)
+        if key is None:
+            return _json_response(dump_json(await build()))
+
+        body = self._lookup(key)
+        if body is None:
+            flight = self._join(key)
+            if flight is not None:
+                if not await run_in_threadpool(flight.wait, SINGLE_FLIGHT_TIMEOUT):
+                    print(f"警告：等待列表快取逾時，改為直接查詢：{key}")
+                body = self._lookup(key, coalesced=True)
+            if body is None:
+                try:
+                    body = dump_json(await build())
+                    self._store(feed, key, body)
+                finally:
+                    if flight is None:
+                        self._finish(key)
+        return _json_response(body)
+
+    def clear(self) -> None:
+        self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """快取統計（供監控使用）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "backend": self.store.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._flights),
+                "invalidations": self.invalidations,
+                "errors": self.errors,
+            }
+
+    def _key(self, feed: str, params: Tuple[Hashable, ...]) -> Optional[str]:
+        """快取鍵；無法取得目前世代時回傳 None（不使用快取，避免讀到失效前的回應）"""
+        try:
+            generation = self.store.generation(feed)
+        except Exception as e:
+            self._error("讀取列表快取世代", e)
+            return None
+        return ":".join(["feed", feed, str(generation)] + [str(param) for param in params])
+
+    def _lookup(self, key: str, coalesced: bool = False) -> Optional[bytes]:
+        try:
+            body = self.store.get(key)
+        except Exception as e:
+            self._error("讀取列表快取", e)
+            body = None
+        with self._lock:
+            if body is None:
+                # 等待後仍未命中（建立失敗或逾時）不重複計入
+                if not coalesced:
+                    self.misses += 1
+            elif coalesced:
+                self.coalesced += 1
+                self.hits += 1
+                self.misses -= 1
+            else:
+                self.hits += 1
+        return body
+
+    def _join(self, key: str) -> Optional[threading.Event]:
+        """加入同一個鍵的建立；回傳 None 表示由自己建立，否則回傳要等待的事件"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight
+            self._flights[key] = threading.Event()
+            return None
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            flight = self._flights.pop(key, None)
+        if flight is not None:
+            flight.set()
+
+    def _store(self, feed: str, key: str, body: bytes) -> None:
+        try:
+            self.store.set(feed, key, body, self.ttl)
+        except Exception as e:
+            self._error("寫入列表快取", e)
+
+    def _error(self, action: str, error: Exception) -> None:
+        print(f"警告：{action}失敗：{error}")
+        with self._lock:
+            self.errors += 1
+
+def _create_store():
+    if settings.FEED_CACHE_REDIS_URL:
+        return RedisFeedStore(settings.FEED_CACHE_REDIS_URL)
+    return LocalFeedStore(settings.FEED_CACHE_MAX_ENTRIES)
+
+feed_cache = FeedCache(ttl=settings.FEED_CACHE_TTL_SECONDS, store=_create_store())
+register_collector("feed_cache", feed_cache.stats)
@@ -0,0 +1,333 @@
+"""
+AI 整合結果快取 - 合集內容、提示詞與模型都沒變時直接回傳上次的整合結果
+
+快取鍵為 sha256（依序的筆記 id 與 updated_at、自訂提示詞、模型名稱），
+筆記被編輯、合集重新排序或增刪筆記時鍵自然改變；另以 mapper 事件刪除
+受影響合集的舊項目，避免佔用空間。項目數超過上限時淘汰最久未使用的項目。
+
+大型合集 map 階段各區塊的整理結果另存於 integration_partials（增量整合），
+以區塊內容為鍵，筆記變動時不刪除，下次整合只重新整理內容改變的區塊。
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+from ..core.config import settings
+from ..core.metrics import register_collector
+from ..database import SessionLocal
+from ..models import CollectionNote, IntegrationCacheEntry, IntegrationPartialSummary, Note
+from .ai_integration import PartialSummaryStore
+
+def integration_cache_key(notes: Iterable[Note], prompt: Optional[str], model: str) -> str:
+    """計算整合結果的快取鍵（筆記順序不同視為不同的整合）"""
+    payload = {
+        "notes": [[note.id, note.updated_at.isoformat() if note.updated_at else None] for note in notes],
+        "prompt": prompt or "",
+        "model": model,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class IntegrationResultCache:
+    """存在 integration_cache 資料表的整合結果快取，max_entries 為 0 時停用"""
+
+    def __init__(self, max_entries: int, session_factory=SessionLocal):
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.write_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> Optional[IntegrationCacheEntry]:
+        """取得快取的整合結果，並更新最近使用時間"""
+        if not self.enabled:
+            return None
+
+        with self.session_factory() as db:
+            entry = db.get(IntegrationCacheEntry, key)
+            if entry is not None:
+                # 先脫離 session，避免 commit 後屬性過期
+                db.expunge(entry)
+                db.execute(
+                    update(IntegrationCacheEntry).where(IntegrationCacheEntry.key == key).values(
+                        hits=IntegrationCacheEntry.hits + 1,
+                        last_used_at=datetime.utcnow()
+                    )
+                )
+                db.commit()
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def set(self, key: str, collection_id: int, model: str, integrated_content: str, note_count: int) -> bool:
+        """寫入整合結果，超過上限時淘汰最久未使用的項目
+
+        快取只是加速用途：寫入失敗（例如兩個工作同時寫入同一個鍵、合集已被刪除）
+        時只記錄警告並回傳 False，不影響已完成的整合。
+        """
+        if not self.enabled:
+            return False
+
+        try:
+            evicted = self._write(key, collection_id, model, integrated_content, note_count)
+        except SQLAlchemyError as e:
+            print(f"警告：寫入整合結果快取失敗: {e}")
+            with self._lock:
+                self.write_errors += 1
+            return False
+
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+        return True
+
+    def _write(self, key: str, collection_id: int, model: str, integrated_content: str, note_count: int) -> int:
+        """寫入快取項目並淘汰超出上限的項目，回傳淘汰數量"""
+        now = datetime.utcnow()
+        with self.session_factory() as db:
+            db.merge(IntegrationCacheEntry(
+                key=key,
+                collection_id=collection_id,
+                model=model,
+                integrated_content=integrated_content,
+                note_count=note_count,
+                hits=0,
+                created_at=now,
+                last_used_at=now
+            ))
+            db.flush()
+
+            # 保留最近使用的 max_entries 筆，其餘刪除
+            keep = select(IntegrationCacheEntry.key).order_by(
+                IntegrationCacheEntry.last_used_at.desc()
+            ).limit(self.max_entries)
+            evicted = db.execute(
+                delete(IntegrationCacheEntry).where(IntegrationCacheEntry.key.not_in(keep))
+            ).rowcount
+            db.commit()
+        return evicted
+
+    def invalidate_collections(self, connection: Connection, collection_ids: List[int]) -> None:
+        """刪除指定合集的快取項目（在目前的交易中執行）"""
+        if not collection_ids:
+            return
+
+        deleted = connection.execute(
+            delete(IntegrationCacheEntry).where(IntegrationCacheEntry.collection_id.in_(collection_ids))
+        ).rowcount
+        if deleted:
+            with self._lock:
+                self.invalidations += deleted
+
+    def invalidate_note(self, connection: Connection, note_id: int) -> None:
+        """刪除包含指定筆記的所有合集的快取項目"""
+        collection_ids = connection.execute(
+            select(CollectionNote.collection_id).where(CollectionNote.note_id == note_id).distinct()
+        ).scalars().all()
+        self.invalidate_collections(connection, list(collection_ids))
+
+    def stats(self) -> dict:
+        """快取統計（供監控使用）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "write_errors": self.write_errors,
+            }
+
+def integration_partial_scope(prompt: Optional[str], model: str) -> str:
+    """區塊整理結果的範圍：同一合集、提示詞與模型的整合共用"""
+    raw = json.dumps({"prompt": prompt or "", "model": model}, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class CollectionPartials(PartialSummaryStore):
+    """某個合集在指定範圍（提示詞與模型）下的區塊整理結果"""
+
+    def __init__(self, cache: "IntegrationPartialCache", collection_id: int, scope: str):
+        self.cache = cache
+        self.collection_id = collection_id
+        self.scope = scope
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        return self.cache.get_many(self.collection_id, keys)
+
+    def put_many(self, summaries: Dict[str, str]) -> None:
+        self.cache.put_many(self.collection_id, self.scope, summaries)
+
+    def retain(self, keys: List[str]) -> None:
+        self.cache.retain(self.collection_id, self.scope, keys)
+
+class IntegrationPartialCache:
+    """存在 integration_partials 資料表的區塊整理結果，max_entries 為 0 時停用增量整合
+
+    與結果快取相同，讀寫失敗只記錄警告：最差情況是重新整理所有區塊。
+    """
+
+    def __init__(self, max_entries: int, session_factory=SessionLocal):
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.pruned = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def for_collection(self, collection_id: int, prompt: Optional[str], model: str) -> Optional[CollectionPartials]:
+        """取得合集的區塊整理結果儲存，停用時回傳 None"""
+        if not self.enabled:
+            return None
+        return CollectionPartials(self, collection_id, integration_partial_scope(prompt, model))
+
+    def get_many(self, collection_id: int, keys: List[str]) -> Dict[str, str]:
+        """取得已保存的區塊整理結果，並更新最近使用時間"""
+        if not keys:
+            return {}
+        try:
+            with self.session_factory() as db:
+                found = dict(db.execute(
+                    select(IntegrationPartialSummary.key, IntegrationPartialSummary.content).where(
+                        IntegrationPartialSummary.collection_id == collection_id,
+                        IntegrationPartialSummary.key.in_(keys)
+                    )
+                ).all())
+                if found:
+                    db.execute(
+                        update(IntegrationPartialSummary).where(
+                            IntegrationPartialSummary.collection_id == collection_id,
+                            IntegrationPartialSummary.key.in_(list(found))
+                        ).values(last_used_at=datetime.utcnow())
+                    )
+                    db.commit()
+        except SQLAlchemyError as e:
+            self._error("讀取", e)
+            return {}
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, collection_id: int, scope: str, summaries: Dict[str, str]) -> None:
+        """保存區塊整理結果，超過上限時淘汰最久未使用的項目"""
+        if not summaries:
+            return
+        now = datetime.utcnow()
+        try:
+            with self.session_factory() as db:
+                for key, content in summaries.items():
+                    db.merge(IntegrationPartialSummary(
+                        collection_id=collection_id,
+                        key=key,
+                        scope=scope,
+                        content=content,
+                        created_at=now,
+                        last_used_at=now
+                    ))
+                db.flush()
+
+                # 保留最近使用的 max_entries 筆，其餘刪除
+                oldest_kept = db.execute(
+                    select(IntegrationPartialSummary.last_used_at).order_by(
+                        IntegrationPartialSummary.last_used_at.desc()
+                    ).offset(self.max_entries - 1).limit(1)
+                ).scalar()
+                evicted = 0
+                if oldest_kept is not None:
+                    evicted = db.execute(
+                        delete(IntegrationPartialSummary).where(IntegrationPartialSummary.last_used_at < oldest_kept)
+                    ).rowcount
+                db.commit()
+        except SQLAlchemyError as e:
+            self._error("寫入", e)
+            return
+
+        with self._lock:
+            self.writes += len(summaries)
+            self.evictions += evicted
+
+    def retain(self, collection_id: int, scope: str, keys: List[str]) -> None:
+        """刪除合集在此範圍內、這次整合沒有用到的區塊整理結果"""
+        try:
+            with self.session_factory() as db:
+                pruned = db.execute(
+                    delete(IntegrationPartialSummary).where(
+                        IntegrationPartialSummary.collection_id == collection_id,
+                        IntegrationPartialSummary.scope == scope,
+                        IntegrationPartialSummary.key.not_in(keys)
+                    )
+                ).rowcount
+                db.commit()
+        except SQLAlchemyError as e:
+            self._error("清除", e)
+            return
+
+        if pruned:
+            with self._lock:
+                self.pruned += pruned
+
+    def _error(self, action: str, error: Exception) -> None:
+        print(f"警告：{action}區塊整理結果失敗: {error}")
+        with self._lock:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        """統計（供監控使用）"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "writes": self.writes,
+                "pruned": self.pruned,
+                "evictions": self.evictions,
+                "errors": self.errors,
+            }
+
+integration_cache = IntegrationResultCache(max_entries=settings.INTEGRATION_CACHE_MAX_ENTRIES)
+register_collector("integration_cache", integration_cache.stats)
+
+integration_partials = IntegrationPartialCache(max_entries=settings.INTEGRATION_PARTIAL_MAX_ENTRIES)
+register_collector("integration_partials", integration_partials.stats)
+
+@event.listens_for(Note, "after_update")
+@event.listens_for(Note, "after_delete")
+def _invalidate_changed_note(mapper, connection, target):
+    if integration_cache.enabled:
+        integration_cache.invalidate_note(connection, target.id)
+
+@event.listens_for(CollectionNote, "after_insert")
+@event.listens_for(CollectionNote, "after_update")
+@event.listens_for(CollectionNote, "after_delete")
+def _invalidate_changed_collection(mapper, connection, target):
+    if integration_cache.enabled:
+        integration_cache.invalidate_collections(connection, [target.collection_id])
@@ -0,0 +1,454 @@
+"""
+AI 整合背景工作 - 將整合請求排入工作池執行，並保存狀態與結果供查詢
+
+工作儲存方式可替換（INTEGRATION_JOB_STORE）：
+- database：存在應用程式的資料庫（預設，SQLite 即可運作，多個 worker 可共享查詢）
+- memory：只存在目前行程的記憶體中（單一行程部署或測試使用）
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from ..core.config import settings
+from ..core.metrics import register_collector
+from ..database import SessionLocal
+from ..models import IntegrationJob
+from .ai_integration import IntegrationResult
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+UNFINISHED_STATUSES = (QUEUED, RUNNING)
+
+# 清除過期工作結果的最短間隔（秒），於排入或完成工作時順便執行
+PURGE_INTERVAL_SECONDS = 600
+
+# IntegrationJob 的欄位（用於在儲存層之間複製工作快照）
+JOB_FIELDS = tuple(column.key for column in IntegrationJob.__table__.columns)
+
+class IntegrationQueueFull(Exception):
+    """整合工作池已滿"""
+
+class JobStore:
+    """工作儲存介面：回傳的 IntegrationJob 皆為不屬於任何 session 的快照"""
+
+    def create(self, job: IntegrationJob) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[IntegrationJob]:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def transition(self, job_id: str, statuses: Tuple[str, ...], **fields) -> bool:
+        """工作狀態為 statuses 之一時才更新，回傳是否更新（避免覆寫其他程序已寫入的結果）"""
+        raise NotImplementedError
+
+    def purge(self, before: datetime) -> int:
+        """刪除 before 之前結束的工作，回傳刪除數量"""
+        raise NotImplementedError
+
+class InMemoryJobStore(JobStore):
+    """行程內的工作儲存，重新啟動後工作即消失"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: IntegrationJob) -> None:
+        with self._lock:
+            self._jobs[job.id] = {key: getattr(job, key) for key in JOB_FIELDS}
+
+    def get(self, job_id: str) -> Optional[IntegrationJob]:
+        with self._lock:
+            values = self._jobs.get(job_id)
+            return IntegrationJob(**values) if values is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        fields.setdefault("updated_at", datetime.utcnow())
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def transition(self, job_id: str, statuses: Tuple[str, ...], **fields) -> bool:
+        fields.setdefault("updated_at", datetime.utcnow())
+        with self._lock:
+            values = self._jobs.get(job_id)
+            if values is None or values["status"] not in statuses:
+                return False
+            values.update(fields)
+            return True
+
+    def purge(self, before: datetime) -> int:
+        with self._lock:
+            expired = [
+                job_id for job_id, values in self._jobs.items()
+                if values["status"] in FINISHED_STATUSES and values["updated_at"] < before
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+            return len(expired)
+
+class DatabaseJobStore(JobStore):
+    """存在 integration_jobs 資料表的工作儲存"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    def create(self, job: IntegrationJob) -> None:
+        with self.session_factory() as db:
+            db.add(IntegrationJob(**{key: getattr(job, key) for key in JOB_FIELDS}))
+            db.commit()
+
+    def get(self, job_id: str) -> Optional[IntegrationJob]:
+        with self.session_factory() as db:
+            job = db.get(IntegrationJob, job_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+
+    def update(self, job_id: str, **fields) -> None:
+        fields.setdefault("updated_at", datetime.utcnow())
+        with self.session_factory() as db:
+            db.query(IntegrationJob).filter(IntegrationJob.id == job_id).update(
+                fields, synchronize_session=False
+            )
+            db.commit()
+
+    def transition(self, job_id: str, statuses: Tuple[str, ...], **fields) -> bool:
+        fields.setdefault("updated_at", datetime.utcnow())
+        with self.session_factory() as db:
+            updated = db.query(IntegrationJob).filter(
+                IntegrationJob.id == job_id,
+                IntegrationJob.status.in_(statuses)
+            ).update(fields, synchronize_session=False)
+            db.commit()
+            return updated == 1
+
+    def purge(self, before: datetime) -> int:
+        with self.session_factory() as db:
+            deleted = db.query(IntegrationJob).filter(
+                IntegrationJob.status.in_(FINISHED_STATUSES),
+                IntegrationJob.updated_at < before
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+
+def create_job_store(kind: str) -> JobStore:
+    """依設定建立工作儲存"""
+    if kind == "memory":
+        return InMemoryJobStore()
+    if kind == "database":
+        return DatabaseJobStore()
+    raise ValueError(f"未知的 INTEGRATION_JOB_STORE: {kind}")
+
+class IntegrationJobQueue:
+    """以執行緒池執行整合工作
+
+    - 同時執行的工作數由 workers 限制，未結束的工作數超過 workers + max_pending
+      時拒絕新工作（IntegrationQueueFull）
+    - 工作拋出 RuntimeError（API 錯誤、逾時等）時以指數退避重試 max_retries 次；
+      ValueError 視為輸入錯誤，不重試
+    - 執行中的工作在每個區塊或階段完成時更新心跳（heartbeat）；執行中的工作
+      超過 stale_seconds 沒有心跳、或排隊中但不屬於目前行程的工作超過 stale_seconds
+      未開始（例如行程重新啟動），查詢時視為失敗
+    - 已被視為失敗的工作不會再開始或寫入結果
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int,
+        max_pending: int,
+        max_retries: int,
+        retry_backoff: float,
+        result_ttl: int,
+        stale_seconds: int
+    ):
+        self.store = store
+        self.workers = workers
+        self.capacity = workers + max_pending
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.result_ttl = result_ttl
+        self.stale_seconds = stale_seconds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._unfinished = 0
+        self._next_purge = 0.0
+        # 目前行程排入、尚未結束的工作；排隊中的這些工作不會因為等待過久而視為失敗
+        self._owned = set()
+        # 工作執行緒正在執行的工作 id（heartbeat 使用）
+        self._current = threading.local()
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self.completed_from_cache = 0
+        self.reserved = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="integration"
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """建立工作池並清除過期的工作結果（於應用啟動時呼叫）"""
+        self._get_executor()
+        self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """清除超過 result_ttl 的已結束工作，回傳刪除數量"""
+        with self._lock:
+            self._next_purge = time.monotonic() + PURGE_INTERVAL_SECONDS
+        return self.store.purge(datetime.utcnow() - timedelta(seconds=self.result_ttl))
+
+    def _maybe_purge(self) -> None:
+        """距離上次清除超過 PURGE_INTERVAL_SECONDS 時清除過期工作，長時間執行的行程不會累積舊結果"""
+        with self._lock:
+            due = time.monotonic() >= self._next_purge
+        if due:
+            self.purge_expired()
+
+    def shutdown(self) -> None:
+        """停止工作池，尚未開始的工作會被取消（查詢時依 stale_seconds 視為失敗）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._owned.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self,
+        task: Callable[[], IntegrationResult],
+        collection_id: int,
+        note_count: int,
+        user_id: Optional[int] = None
+    ) -> IntegrationJob:
+        """排入整合工作；task 回傳整合結果
+
+        Raises:
+            IntegrationQueueFull: 未結束的工作數已達上限
+        """
+        with self._lock:
+            if self._unfinished >= self.capacity:
+                self.rejected += 1
+                raise IntegrationQueueFull()
+            self._unfinished += 1
+            self.submitted += 1
+
+        self._maybe_purge()
+        job = self._new_job(collection_id, note_count, user_id)
+
+        try:
+            self.store.create(job)
+            with self._lock:
+                self._owned.add(job.id)
+            self._get_executor().submit(self._run, job.id, task)
+        except Exception:
+            self._finish(FAILED, job.id)
+            raise
+
+        return job
+
+    def reserve(self) -> Callable[[], None]:
+        """為不經過工作池、在請求中直接執行的整合（SSE 串流）佔用一個名額
+
+        與背景工作共用 workers + max_pending 的上限，回傳釋放名額的函式（可重複呼叫）。
+
+        Raises:
+            IntegrationQueueFull: 未結束的工作數已達上限
+        """
+        with self._lock:
+            if self._unfinished >= self.capacity:
+                self.rejected += 1
+                raise IntegrationQueueFull()
+            self._unfinished += 1
+            self.reserved += 1
+
+        released = []
+
+        def release() -> None:
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self._unfinished -= 1
+
+        return release
+
+    def complete(
+        self,
+        integrated_content: str,
+        collection_id: int,
+        note_count: int,
+        user_id: Optional[int] = None
+    ) -> IntegrationJob:
+        """建立已完成的工作（整合結果來自快取，不佔用工作池）"""
+        self._maybe_purge()
+        job = self._new_job(collection_id, note_count, user_id)
+        job.status = SUCCEEDED
+        job.integrated_content = integrated_content
+        job.finished_at = job.created_at
+        self.store.create(job)
+
+        with self._lock:
+            self.completed_from_cache += 1
+        return job
+
+    def _new_job(self, collection_id: int, note_count: int, user_id: Optional[int]) -> IntegrationJob:
+        now = datetime.utcnow()
+        return IntegrationJob(
+            id=uuid.uuid4().hex,
+            collection_id=collection_id,
+            user_id=user_id,
+            status=QUEUED,
+            attempts=0,
+            note_count=note_count,
+            integrated_content=None,
+            chunk_count=None,
+            timings=None,
+            error=None,
+            created_at=now,
+            updated_at=now,
+            finished_at=None
+        )
+
+    def get(self, job_id: str) -> Optional[IntegrationJob]:
+        """查詢工作；過久沒有心跳的未完成工作視為失敗"""
+        job = self.store.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+
+        with self._lock:
+            owned = job_id in self._owned
+        # 目前行程排入的工作仍在排隊時只是在等待工作執行緒，不視為中斷
+        if job.status == QUEUED and owned:
+            return job
+
+        if job.updated_at < datetime.utcnow() - timedelta(seconds=self.stale_seconds):
+            error = "整合工作已中斷，請重新整合"
+            if self.store.transition(
+                job_id, (job.status,), status=FAILED, error=error, finished_at=datetime.utcnow()
+            ):
+                job.status = FAILED
+                job.error = error
+            else:
+                # 狀態剛好在查詢後改變（例如工作完成），以最新的狀態為準
+                return self.store.get(job_id)
+
+        return job
+
+    def heartbeat(self) -> None:
+        """更新目前執行緒正在執行的工作的 updated_at，表示工作仍在進行
+
+        供整合流程在每個區塊或階段完成時呼叫；不在工作中呼叫時不做任何事。
+        """
+        job_id = getattr(self._current, "job_id", None)
+        if job_id is None:
+            return
+        try:
+            self.store.transition(job_id, (RUNNING,))
+        except Exception as e:
+            print(f"警告：更新整合工作心跳失敗（{job_id}）: {e}")
+
+    def _finish(self, status: str, job_id: str) -> None:
+        with self._lock:
+            self._owned.discard(job_id)
+            self._unfinished -= 1
+            if status == SUCCEEDED:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def _run(self, job_id: str, task: Callable[[], IntegrationResult]) -> None:
+        status = FAILED
+        self._current.job_id = job_id
+        try:
+            for attempt in range(1, self.max_retries + 2):
+                # 已被視為中斷（FAILED）的工作不再執行
+                if not self.store.transition(job_id, UNFINISHED_STATUSES, status=RUNNING, attempts=attempt):
+                    return
+                try:
+                    result = task()
+                except RuntimeError as e:
+                    if attempt > self.max_retries:
+                        self._fail(job_id, str(e))
+                        return
+                    with self._lock:
+                        self.retries += 1
+                    # 退避期間佔用工作執行緒，讓重試同樣受並行上限約束
+                    time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                except Exception as e:
+                    self._fail(job_id, str(e))
+                    return
+                else:
+                    try:
+                        saved = self.store.transition(
+                            job_id,
+                            (RUNNING,),
+                            status=SUCCEEDED,
+                            integrated_content=result.content,
+                            chunk_count=result.chunk_count,
+                            timings=result.timings,
+                            finished_at=datetime.utcnow()
+                        )
+                    except Exception as e:
+                        print(f"警告：儲存整合結果失敗（{job_id}）: {e}")
+                        self._fail(job_id, f"儲存整合結果失敗: {e}")
+                        return
+                    # 執行期間已被視為中斷的工作維持 FAILED，不改為成功
+                    if saved:
+                        status = SUCCEEDED
+                    return
+        except Exception as e:
+            # 更新狀態本身失敗（例如資料庫暫時無法寫入），工作會在 stale_seconds 後視為失敗
+            print(f"警告：整合工作執行失敗（{job_id}）: {e}")
+        finally:
+            self._current.job_id = None
+            self._finish(status, job_id)
+
+    def _fail(self, job_id: str, error: str) -> None:
+        try:
+            self.store.transition(
+                job_id, UNFINISHED_STATUSES, status=FAILED, error=error, finished_at=datetime.utcnow()
+            )
+        except Exception as e:
+            print(f"警告：更新整合工作狀態失敗（{job_id}）: {e}")
+
+    def stats(self) -> dict:
+        """工作池統計（供監控使用）"""
+        with self._lock:
+            return {
+                "store": type(self.store).__name__,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "unfinished": self._unfinished,
+                "submitted": self.submitted,
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "retries": self.retries,
+                "rejected": self.rejected,
+                "completed_from_cache": self.completed_from_cache,
+                "reserved": self.reserved,
+            }
+
+integration_queue = IntegrationJobQueue(
+    store=create_job_store(settings.INTEGRATION_JOB_STORE),
+    workers=settings.INTEGRATION_WORKERS,
+    max_pending=settings.INTEGRATION_MAX_PENDING,
+    max_retries=settings.INTEGRATION_MAX_RETRIES,
+    retry_backoff=settings.INTEGRATION_RETRY_BACKOFF_SECONDS,
+    result_ttl=settings.INTEGRATION_RESULT_TTL_SECONDS,
+    stale_seconds=settings.INTEGRATION_JOB_STALE_SECONDS
+)
+register_collector("integration_jobs", integration_queue.stats)
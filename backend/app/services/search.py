@@ -0,0 +1,287 @@
+"""
+全文搜尋服務 - 筆記的全文索引與排序查詢
+
+SQLite 使用 FTS5 虛擬表（BM25 排序），PostgreSQL 使用 tsvector + GIN 索引。
+中日韓文字在寫入索引前先切成重疊的雙字詞（bigram），讓沒有空白分隔的
+中文也能做子字串比對；英數字詞則以前綴比對支援邊打邊搜。
+"""
+import argparse
+import re
+import sys
+from typing import List, Optional, Union
+from sqlalchemy import event, inspect, text, select, func, or_, table, column, literal_column
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import Select
+from ..core.config import settings
+from ..models import Note, NoteContent
+from ..models.note import read_note_content
+from ..models.note_content import FULL_TEXT_DIALECTS, decode_content
+
+# 中日韓文字範圍（假名、CJK 統一漢字、擴充 A、相容漢字、韓文音節）
+_CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_WORD_RE = re.compile(r"[^\W_]+")
+_CJK_SPLIT_RE = re.compile(f"([{_CJK_CHARS}]+)")
+_CJK_RUN_RE = re.compile(f"^[{_CJK_CHARS}]+$")
+
+# 標題在排序中的權重（相對於內容）
+_TITLE_WEIGHT = 10.0
+_CONTENT_WEIGHT = 1.0
+
+# 重建索引時每批處理的筆記數
+_REBUILD_BATCH_SIZE = 500
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "title, content, tokenize='unicode61 remove_diacritics 2')",
+]
+
+_POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS notes_fts ("
+    "note_id INTEGER PRIMARY KEY REFERENCES notes(id) ON DELETE CASCADE, "
+    "document TSVECTOR NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_notes_fts_document ON notes_fts USING GIN (document)",
+]
+
+# 全文索引是否可用（由 configure_search 設定）
+_state = {"enabled": False}
+
+
+def _split_word(word: str) -> List[str]:
+    """將一個字詞拆成中日韓片段與其他片段"""
+    return [part for part in _CJK_SPLIT_RE.split(word) if part]
+
+
+def _cjk_tokens(run: str) -> List[str]:
+    """中日韓片段切成重疊雙字詞，並補上結尾單字以支援單字前綴查詢"""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def segment_text(value: Optional[str]) -> str:
+    """將文字轉成寫入索引用的斷詞結果（以空白分隔）"""
+    if not value:
+        return ""
+
+    tokens = []
+    for word in _WORD_RE.findall(value.lower()):
+        for part in _split_word(word):
+            if _CJK_RUN_RE.match(part):
+                tokens.extend(_cjk_tokens(part))
+            else:
+                tokens.append(part)
+    return " ".join(tokens)
+
+
+def _query_terms(q: str) -> List[List[str]]:
+    """將搜尋字串轉成查詢詞組
+
+    每個詞組是一串必須相鄰出現的 token；最後一個 token 以前綴比對。
+    """
+    terms = []
+    for word in _WORD_RE.findall(q.lower()):
+        for part in _split_word(word):
+            if _CJK_RUN_RE.match(part) and len(part) > 1:
+                terms.append([part[i:i + 2] for i in range(len(part) - 1)])
+            else:
+                terms.append([part])
+    return terms
+
+
+def build_match_query(q: str, dialect: str) -> Optional[str]:
+    """依資料庫類型產生全文檢索查詢字串，沒有可用字詞時回傳 None"""
+    terms = _query_terms(q)
+    if not terms:
+        return None
+
+    if dialect == "sqlite":
+        # FTS5：以雙引號包住詞組，結尾加 * 做前綴比對，詞組之間為 AND
+        return " ".join(f'"{" ".join(tokens)}"*' for tokens in terms)
+
+    # PostgreSQL tsquery：<-> 表示相鄰，:* 表示前綴
+    phrases = []
+    for tokens in terms:
+        parts = tokens[:-1] + [f"{tokens[-1]}:*"]
+        phrases.append(f"({' <-> '.join(parts)})")
+    return " & ".join(phrases)
+
+
+def is_enabled() -> bool:
+    """全文索引是否可用"""
+    return _state["enabled"]
+
+
+def _supports_fts5(connection: Connection) -> bool:
+    try:
+        connection.execute(text("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)"))
+        connection.execute(text("DROP TABLE temp._fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def _upsert(connection: Connection, note_id: int, title: str, content: str) -> None:
+    params = {
+        "id": note_id,
+        "title": segment_text(title),
+        "content": segment_text(content),
+    }
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), params)
+        connection.execute(
+            text("INSERT INTO notes_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+            params
+        )
+    else:
+        connection.execute(
+            text(
+                "INSERT INTO notes_fts (note_id, document) VALUES (:id, "
+                "setweight(to_tsvector('simple', :title), 'A') || "
+                "setweight(to_tsvector('simple', :content), 'B')) "
+                "ON CONFLICT (note_id) DO UPDATE SET document = EXCLUDED.document"
+            ),
+            params
+        )
+
+
+def _delete(connection: Connection, note_id: int) -> None:
+    key = "rowid" if connection.dialect.name == "sqlite" else "note_id"
+    connection.execute(text(f"DELETE FROM notes_fts WHERE {key} = :id"), {"id": note_id})
+
+
+def rebuild_search_index(connection: Connection) -> int:
+    """清空並重建全文索引，回傳索引的筆記數量"""
+    connection.execute(text("DELETE FROM notes_fts"))
+
+    count = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            select(Note.id, Note.title, NoteContent.encoding, NoteContent.text, NoteContent.data)
+            .join(NoteContent, NoteContent.hash == Note.content_hash)
+            .where(Note.id > last_id)
+            .order_by(Note.id)
+            .limit(_REBUILD_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            _upsert(connection, row.id, row.title, decode_content(row.encoding, row.text, row.data))
+        count += len(rows)
+        last_id = rows[-1].id
+
+    return count
+
+
+def create_search_index(connection: Connection) -> bool:
+    """建立全文索引結構（遷移 0004 與 DB_AUTO_CREATE 時使用，已存在時不變）
+
+    Returns:
+        是否已建立；資料庫不支援（或 SQLite 未編譯 FTS5）時回傳 False
+    """
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return False
+    if dialect == "sqlite" and not _supports_fts5(connection):
+        print("警告：SQLite 未編譯 FTS5，無法建立全文索引；請設定 SEARCH_FULL_TEXT=false 使用 ILIKE 比對")
+        return False
+
+    for statement in _SQLITE_DDL if dialect == "sqlite" else _POSTGRES_DDL:
+        connection.execute(text(statement))
+    return True
+
+
+def configure_search(engine: Engine) -> bool:
+    """依 SEARCH_FULL_TEXT 與資料庫類型決定是否使用全文索引（應用啟動時呼叫）
+
+    只設定狀態，不執行 DDL 或查詢；索引結構由遷移 0004 建立，之後由寫入時的事件保持同步。
+    停用期間的寫入不會同步，重新啟用前需執行 python -m app.services.search rebuild。
+
+    Returns:
+        全文索引是否可用；不可用時搜尋會退回 ILIKE 比對
+    """
+    _state["enabled"] = settings.SEARCH_FULL_TEXT and engine.dialect.name in FULL_TEXT_DIALECTS
+    return _state["enabled"]
+
+
+def apply_search(query: Union[Query, Select], q: str, dialect: str):
+    """在筆記查詢（Query 或 select()）上套用搜尋條件與排序
+
+    全文索引可用時以相關度排序（同分再依更新時間），
+    否則退回標題／內容的 ILIKE 比對並依更新時間排序。全文索引停用時內容不壓縮
+    （見 note_content.compression_codec）；啟用期間壓縮存放的內容只比對開頭片段。
+    """
+    match = build_match_query(q, dialect) if is_enabled() else None
+
+    if match is None:
+        pattern = f"%{q}%"
+        return query.filter(
+            or_(
+                Note.title.ilike(pattern),
+                Note.excerpt.ilike(pattern),
+                Note.body.has(NoteContent.text.ilike(pattern))
+            )
+        ).order_by(Note.updated_at.desc())
+
+    if dialect == "sqlite":
+        fts = table("notes_fts", column("rowid"))
+        fts_table = literal_column("notes_fts")
+        ranked = select(
+            fts.c.rowid.label("note_id"),
+            func.bm25(fts_table, _TITLE_WEIGHT, _CONTENT_WEIGHT).label("rank")
+        ).where(fts_table.op("MATCH")(match)).subquery()
+    else:
+        fts = table("notes_fts", column("note_id"), column("document"))
+        ts_query = func.to_tsquery("simple", match)
+        ranked = select(
+            fts.c.note_id.label("note_id"),
+            (-func.ts_rank_cd(fts.c.document, ts_query)).label("rank")
+        ).where(fts.c.document.op("@@")(ts_query)).subquery()
+
+    # bm25 與負的 ts_rank_cd 都是數值越小越相關
+    return query.join(ranked, ranked.c.note_id == Note.id).order_by(
+        ranked.c.rank, Note.updated_at.desc()
+    )
+
+
+@event.listens_for(Note, "after_insert")
+def _index_inserted_note(mapper, connection, target):
+    if is_enabled():
+        _upsert(connection, target.id, target.title, read_note_content(connection, target))
+
+
+@event.listens_for(Note, "after_update")
+def _index_updated_note(mapper, connection, target):
+    if not is_enabled():
+        return
+    state = inspect(target)
+    if state.attrs.title.history.has_changes() or state.attrs.content_hash.history.has_changes():
+        _upsert(connection, target.id, target.title, read_note_content(connection, target))
+
+
+@event.listens_for(Note, "after_delete")
+def _unindex_deleted_note(mapper, connection, target):
+    if is_enabled():
+        _delete(connection, target.id)
+
+
+def main(argv=None) -> int:
+    """命令列入口：python -m app.services.search rebuild"""
+    parser = argparse.ArgumentParser(prog="python -m app.services.search", description="筆記全文索引")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild：清空並重建全文索引")
+    parser.parse_args(argv)
+
+    from ..database import engine
+
+    with engine.begin() as connection:
+        if not create_search_index(connection):
+            print("此資料庫不支援全文索引")
+            return 1
+        count = rebuild_search_index(connection)
+    print(f"已重建全文索引：{count} 篇筆記")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+API 基準測試 - 產生測試資料後，以行程內的 ASGI 客戶端逐一壓測 auth / notes / collections 的所有端點
+
+    python -m benchmarks                          # 預設資料量，結果輸出為表格
+    python -m benchmarks --save baseline          # 另存為 benchmarks/baselines/baseline.json
+    python -m benchmarks --compare baseline       # 與基準比較，有退化時結束碼為 1
+
+各端點回報 p50/p95/p99 延遲、吞吐量與每個請求的 SQL 語句數；
+AI 整合使用本機假模型（AI_PROVIDER=fake），不需要 API 金鑰與網路。
+"""
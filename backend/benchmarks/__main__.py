@@ -0,0 +1,97 @@
+"""
+基準測試的命令列入口：python -m benchmarks --help
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="API 基準測試")
+    parser.add_argument("--database-url", default="",
+                        help="資料庫連線字串（預設為暫存的 SQLite 資料庫）；既有資料庫需先 alembic upgrade head")
+    parser.add_argument("--async-db", action="store_true", help="使用非同步路由（ASYNC_DB）")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--notes-per-user", type=int, default=40)
+    parser.add_argument("--collections-per-user", type=int, default=5)
+    parser.add_argument("--notes-per-collection", type=int, default=20)
+    parser.add_argument("--median-note-chars", type=int, default=1500)
+    parser.add_argument("--seed", type=int, default=0, help="資料與請求目標的亂數種子")
+    parser.add_argument("--requests", type=int, default=200, help="每個情境計時的請求數")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None, help="覆寫 BCRYPT_ROUNDS（登入與註冊的成本）")
+    parser.add_argument("--only", default="", help="只執行名稱包含此字串的情境")
+    parser.add_argument("--save", metavar="NAME", help="將結果存為基準 benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="與基準比較，有退步時結束碼為 1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 延遲超過基準多少比例視為退步")
+    return parser.parse_args(argv)
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """設定必須在匯入 app 之前決定的環境變數"""
+    database_url = args.database_url
+    if not database_url:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="noote-bench-"), "bench.db")
+        os.environ["DB_AUTO_CREATE"] = "true"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["AI_PROVIDER"] = "fake"
+    os.environ["FAKE_AI_LATENCY_SECONDS"] = "0"
+    os.environ["FAKE_AI_TOKENS_PER_SECOND"] = "0"
+    os.environ["FAKE_AI_FAILURE_RATE"] = "0"
+    if args.async_db:
+        os.environ["ASYNC_DB"] = "true"
+    if args.bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+async def _run(args: argparse.Namespace):
+    from app.core import get_password_hash, settings
+    from app.database import engine
+    from app.main import app
+    from .report import format_table
+    from .runner import RunConfig, run_benchmarks
+    from .scenarios import SCENARIOS, BenchContext
+    from .seed import PASSWORD, SeedConfig, seed_database
+
+    async with app.router.lifespan_context(app):
+        config = SeedConfig(
+            users=args.users,
+            notes_per_user=args.notes_per_user,
+            collections_per_user=args.collections_per_user,
+            notes_per_collection=args.notes_per_collection,
+            median_note_chars=args.median_note_chars,
+            seed=args.seed,
+        )
+        print(f"寫入測試資料（{config.users} 位用戶、{config.users * config.notes_per_user} 則筆記）...")
+        data = seed_database(engine, config, get_password_hash(PASSWORD))
+        print(f"資料庫：{settings.DATABASE_URL}（ASYNC_DB={settings.ASYNC_DB}）")
+
+        run_config = RunConfig(requests=args.requests, concurrency=args.concurrency, warmup=args.warmup)
+        results = await run_benchmarks(app, BenchContext(data, seed=args.seed), SCENARIOS, run_config, args.only)
+    print(format_table(results))
+    return results
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+
+    from .report import compare, load_baseline, save_baseline
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    results = asyncio.run(_run(args))
+
+    if args.save:
+        meta = {key: value for key, value in vars(args).items() if key not in ("save", "compare", "database_url")}
+        print(f"已保存基準：{save_baseline(args.save, results, meta)}")
+
+    if baseline is not None:
+        table, regressions = compare(results, baseline, args.threshold)
+        print()
+        print(table)
+        if regressions:
+            print(f"\n{len(regressions)} 個情境退步：{', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
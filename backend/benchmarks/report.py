@@ -0,0 +1,90 @@
+"""
+壓測報告 - 輸出結果表格、保存基準並與基準比較
+"""
+import json
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+from app.core.config import settings
+from .runner import ScenarioResult
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+_COLUMNS = ["p50_ms", "p95_ms", "p99_ms", "throughput_rps", "queries_per_request", "errors"]
+_HEADERS = ["p50 ms", "p95 ms", "p99 ms", "req/s", "SQL/req", "errors"]
+
+def format_table(results: List[ScenarioResult]) -> str:
+    name_width = max([len("scenario")] + [len(result.name) for result in results])
+    lines = ["  ".join(["scenario".ljust(name_width)] + [header.rjust(9) for header in _HEADERS])]
+    for result in results:
+        summary = result.summary()
+        lines.append("  ".join(
+            [result.name.ljust(name_width)] + [f"{summary[column]:9g}" for column in _COLUMNS]
+        ))
+        for sample in result.error_samples:
+            lines.append(f"    ! {sample}")
+    return "\n".join(lines)
+
+def baseline_path(name: str) -> Path:
+    return BASELINE_DIR / f"{name}.json"
+
+def save_baseline(name: str, results: List[ScenarioResult], meta: Dict) -> Path:
+    """將結果寫入 benchmarks/baselines/<name>.json"""
+    path = baseline_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "version": settings.VERSION,
+        "python": platform.python_version(),
+        "meta": meta,
+        "results": {result.name: result.summary() for result in results},
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return path
+
+def load_baseline(name: str) -> Dict:
+    path = baseline_path(name)
+    if not path.exists():
+        raise FileNotFoundError(f"找不到基準：{path}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def compare(results: List[ScenarioResult], baseline: Dict, threshold: float) -> Tuple[str, List[str]]:
+    """與基準比較，回傳 (比較表格, 退步的情境)
+
+    p95 延遲超過基準的 (1 + threshold) 倍，或每個請求的 SQL 查詢數增加，都視為退步；
+    查詢數不受機器負載影響，只要增加就是程式的改變。
+    """
+    previous = baseline.get("results", {})
+    name_width = max([len("scenario")] + [len(result.name) for result in results])
+    lines = ["  ".join(["scenario".ljust(name_width), "base p95".rjust(9), "p95".rjust(9), "change".rjust(8),
+                        "base SQL".rjust(8), "SQL".rjust(6), ""])]
+    regressions = []
+    for result in results:
+        summary = result.summary()
+        base = previous.get(result.name)
+        if base is None:
+            lines.append(f"{result.name.ljust(name_width)}  （基準中沒有此情境）")
+            continue
+
+        change = summary["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        reasons = []
+        if change > threshold:
+            reasons.append("p95")
+        if summary["queries_per_request"] > base["queries_per_request"]:
+            reasons.append("SQL")
+        if summary["errors"] > base["errors"]:
+            reasons.append("errors")
+        if reasons:
+            regressions.append(result.name)
+
+        lines.append("  ".join([
+            result.name.ljust(name_width),
+            f"{base['p95_ms']:9g}",
+            f"{summary['p95_ms']:9g}",
+            f"{change:+8.1%}",
+            f"{base['queries_per_request']:8g}",
+            f"{summary['queries_per_request']:6g}",
+            ("退步：" + "/".join(reasons)) if reasons else "",
+        ]))
+    return "\n".join(lines), regressions
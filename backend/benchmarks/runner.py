@@ -0,0 +1,145 @@
+"""
+壓測執行 - 以行程內的 ASGI 客戶端對每個情境送出請求，統計延遲、吞吐量與 SQL 查詢數
+"""
+import asyncio
+import math
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+import httpx
+from sqlalchemy import event
+from .scenarios import API, BenchContext, Scenario
+
+@dataclass
+class RunConfig:
+    requests: int = 200  # 每個情境計時的請求數
+    concurrency: int = 8
+    warmup: int = 5  # 計時前依序送出的請求數，同時用來計算每個請求的 SQL 查詢數
+
+@dataclass
+class ScenarioResult:
+    name: str
+    requests: int
+    errors: int
+    duration: float
+    latencies_ms: List[float] = field(repr=False, default_factory=list)
+    queries_per_request: float = 0.0
+    error_samples: List[str] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.duration if self.duration else 0.0
+
+    def percentile(self, p: float) -> float:
+        """nearest-rank 百分位數（毫秒）"""
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "throughput_rps": round(self.throughput, 2),
+            "queries_per_request": round(self.queries_per_request, 2),
+        }
+
+class _StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+@contextmanager
+def count_statements():
+    """計算區塊內同步與非同步引擎送出的 SQL 語句數量"""
+    from app import database
+
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    counter = _StatementCounter()
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", counter)
+
+async def _send(client: httpx.AsyncClient, ctx: BenchContext, scenario: Scenario) -> httpx.Response:
+    kwargs = scenario.request(ctx)
+    url = API + kwargs.pop("url")
+    return await client.request(scenario.method, url, **kwargs)
+
+def _describe(response: httpx.Response) -> str:
+    return f"{response.status_code} {response.text[:200]}"
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    ctx: BenchContext,
+    scenario: Scenario,
+    config: RunConfig
+) -> ScenarioResult:
+    """執行一個情境：先準備目標、依序暖身並計算查詢數，再以 concurrency 個並行請求計時"""
+    if scenario.prepare is not None:
+        await scenario.prepare(ctx, client, config.warmup + config.requests)
+
+    errors: List[str] = []
+    with count_statements() as counter:
+        for _ in range(config.warmup):
+            response = await _send(client, ctx, scenario)
+            if response.status_code not in scenario.expected:
+                errors.append(_describe(response))
+    queries = counter.count / config.warmup if config.warmup else 0.0
+
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(config.concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await _send(client, ctx, scenario)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in scenario.expected:
+                errors.append(_describe(response))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(config.requests)))
+    duration = time.perf_counter() - started
+
+    return ScenarioResult(
+        name=scenario.name,
+        requests=config.requests,
+        errors=len(errors),
+        duration=duration,
+        latencies_ms=latencies,
+        queries_per_request=queries,
+        error_samples=errors[:3],
+    )
+
+async def run_benchmarks(
+    app,
+    ctx: BenchContext,
+    scenarios: Iterable[Scenario],
+    config: RunConfig,
+    only: Optional[str] = None
+) -> List[ScenarioResult]:
+    """依序執行情境；only 為名稱的子字串，只執行符合的情境"""
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        # 先讓每位用戶登入一次，填滿驗證快取，查詢數才不受情境的執行順序影響
+        for user_id in ctx.user_ids:
+            await client.get(f"{API}/auth/me", headers=ctx.headers(user_id))
+        for scenario in scenarios:
+            if only and only not in scenario.name:
+                continue
+            results.append(await run_scenario(client, ctx, scenario, config))
+    return results
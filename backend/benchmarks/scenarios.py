@@ -0,0 +1,255 @@
+"""
+壓測情境 - 每個端點一個情境，描述如何挑選目標、組成請求與預期的狀態碼
+
+會改變資料的情境（刪除、加入或移除合集筆記等）在計時前以 prepare 建立自己的目標，
+不會修改其他情境使用的種子資料。
+"""
+import itertools
+import random
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import httpx
+from app.core import create_access_token, settings
+from .seed import CJK_TERMS, PASSWORD, SeedData
+
+API = settings.API_V1_STR
+
+class BenchContext:
+    """壓測期間共用的狀態：種子資料、各用戶的 token 與 prepare 建立的目標"""
+
+    def __init__(self, data: SeedData, seed: int = 0):
+        self.data = data
+        self.rng = random.Random(seed)
+        self.tokens = {
+            user_id: create_access_token(data={"sub": username}) for user_id, username in data.usernames.items()
+        }
+        self.user_ids = sorted(data.usernames)
+        self.owned_collections = [
+            (user_id, collection_id)
+            for user_id, collection_ids in data.collections_by_user.items()
+            for collection_id in collection_ids
+        ]
+        self.pools: Dict[str, List[Any]] = defaultdict(list)
+        self._sequence = itertools.count()
+
+    def next_id(self) -> int:
+        return next(self._sequence)
+
+    def user(self) -> int:
+        return self.rng.choice(self.user_ids)
+
+    def headers(self, user_id: int) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[user_id]}"}
+
+    def own_note(self, user_id: int) -> int:
+        return self.rng.choice(self.data.notes_by_user[user_id])
+
+    def own_collection(self) -> Tuple[int, int]:
+        """隨機挑選一個種子合集，回傳 (擁有者, 合集 id)"""
+        return self.rng.choice(self.owned_collections)
+
+    def take(self, pool: str) -> Any:
+        return self.pools[pool].pop()
+
+Request = Dict[str, Any]
+Prepare = Callable[[BenchContext, httpx.AsyncClient, int], Awaitable[None]]
+
+@dataclass
+class Scenario:
+    """一個端點的壓測情境
+
+    Args:
+        name: 顯示名稱，也是基準結果的鍵
+        method: HTTP 方法
+        route: 路由的路徑（不含 API 前綴），用於檢查是否涵蓋所有端點
+        request: 產生 httpx 請求參數（url 不含 API 前綴）
+        expected: 視為成功的狀態碼
+        prepare: 計時前建立 n 個目標
+    """
+    name: str
+    method: str
+    route: str
+    request: Callable[[BenchContext], Request]
+    expected: Tuple[int, ...] = (200,)
+    prepare: Optional[Prepare] = None
+
+async def _post(client: httpx.AsyncClient, url: str, **kwargs) -> dict:
+    response = await client.post(API + url, **kwargs)
+    if response.status_code not in (200, 201):
+        raise RuntimeError(f"準備壓測資料失敗：POST {url} {response.status_code} {response.text}")
+    return response.json()
+
+def _prepare_notes(pool: str) -> Prepare:
+    async def prepare(ctx: BenchContext, client: httpx.AsyncClient, n: int) -> None:
+        for _ in range(n):
+            user_id = ctx.user()
+            note = await _post(client, "/notes/", json={"title": "待刪除筆記", "content": "內容"},
+                               headers=ctx.headers(user_id))
+            ctx.pools[pool].append((user_id, note["id"]))
+    return prepare
+
+def _prepare_collections(pool: str, note_count: int = 0) -> Prepare:
+    """建立 n 個合集（各自加入 note_count 則擁有者的筆記），目標為 (擁有者, 合集 id, 筆記 id)"""
+    async def prepare(ctx: BenchContext, client: httpx.AsyncClient, n: int) -> None:
+        for _ in range(n):
+            user_id = ctx.user()
+            headers = ctx.headers(user_id)
+            collection = await _post(client, "/collections/", json={"name": "壓測合集"}, headers=headers)
+            own_notes = ctx.data.notes_by_user[user_id]
+            note_ids = ctx.rng.sample(own_notes, min(note_count, len(own_notes)))
+            if note_ids:
+                await _post(client, f"/collections/{collection['id']}/notes:batch",
+                            json={"note_ids": note_ids}, headers=headers)
+            ctx.pools[pool].append((user_id, collection["id"], note_ids))
+    return prepare
+
+async def _prepare_etags(ctx: BenchContext, client: httpx.AsyncClient, n: int) -> None:
+    for _ in range(n):
+        note_id = ctx.rng.choice(ctx.data.public_note_ids)
+        response = await client.get(f"{API}/notes/{note_id}")
+        ctx.pools["etags"].append((note_id, response.headers["etag"]))
+
+def _register(ctx: BenchContext) -> Request:
+    username = f"bench_register_{ctx.rng.getrandbits(48):x}_{ctx.next_id()}"
+    return {"url": "/auth/register",
+            "json": {"username": username, "email": f"{username}@example.com", "password": PASSWORD}}
+
+def _login(ctx: BenchContext) -> Request:
+    return {"url": "/auth/login", "data": {"username": ctx.data.usernames[ctx.user()], "password": PASSWORD}}
+
+def _as_user(url: str, **kwargs) -> Callable[[BenchContext], Request]:
+    def request(ctx: BenchContext) -> Request:
+        return {"url": url, "headers": ctx.headers(ctx.user()), **kwargs}
+    return request
+
+def _public_note(ctx: BenchContext) -> Request:
+    return {"url": f"/notes/{ctx.rng.choice(ctx.data.public_note_ids)}"}
+
+def _note_if_none_match(ctx: BenchContext) -> Request:
+    note_id, etag = ctx.take("etags")
+    return {"url": f"/notes/{note_id}", "headers": {"If-None-Match": etag}}
+
+def _update_note(ctx: BenchContext) -> Request:
+    user_id = ctx.user()
+    return {"url": f"/notes/{ctx.own_note(user_id)}", "headers": ctx.headers(user_id),
+            "json": {"title": f"{ctx.rng.choice(CJK_TERMS)} 修訂 {ctx.next_id()}"}}
+
+def _delete_note(ctx: BenchContext) -> Request:
+    user_id, note_id = ctx.take("delete_note")
+    return {"url": f"/notes/{note_id}", "headers": ctx.headers(user_id)}
+
+def _search(ctx: BenchContext) -> Request:
+    return {"url": "/notes/search", "params": {"q": ctx.rng.choice(CJK_TERMS), "scope": "public"}}
+
+def _deep_page(url: str) -> Callable[[BenchContext], Request]:
+    def request(ctx: BenchContext) -> Request:
+        return {"url": url, "params": {"skip": ctx.rng.randint(1, 10) * 20, "limit": 20}}
+    return request
+
+def _public_collection(suffix: str = "") -> Callable[[BenchContext], Request]:
+    def request(ctx: BenchContext) -> Request:
+        return {"url": f"/collections/{ctx.rng.choice(ctx.data.public_collection_ids)}{suffix}"}
+    return request
+
+def _update_collection(ctx: BenchContext) -> Request:
+    user_id, collection_id = ctx.own_collection()
+    return {"url": f"/collections/{collection_id}", "headers": ctx.headers(user_id),
+            "json": {"description": f"更新 {ctx.next_id()}"}}
+
+def _delete_collection(ctx: BenchContext) -> Request:
+    user_id, collection_id, _ = ctx.take("delete_collection")
+    return {"url": f"/collections/{collection_id}", "headers": ctx.headers(user_id)}
+
+def _add_note(ctx: BenchContext) -> Request:
+    user_id, collection_id, _ = ctx.take("add_note")
+    return {"url": f"/collections/{collection_id}/notes", "headers": ctx.headers(user_id),
+            "json": {"note_id": ctx.own_note(user_id)}}
+
+def _batch_add(ctx: BenchContext) -> Request:
+    user_id, collection_id, _ = ctx.take("batch_add")
+    own_notes = ctx.data.notes_by_user[user_id]
+    return {"url": f"/collections/{collection_id}/notes:batch", "headers": ctx.headers(user_id),
+            "json": {"note_ids": ctx.rng.sample(own_notes, min(10, len(own_notes)))}}
+
+def _batch_remove(ctx: BenchContext) -> Request:
+    user_id, collection_id, note_ids = ctx.take("batch_remove")
+    return {"url": f"/collections/{collection_id}/notes:batch", "headers": ctx.headers(user_id),
+            "json": {"note_ids": note_ids}}
+
+def _remove_note(ctx: BenchContext) -> Request:
+    user_id, collection_id, note_ids = ctx.take("remove_note")
+    return {"url": f"/collections/{collection_id}/notes/{note_ids[0]}", "headers": ctx.headers(user_id)}
+
+def _reorder(ctx: BenchContext) -> Request:
+    user_id, collection_id = ctx.own_collection()
+    note_ids = list(ctx.data.collection_notes[collection_id])
+    ctx.rng.shuffle(note_ids)
+    return {"url": f"/collections/{collection_id}/notes/reorder", "headers": ctx.headers(user_id),
+            "json": {"note_ids": note_ids}}
+
+def _move(ctx: BenchContext) -> Request:
+    user_id, collection_id = ctx.own_collection()
+    note_ids = ctx.data.collection_notes[collection_id]
+    note_id, after_note_id = ctx.rng.sample(note_ids, 2) if len(note_ids) > 1 else (note_ids[0], None)
+    return {"url": f"/collections/{collection_id}/notes/{note_id}/position", "headers": ctx.headers(user_id),
+            "json": {"after_note_id": after_note_id}}
+
+def _integrate(suffix: str) -> Callable[[BenchContext], Request]:
+    def request(ctx: BenchContext) -> Request:
+        user_id, collection_id = ctx.own_collection()
+        return {"url": f"/collections/{collection_id}/{suffix}", "headers": ctx.headers(user_id),
+                "json": {"api_key": "", "custom_prompt": f"壓測 {ctx.rng.randint(1, 5)}"}}
+    return request
+
+SCENARIOS: List[Scenario] = [
+    # 認證
+    Scenario("POST /auth/register", "POST", "/auth/register", _register, (201,)),
+    Scenario("POST /auth/login", "POST", "/auth/login", _login),
+    Scenario("GET /auth/me", "GET", "/auth/me", _as_user("/auth/me")),
+    # 筆記
+    Scenario("POST /notes/", "POST", "/notes/",
+             _as_user("/notes/", json={"title": "壓測筆記", "content": "# 壓測\n\n內容"}), (201,)),
+    Scenario("GET /notes/ (first page)", "GET", "/notes/", lambda ctx: {"url": "/notes/", "params": {"limit": 20}}),
+    Scenario("GET /notes/ (deep offset)", "GET", "/notes/", _deep_page("/notes/")),
+    Scenario("GET /notes/my", "GET", "/notes/my", _as_user("/notes/my")),
+    Scenario("GET /notes/my (summary cursor)", "GET", "/notes/my",
+             _as_user("/notes/my", params={"view": "summary", "cursor": "", "limit": 20})),
+    Scenario("GET /notes/my (stream)", "GET", "/notes/my", _as_user("/notes/my", params={"stream": "true"})),
+    Scenario("GET /notes/search", "GET", "/notes/search", _search),
+    Scenario("GET /notes/{id}", "GET", "/notes/{note_id}", _public_note),
+    Scenario("GET /notes/{id} (If-None-Match)", "GET", "/notes/{note_id}", _note_if_none_match, (304,),
+             _prepare_etags),
+    Scenario("PUT /notes/{id}", "PUT", "/notes/{note_id}", _update_note),
+    Scenario("DELETE /notes/{id}", "DELETE", "/notes/{note_id}", _delete_note, (204,),
+             _prepare_notes("delete_note")),
+    # 合集
+    Scenario("POST /collections/", "POST", "/collections/",
+             _as_user("/collections/", json={"name": "壓測合集", "description": "描述"}), (201,)),
+    Scenario("GET /collections/ (first page)", "GET", "/collections/",
+             lambda ctx: {"url": "/collections/", "params": {"limit": 20}}),
+    Scenario("GET /collections/ (deep offset)", "GET", "/collections/", _deep_page("/collections/")),
+    Scenario("GET /collections/my", "GET", "/collections/my", _as_user("/collections/my")),
+    Scenario("GET /collections/{id}", "GET", "/collections/{collection_id}", _public_collection()),
+    Scenario("PUT /collections/{id}", "PUT", "/collections/{collection_id}", _update_collection),
+    Scenario("DELETE /collections/{id}", "DELETE", "/collections/{collection_id}", _delete_collection, (204,),
+             _prepare_collections("delete_collection")),
+    Scenario("GET /collections/{id}/notes", "GET", "/collections/{collection_id}/notes",
+             _public_collection("/notes")),
+    Scenario("POST /collections/{id}/notes", "POST", "/collections/{collection_id}/notes", _add_note, (201,),
+             _prepare_collections("add_note")),
+    Scenario("DELETE /collections/{id}/notes/{note_id}", "DELETE", "/collections/{collection_id}/notes/{note_id}",
+             _remove_note, (204,), _prepare_collections("remove_note", note_count=1)),
+    Scenario("POST /collections/{id}/notes:batch", "POST", "/collections/{collection_id}/notes:batch",
+             _batch_add, (200,), _prepare_collections("batch_add")),
+    Scenario("DELETE /collections/{id}/notes:batch", "DELETE", "/collections/{collection_id}/notes:batch",
+             _batch_remove, (200,), _prepare_collections("batch_remove", note_count=10)),
+    Scenario("PUT /collections/{id}/notes/reorder", "PUT", "/collections/{collection_id}/notes/reorder", _reorder),
+    Scenario("PUT /collections/{id}/notes/{note_id}/position", "PUT",
+             "/collections/{collection_id}/notes/{note_id}/position", _move),
+    # 整合工作池排隊已滿時回傳 429，也是預期的結果
+    Scenario("POST /collections/{id}/integrate", "POST", "/collections/{collection_id}/integrate",
+             _integrate("integrate"), (202, 429)),
+    Scenario("POST /collections/{id}/integrate/stream", "POST", "/collections/{collection_id}/integrate/stream",
+             _integrate("integrate/stream"), (200, 429)),
+]
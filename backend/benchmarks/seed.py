@@ -0,0 +1,166 @@
+"""
+基準測試資料 - 依設定產生用戶、筆記與合集
+
+筆記內容為夾雜英文術語的中文 Markdown（標題、段落、清單與程式碼區塊），
+長度為對數常態分布，接近實際筆記「多數短、少數很長」的分布。
+"""
+import math
+import random
+import secrets
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+from app.models import User, Note, Collection, CollectionNote
+from app.models.note import EXCERPT_LENGTH
+from app.models.note_content import store_contents
+from app.routers.collections import POSITION_GAP
+from app.services import search
+
+# 種子用戶的密碼（登入端點的壓測使用）
+PASSWORD = "benchmark-password"
+
+# 搜尋端點的查詢詞都取自這些詞彙
+CJK_TERMS = [
+    "線性代數", "微積分", "資料結構", "演算法", "作業系統", "計算機網路", "機器學習", "統計學",
+    "期中考", "重點整理", "課堂筆記", "定理", "證明", "範例", "練習題", "複習", "概念", "推導",
+]
+EN_TERMS = ["matrix", "gradient", "hash table", "TCP", "scheduler", "binary tree", "Bayes", "cache"]
+
+_CONNECTIVES = ["首先", "接著", "因此", "換句話說", "例如", "需要注意的是", "最後"]
+_INSERT_BATCH = 1000
+
+@dataclass
+class SeedConfig:
+    users: int = 50
+    notes_per_user: int = 40
+    collections_per_user: int = 5
+    notes_per_collection: int = 20
+    public_ratio: float = 0.8
+    median_note_chars: int = 1500
+    seed: int = 0
+
+@dataclass
+class SeedData:
+    """已寫入的資料（供壓測情境挑選目標）"""
+    usernames: Dict[int, str] = field(default_factory=dict)
+    notes_by_user: Dict[int, List[int]] = field(default_factory=dict)
+    public_note_ids: List[int] = field(default_factory=list)
+    collections_by_user: Dict[int, List[int]] = field(default_factory=dict)
+    public_collection_ids: List[int] = field(default_factory=list)
+    collection_notes: Dict[int, List[int]] = field(default_factory=dict)
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(CJK_TERMS) for _ in range(rng.randint(2, 4))]
+    if rng.random() < 0.5:
+        words.insert(rng.randrange(len(words)), rng.choice(EN_TERMS))
+    return rng.choice(_CONNECTIVES) + "，" + "的".join(words) + "。"
+
+def generate_markdown(rng: random.Random, target_chars: int) -> str:
+    """產生約 target_chars 個字元的 Markdown 筆記"""
+    parts = [f"# {rng.choice(CJK_TERMS)}{rng.choice(['筆記', '整理', '講義'])}"]
+    length = len(parts[0])
+    while length < target_chars:
+        kind = rng.random()
+        if kind < 0.15:
+            block = f"## {rng.choice(CJK_TERMS)}"
+        elif kind < 0.3:
+            block = "\n".join(f"- {_sentence(rng)}" for _ in range(rng.randint(2, 5)))
+        elif kind < 0.37:
+            block = "```python\n" + "\n".join(
+                f"{term.replace(' ', '_')} = compute({i})" for i, term in enumerate(rng.sample(EN_TERMS, 3))
+            ) + "\n```"
+        else:
+            block = "".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+        parts.append(block)
+        length += len(block) + 2
+    return "\n\n".join(parts)
+
+def _note_length(rng: random.Random, median: int) -> int:
+    return int(min(max(rng.lognormvariate(math.log(median), 0.9), 80), median * 40))
+
+def _insert(connection, model, rows: List[dict]) -> None:
+    for start in range(0, len(rows), _INSERT_BATCH):
+        connection.execute(insert(model), rows[start:start + _INSERT_BATCH])
+
+def seed_database(engine: Engine, config: SeedConfig, password_hash: str) -> SeedData:
+    """寫入測試資料並回傳各資料的 id
+
+    用戶名稱帶有隨機前綴，可以寫入已有資料的資料庫；以批次 INSERT 寫入，
+    全文索引可用時寫入後重建。
+    """
+    rng = random.Random(config.seed)
+    prefix = f"bench_{secrets.token_hex(3)}_"
+    now = datetime.utcnow()
+    data = SeedData()
+
+    with engine.begin() as connection:
+        _insert(connection, User, [
+            {"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "hashed_password": password_hash,
+             "created_at": now}
+            for i in range(config.users)
+        ])
+        data.usernames = dict(connection.execute(
+            select(User.id, User.username).where(User.username.like(f"{prefix}%"))
+        ).all())
+        user_ids = sorted(data.usernames)
+
+        note_rows = []
+        contents = []
+        for user_id in user_ids:
+            for i in range(config.notes_per_user):
+                created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+                content = generate_markdown(rng, _note_length(rng, config.median_note_chars))
+                contents.append(content)
+                note_rows.append({
+                    "title": f"{rng.choice(CJK_TERMS)} {rng.choice(EN_TERMS)} 第 {i + 1} 篇",
+                    "excerpt": content[:EXCERPT_LENGTH],
+                    "file_type": "md",
+                    "is_public": rng.random() < config.public_ratio,
+                    "user_id": user_id,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                })
+        # 內容先寫入 note_contents（與應用相同的壓縮與去重）
+        for start in range(0, len(contents), _INSERT_BATCH):
+            batch = contents[start:start + _INSERT_BATCH]
+            for row, content_hash in zip(note_rows[start:start + _INSERT_BATCH], store_contents(connection, batch)):
+                row["content_hash"] = content_hash
+        _insert(connection, Note, note_rows)
+        for note_id, user_id, is_public in connection.execute(
+            select(Note.id, Note.user_id, Note.is_public).where(Note.user_id.in_(user_ids)).order_by(Note.id)
+        ):
+            data.notes_by_user.setdefault(user_id, []).append(note_id)
+            if is_public:
+                data.public_note_ids.append(note_id)
+
+        _insert(connection, Collection, [
+            {"name": f"{rng.choice(CJK_TERMS)}合集 {i + 1}", "description": _sentence(rng),
+             "is_public": rng.random() < config.public_ratio, "user_id": user_id,
+             "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)), "updated_at": now}
+            for user_id in user_ids for i in range(config.collections_per_user)
+        ])
+        membership_rows = []
+        for collection_id, user_id, is_public in connection.execute(
+            select(Collection.id, Collection.user_id, Collection.is_public).where(
+                Collection.user_id.in_(user_ids)
+            ).order_by(Collection.id)
+        ):
+            data.collections_by_user.setdefault(user_id, []).append(collection_id)
+            if is_public:
+                data.public_collection_ids.append(collection_id)
+            own_notes = data.notes_by_user.get(user_id, [])
+            note_ids = rng.sample(own_notes, min(config.notes_per_collection, len(own_notes)))
+            data.collection_notes[collection_id] = note_ids
+            membership_rows.extend(
+                {"collection_id": collection_id, "note_id": note_id, "position": position * POSITION_GAP,
+                 "added_at": now}
+                for position, note_id in enumerate(note_ids)
+            )
+        _insert(connection, CollectionNote, membership_rows)
+
+        if search.is_enabled():
+            search.rebuild_search_index(connection)
+
+    return data
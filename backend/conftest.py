@@ -0,0 +1,94 @@
+"""
+pytest 共用設定與 fixture
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# 測試使用獨立的暫存資料庫，必須在匯入 app 之前設定
+_test_db_dir = tempfile.mkdtemp(prefix="noote-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}"
+# 測試資料庫在啟動時直接以 create_all 建立；遷移本身由 test_migrations.py 驗證
+os.environ["DB_AUTO_CREATE"] = "true"
+# 測試直接以 session 寫入資料，不經過列表快取的失效；快取本身由 test_feed_cache.py 驗證
+os.environ["FEED_CACHE_TTL_SECONDS"] = "0"
+
+import pytest
+from sqlalchemy import event
+
+
+@pytest.fixture(scope="session")
+def client():
+    """整個測試階段共用的 API 測試客戶端"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def async_client(client):
+    """以 ASYNC_DB 建立的應用（非同步路由優先）；與 client 共用同一個測試資料庫"""
+    from fastapi.testclient import TestClient
+    from app.database import init_async_engine
+    from app.main import create_app
+
+    init_async_engine()
+    # 不進入 lifespan：避免關閉同步測試共用的工作池
+    return TestClient(create_app(async_db=True))
+
+
+@pytest.fixture(params=["sync", "async"])
+def api(request, client):
+    """分別以同步與非同步路由執行同一個測試"""
+    return client if request.param == "sync" else request.getfixturevalue("async_client")
+
+
+@pytest.fixture(scope="session")
+def db_session(client):
+    """直接操作測試資料庫的 session（用於建立測試資料）"""
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+class QueryCounter:
+    """記錄期間內送出的 SQL 語句"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@pytest.fixture
+def count_queries():
+    """計算區塊內對資料庫送出的 SQL 語句數量
+
+    用法:
+        with count_queries() as counter:
+            client.get(...)
+        assert counter.count == 2
+    """
+    from app.database import engine
+
+    @contextmanager
+    def _count_queries():
+        counter = QueryCounter()
+        event.listen(engine, "before_cursor_execute", counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", counter)
+
+    return _count_queries
@@ -0,0 +1,58 @@
+"""
+Alembic 遷移環境 - 連線字串取自 DATABASE_URL 設定，比對目標為 app.database.Base 的資料表
+"""
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from app.core.config import settings
+from app.database import Base
+from app import models  # noqa: F401  載入模型，Base.metadata 才包含所有資料表
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL.replace("%", "%%"))
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """略過不屬於模型的資料表（全文索引 notes_fts* 由遷移 0004 以 SQL 建立，不在模型中）"""
+    if type_ == "table" and reflected and compare_to is None:
+        return False
+    return True
+
+
+def _configure(**options):
+    context.configure(
+        target_metadata=target_metadata,
+        include_object=include_object,
+        # SQLite 不支援大部分 ALTER TABLE，以重建資料表的方式修改
+        render_as_batch=settings.DATABASE_URL.startswith("sqlite"),
+        **options
+    )
+
+
+def run_migrations_offline():
+    """產生 SQL 腳本而不連線資料庫（alembic upgrade head --sql）"""
+    _configure(url=config.get_main_option("sqlalchemy.url"), literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,126 @@
+"""列表查詢的複合索引、合集筆記唯一索引與 AI 整合相關資料表
+
+以往這些結構由應用啟動時的 create_all 與補建索引建立，既有資料庫可能已經有其中一部分，
+因此逐一檢查後只建立缺少的資料表與索引。合集筆記有重複資料時不會自動刪除，
+遷移會列出重複的筆數後中止，需先手動清理。
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# (資料表, 索引名稱, 欄位, 是否唯一)
+INDEXES = [
+    # 公開／我的筆記列表：WHERE is_public|user_id ORDER BY created_at DESC, id DESC
+    ("notes", "ix_notes_public_created_at_id", ["is_public", "created_at", "id"], False),
+    ("notes", "ix_notes_user_created_at_id", ["user_id", "created_at", "id"], False),
+    ("collections", "ix_collections_public_created_at_id", ["is_public", "created_at", "id"], False),
+    ("collections", "ix_collections_user_created_at_id", ["user_id", "created_at", "id"], False),
+    # 合集內筆記：WHERE collection_id ORDER BY position
+    ("collection_notes", "ix_collection_notes_collection_position", ["collection_id", "position"], False),
+    ("collection_notes", "uq_collection_notes_collection_note", ["collection_id", "note_id"], True),
+    # 依筆記反查所屬合集：WHERE note_id
+    ("collection_notes", "ix_collection_notes_note_id", ["note_id"], False),
+]
+
+
+def _create_integration_tables(existing):
+    if "integration_jobs" not in existing:
+        op.create_table(
+            "integration_jobs",
+            sa.Column("id", sa.String(32), nullable=False),
+            sa.Column("collection_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(16), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("note_count", sa.Integer(), nullable=False),
+            sa.Column("integrated_content", sa.Text(), nullable=True),
+            sa.Column("chunk_count", sa.Integer(), nullable=True),
+            sa.Column("timings", sa.JSON(), nullable=True),
+            sa.Column("error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["collection_id"], ["collections.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_integration_jobs_status_updated_at", "integration_jobs", ["status", "updated_at"])
+
+    if "integration_cache" not in existing:
+        op.create_table(
+            "integration_cache",
+            sa.Column("key", sa.String(64), nullable=False),
+            sa.Column("collection_id", sa.Integer(), nullable=False),
+            sa.Column("model", sa.String(), nullable=False),
+            sa.Column("integrated_content", sa.Text(), nullable=False),
+            sa.Column("note_count", sa.Integer(), nullable=False),
+            sa.Column("hits", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["collection_id"], ["collections.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("key"),
+        )
+        op.create_index("ix_integration_cache_collection_id", "integration_cache", ["collection_id"])
+        op.create_index("ix_integration_cache_last_used_at", "integration_cache", ["last_used_at"])
+
+    if "integration_partials" not in existing:
+        op.create_table(
+            "integration_partials",
+            sa.Column("collection_id", sa.Integer(), nullable=False),
+            sa.Column("key", sa.String(64), nullable=False),
+            sa.Column("scope", sa.String(64), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("last_used_at", sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(["collection_id"], ["collections.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("collection_id", "key"),
+        )
+        op.create_index(
+            "ix_integration_partials_collection_scope", "integration_partials", ["collection_id", "scope"]
+        )
+        op.create_index("ix_integration_partials_last_used_at", "integration_partials", ["last_used_at"])
+
+
+def _check_duplicate_collection_notes(bind):
+    """重複加入合集的筆記會讓唯一索引建立失敗；不自動刪除，列出重複的資料後中止遷移"""
+    duplicates = bind.execute(sa.text(
+        "SELECT collection_id, note_id, count(*) AS copies FROM collection_notes "
+        "GROUP BY collection_id, note_id HAVING count(*) > 1 ORDER BY collection_id, note_id"
+    )).all()
+    if not duplicates:
+        return
+    extra = sum(row.copies - 1 for row in duplicates)
+    sample = ", ".join(f"({row.collection_id}, {row.note_id}) x{row.copies}" for row in duplicates[:10])
+    raise RuntimeError(
+        f"collection_notes 有 {len(duplicates)} 組重複的 (collection_id, note_id)（共 {extra} 筆多餘資料），"
+        f"無法建立唯一索引：{sample}。確認後手動移除重複的資料（例如保留 id 最小的一筆）再重新執行遷移。"
+    )
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    _create_integration_tables(set(inspector.get_table_names()))
+
+    for table, name, columns, unique in INDEXES:
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        if name not in existing:
+            if name == "uq_collection_notes_collection_note":
+                _check_duplicate_collection_notes(bind)
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    for table, name, columns, unique in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_table("integration_partials")
+    op.drop_table("integration_cache")
+    op.drop_table("integration_jobs")
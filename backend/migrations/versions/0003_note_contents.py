@@ -0,0 +1,134 @@
+"""筆記內容移到 note_contents 資料表（以內容的 sha256 為主鍵，相同內容共用一列）
+
+notes 改為保存 content_hash 與內容開頭片段 excerpt。既有內容以原文搬移，
+壓縮（NOTE_CONTENT_COMPRESSION）只套用於之後寫入的內容。
+以 create_all 建立、已經是新結構的資料庫不需要搬移。
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+import hashlib
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+# 與 app.models.note.EXCERPT_LENGTH 相同
+EXCERPT_LENGTH = 200
+BATCH_SIZE = 500
+
+notes = sa.table(
+    "notes",
+    sa.column("id", sa.Integer),
+    sa.column("content", sa.Text),
+    sa.column("content_hash", sa.String),
+    sa.column("excerpt", sa.String),
+)
+note_contents = sa.table(
+    "note_contents",
+    sa.column("hash", sa.String),
+    sa.column("encoding", sa.String),
+    sa.column("text", sa.Text),
+    sa.column("data", sa.LargeBinary),
+    sa.column("size", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def _batches(bind, statement):
+    """依 notes.id 分批讀取"""
+    last_id = 0
+    while True:
+        rows = bind.execute(statement.where(notes.c.id > last_id).order_by(notes.c.id).limit(BATCH_SIZE)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _move_contents(bind):
+    stored = set()
+    for rows in _batches(bind, sa.select(notes.c.id, notes.c.content)):
+        for row in rows:
+            content = row.content or ""
+            raw = content.encode("utf-8")
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest not in stored:
+                bind.execute(note_contents.insert().values(
+                    hash=digest, encoding="identity", text=content, data=None, size=len(raw),
+                    created_at=sa.func.current_timestamp()
+                ))
+                stored.add(digest)
+            bind.execute(
+                notes.update().where(notes.c.id == row.id).values(
+                    content_hash=digest, excerpt=content[:EXCERPT_LENGTH]
+                )
+            )
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if "note_contents" not in set(inspector.get_table_names()):
+        op.create_table(
+            "note_contents",
+            sa.Column("hash", sa.String(64), nullable=False),
+            sa.Column("encoding", sa.String(16), nullable=False),
+            sa.Column("text", sa.Text(), nullable=True),
+            sa.Column("data", sa.LargeBinary(), nullable=True),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint("hash"),
+        )
+
+    if "content" not in {column["name"] for column in inspector.get_columns("notes")}:
+        return
+
+    with op.batch_alter_table("notes") as batch:
+        batch.add_column(sa.Column("content_hash", sa.String(64), nullable=True))
+        batch.add_column(sa.Column("excerpt", sa.String(), nullable=True))
+
+    _move_contents(bind)
+
+    with op.batch_alter_table("notes") as batch:
+        batch.alter_column("content_hash", existing_type=sa.String(64), nullable=False)
+        batch.alter_column("excerpt", existing_type=sa.String(), nullable=False)
+        batch.create_foreign_key("fk_notes_content_hash", "note_contents", ["content_hash"], ["hash"])
+        batch.create_index("ix_notes_content_hash", ["content_hash"])
+        batch.drop_column("content")
+
+
+def _decode(row) -> str:
+    if row.encoding == "identity":
+        return row.text
+    if row.encoding == "zlib":
+        return zlib.decompress(row.data).decode("utf-8")
+    import zstandard  # zstd 壓縮的內容需要 zstandard 才能還原
+    return zstandard.ZstdDecompressor().decompress(row.data).decode("utf-8")
+
+
+def downgrade():
+    bind = op.get_bind()
+    with op.batch_alter_table("notes") as batch:
+        batch.add_column(sa.Column("content", sa.Text(), nullable=True))
+
+    # 原文直接以子查詢複製，壓縮的內容逐一解壓
+    bind.execute(notes.update().values(
+        content=sa.select(note_contents.c.text).where(note_contents.c.hash == notes.c.content_hash).scalar_subquery()
+    ))
+    for row in bind.execute(sa.select(note_contents).where(note_contents.c.encoding != "identity")).all():
+        bind.execute(notes.update().where(notes.c.content_hash == row.hash).values(content=_decode(row)))
+
+    with op.batch_alter_table("notes") as batch:
+        batch.alter_column("content", existing_type=sa.Text(), nullable=False)
+        batch.drop_index("ix_notes_content_hash")
+        batch.drop_constraint("fk_notes_content_hash", type_="foreignkey")
+        batch.drop_column("content_hash")
+        batch.drop_column("excerpt")
+    op.drop_table("note_contents")
@@ -0,0 +1,29 @@
+"""筆記全文索引 notes_fts（SQLite FTS5 虛擬表／PostgreSQL tsvector + GIN 索引），並寫入既有的筆記
+
+以往全文索引在應用啟動時建立；改由遷移建立後，應用啟動時不再執行 DDL 或檢查索引。
+索引結構與斷詞沿用 app.services.search（不屬於模型，autogenerate 不會比對）。
+SQLite 未編譯 FTS5 時只印出警告、不建立索引，需設定 SEARCH_FULL_TEXT=false。
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    from app.services.search import create_search_index, rebuild_search_index
+
+    bind = op.get_bind()
+    # 已存在的索引（以往啟動時建立）也重建一次，補上索引停用期間寫入的筆記
+    if create_search_index(bind) and not op.get_context().as_sql:
+        rebuild_search_index(bind)
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS notes_fts")
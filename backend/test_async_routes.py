@@ -0,0 +1,112 @@
+"""
+非同步路由測試 - 以 ASYNC_DB 建立應用，與同步路由跑相同情境並比對回應
+"""
+import json
+import pytest
+from fastapi.routing import APIRoute
+
+VOLATILE_KEYS = {"id", "user_id", "note_id", "collection_id", "created_at", "updated_at",
+                 "next_cursor", "access_token"}
+
+
+def _normalize(value, prefix):
+    """去除每次執行都不同的欄位，並把帳號前綴換成固定字串"""
+    if isinstance(value, dict):
+        return {key: _normalize(item, prefix) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_normalize(item, prefix) for item in value]
+    if isinstance(value, str):
+        return value.replace(prefix, "<user>")
+    return value
+
+
+def _scenario(client, prefix):
+    """註冊、筆記與合集的主要操作，回傳 (步驟, 狀態碼, 正規化後的回應) 列表"""
+    results = []
+
+    def call(step, method, url, **kwargs):
+        response = client.request(method, f"/api/v1{url}", **kwargs)
+        if not response.content:
+            body = None
+        elif response.headers["content-type"].startswith("application/x-ndjson"):
+            body = [json.loads(line) for line in response.text.splitlines()]
+        else:
+            body = response.json()
+        results.append((step, response.status_code, _normalize(body, prefix)))
+        return body
+
+    password = "secret-password"
+    call("register", "POST", "/auth/register", json={"username": prefix, "email": f"{prefix}@example.com", "password": password})
+    call("register_duplicate", "POST", "/auth/register", json={"username": prefix, "email": f"{prefix}@example.com", "password": password})
+    call("login_wrong", "POST", "/auth/login", data={"username": prefix, "password": "wrong"})
+    token = call("login", "POST", "/auth/login", data={"username": prefix, "password": password})["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    call("me", "GET", "/auth/me", headers=headers)
+
+    other = f"{prefix}_other"
+    call("register_other", "POST", "/auth/register", json={"username": other, "email": f"{other}@example.com", "password": password})
+    other_token = call("login_other", "POST", "/auth/login", data={"username": other, "password": password})["access_token"]
+    other_headers = {"Authorization": f"Bearer {other_token}"}
+
+    note_ids = []
+    for i in range(3):
+        note = call(f"create_note_{i}", "POST", "/notes/", headers=headers, json={
+            "title": f"{prefix} 非同步筆記 {i}", "content": f"第 {i} 篇內容", "is_public": i != 2
+        })
+        note_ids.append(note["id"])
+    call("get_note", "GET", f"/notes/{note_ids[0]}", headers=headers)
+    call("get_private_note_other", "GET", f"/notes/{note_ids[2]}", headers=other_headers)
+    call("get_missing_note", "GET", "/notes/999999", headers=headers)
+    call("update_note", "PUT", f"/notes/{note_ids[1]}", headers=headers, json={"title": f"{prefix} 更新後"})
+    call("update_note_other", "PUT", f"/notes/{note_ids[1]}", headers=other_headers, json={"title": "x"})
+
+    call("my_notes", "GET", "/notes/my", headers=headers)
+    call("my_notes_summary", "GET", "/notes/my", headers=headers, params={"view": "summary"})
+    first_page = call("my_notes_cursor", "GET", "/notes/my", headers=headers, params={"cursor": "", "limit": 2})
+    call("my_notes_cursor_next", "GET", "/notes/my", headers=headers, params={"cursor": first_page["next_cursor"], "limit": 2})
+    call("my_notes_stream", "GET", "/notes/my", headers=headers, params={"stream": "true", "view": "summary"})
+    call("my_notes_bad_cursor", "GET", "/notes/my", headers=headers, params={"cursor": "not-a-cursor"})
+    public = call("public_notes", "GET", "/notes/", params={"limit": 100})
+    results[-1] = ("public_notes", 200, sorted(
+        _normalize(note, prefix)["title"] for note in public if note["title"].startswith(prefix)
+    ))
+    call("search", "GET", "/notes/search", headers=headers, params={"q": "內容", "scope": "my"})
+
+    collection = call("create_collection", "POST", "/collections/", headers=headers, json={
+        "name": f"{prefix} 合集", "description": "描述", "note_ids": note_ids[:2]
+    })
+    collection_id = collection["id"]
+    call("get_collection", "GET", f"/collections/{collection_id}", headers=headers)
+    call("get_collection_other", "GET", f"/collections/{collection_id}", headers=other_headers)
+    call("collection_notes", "GET", f"/collections/{collection_id}/notes", headers=headers)
+    call("update_collection", "PUT", f"/collections/{collection_id}", headers=headers, json={"name": f"{prefix} 新合集"})
+    call("my_collections", "GET", "/collections/my", headers=headers)
+    call("my_collections_summary", "GET", "/collections/my", headers=headers, params={"view": "summary"})
+    call("my_collections_stream", "GET", "/collections/my", headers=headers, params={"stream": "true"})
+    call("delete_collection_other", "DELETE", f"/collections/{collection_id}", headers=other_headers)
+    call("delete_collection", "DELETE", f"/collections/{collection_id}", headers=headers)
+    call("get_deleted_collection", "GET", f"/collections/{collection_id}", headers=headers)
+
+    call("delete_note_other", "DELETE", f"/notes/{note_ids[0]}", headers=other_headers)
+    call("delete_note", "DELETE", f"/notes/{note_ids[0]}", headers=headers)
+    call("get_deleted_note", "GET", f"/notes/{note_ids[0]}", headers=headers)
+    return results
+
+
+def test_async_routes_take_precedence(async_client):
+    for method, path in [("GET", "/api/v1/notes/my"), ("GET", "/api/v1/collections/{collection_id:int}"),
+                         ("POST", "/api/v1/auth/login")]:
+        route = next(
+            route for route in async_client.app.routes
+            if isinstance(route, APIRoute) and route.path in (path, path.replace(":int", "")) and method in route.methods
+        )
+        assert route.endpoint.__module__.endswith("_async"), path
+
+
+def test_async_routes_match_sync_routes(client, async_client):
+    sync_results = _scenario(client, "sync_route_user")
+    async_results = _scenario(async_client, "async_route_user")
+
+    for sync_step, async_step in zip(sync_results, async_results):
+        assert async_step == sync_step
+    assert len(async_results) == len(sync_results)
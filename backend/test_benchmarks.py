@@ -0,0 +1,84 @@
+"""
+基準測試套件的測試 - 以小量資料執行每個情境一次，確認情境與端點保持同步
+"""
+import asyncio
+import pytest
+from benchmarks.report import compare
+from benchmarks.runner import RunConfig, ScenarioResult, run_benchmarks
+from benchmarks.scenarios import SCENARIOS, BenchContext
+from benchmarks.seed import SeedConfig, seed_database
+
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    from app.core import get_password_hash
+    from app.database import engine
+    from benchmarks.seed import PASSWORD
+
+    config = SeedConfig(users=3, notes_per_user=6, collections_per_user=2, notes_per_collection=4,
+                        median_note_chars=300)
+    return seed_database(engine, config, get_password_hash(PASSWORD))
+
+
+def test_seed_writes_requested_volumes(seeded):
+    assert len(seeded.usernames) == 3
+    assert all(len(note_ids) == 6 for note_ids in seeded.notes_by_user.values())
+    assert len(seeded.collection_notes) == 6
+    for user_id, collection_ids in seeded.collections_by_user.items():
+        for collection_id in collection_ids:
+            assert len(seeded.collection_notes[collection_id]) == 4
+            assert set(seeded.collection_notes[collection_id]) <= set(seeded.notes_by_user[user_id])
+
+
+def test_every_scenario_succeeds(client, seeded, monkeypatch):
+    from app.core.config import settings
+    from app.main import app
+
+    monkeypatch.setattr(settings, "AI_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "FAKE_AI_LATENCY_SECONDS", 0)
+    monkeypatch.setattr(settings, "FAKE_AI_TOKENS_PER_SECOND", 0)
+
+    results = asyncio.run(run_benchmarks(
+        app, BenchContext(seeded), SCENARIOS, RunConfig(requests=2, concurrency=2, warmup=1)
+    ))
+
+    assert [result.name for result in results] == [scenario.name for scenario in SCENARIOS]
+    for result in results:
+        assert result.errors == 0, (result.name, result.error_samples)
+        assert len(result.latencies_ms) == 2
+    queries = {result.name: result.queries_per_request for result in results}
+    assert queries["GET /notes/{id} (If-None-Match)"] == 1
+
+
+def test_scenarios_cover_every_endpoint(client):
+    from app.main import app
+    from app.core.config import settings
+
+    prefixes = tuple(settings.API_V1_STR + prefix for prefix in ("/auth/", "/notes/", "/collections/"))
+    endpoints = {
+        (method, route.path[len(settings.API_V1_STR):])
+        for route in app.routes
+        if getattr(route, "path", "").startswith(prefixes)
+        for method in route.methods
+    }
+    covered = {(scenario.method, scenario.route) for scenario in SCENARIOS}
+
+    assert endpoints - covered == set()
+
+
+def test_compare_flags_latency_and_query_regressions():
+    def result(name, latency, queries):
+        return ScenarioResult(name=name, requests=1, errors=0, duration=1.0,
+                              latencies_ms=[latency], queries_per_request=queries)
+
+    baseline = {"results": {
+        "fast": result("fast", 10.0, 2).summary(),
+        "queries": result("queries", 10.0, 2).summary(),
+        "steady": result("steady", 10.0, 2).summary(),
+    }}
+    current = [result("fast", 13.0, 2), result("queries", 10.0, 3), result("steady", 11.0, 2), result("new", 1, 1)]
+
+    table, regressions = compare(current, baseline, threshold=0.2)
+
+    assert regressions == ["fast", "queries"]
+    assert "基準中沒有此情境" in table
@@ -0,0 +1,125 @@
+"""
+合集批次操作測試 - 批次添加／移除筆記的逐項結果、順序、查詢數與快取失效
+"""
+import pytest
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote, IntegrationCacheEntry
+
+
+@pytest.fixture(scope="module")
+def batch_data(db_session):
+    owner = User(username="batch_owner", email="batch_owner@example.com", hashed_password="not-a-real-hash")
+    other = User(username="batch_other", email="batch_other@example.com", hashed_password="not-a-real-hash")
+    db_session.add_all([owner, other])
+    db_session.flush()
+
+    own_notes = [Note(title=f"批次筆記 {i}", content="內容", user_id=owner.id) for i in range(5)]
+    public_note = Note(title="他人的公開筆記", content="內容", user_id=other.id, is_public=True)
+    private_note = Note(title="他人的私密筆記", content="內容", user_id=other.id, is_public=False)
+    collection = Collection(name="批次合集", user_id=owner.id)
+    db_session.add_all(own_notes + [public_note, private_note, collection])
+    db_session.flush()
+    db_session.add(CollectionNote(collection_id=collection.id, note_id=own_notes[0].id, position=0))
+    db_session.commit()
+
+    return {
+        "headers": {"Authorization": f"Bearer {create_access_token(data={'sub': owner.username})}"},
+        "other_headers": {"Authorization": f"Bearer {create_access_token(data={'sub': other.username})}"},
+        "collection_id": collection.id,
+        "own": [note.id for note in own_notes],
+        "public": public_note.id,
+        "private": private_note.id,
+    }
+
+
+def _url(batch_data):
+    return f"/api/v1/collections/{batch_data['collection_id']}/notes:batch"
+
+
+def _note_ids_in_order(client, batch_data):
+    response = client.get(f"/api/v1/collections/{batch_data['collection_id']}/notes", headers=batch_data["headers"])
+    return [note["id"] for note in response.json()]
+
+
+def test_batch_add_reports_each_note_and_keeps_order(client, db_session, batch_data, count_queries):
+    own = batch_data["own"]
+    note_ids = [own[3], own[0], batch_data["public"], batch_data["private"], 999999, own[1], own[3]]
+
+    with count_queries() as counter:
+        response = client.post(_url(batch_data), json={"note_ids": note_ids}, headers=batch_data["headers"])
+
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["succeeded"] == 3
+    assert [(item["note_id"], item["status"]) for item in body["results"]] == [
+        (own[3], "added"),
+        (own[0], "already_in_collection"),
+        (batch_data["public"], "added"),
+        (batch_data["private"], "forbidden"),
+        (999999, "not_found"),
+        (own[1], "added"),
+    ]
+    assert _note_ids_in_order(client, batch_data) == [own[0], own[3], batch_data["public"], own[1]]
+
+    # 查詢數與筆記數量無關（認證、合集、筆記、既有關聯、最大位置、寫入、快取失效）
+    inserts = [statement for statement in counter.statements if statement.startswith("INSERT INTO collection_notes")]
+    assert len(inserts) == 1
+    assert counter.count <= 10
+
+
+def test_batch_remove_reports_each_note(client, batch_data):
+    own = batch_data["own"]
+
+    response = client.request(
+        "DELETE", _url(batch_data), json={"note_ids": [own[3], own[4], own[1]]}, headers=batch_data["headers"]
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {"succeeded": 2, "results": [
+        {"note_id": own[3], "status": "removed"},
+        {"note_id": own[4], "status": "not_in_collection"},
+        {"note_id": own[1], "status": "removed"},
+    ]}
+    assert _note_ids_in_order(client, batch_data) == [own[0], batch_data["public"]]
+
+
+def test_batch_changes_invalidate_integration_cache(client, db_session, batch_data):
+    collection_id = batch_data["collection_id"]
+
+    def cache_entries():
+        db_session.expire_all()
+        return db_session.query(IntegrationCacheEntry).filter(IntegrationCacheEntry.collection_id == collection_id).count()
+
+    for method in ("POST", "DELETE"):
+        db_session.add(IntegrationCacheEntry(
+            key=method.lower().ljust(64, "0"), collection_id=collection_id, model="model",
+            integrated_content="舊結果", note_count=1
+        ))
+        db_session.commit()
+        assert cache_entries() == 1
+
+        response = client.request(method, _url(batch_data), json={"note_ids": [batch_data["own"][2]]},
+                                  headers=batch_data["headers"])
+        assert response.json()["succeeded"] == 1
+        assert cache_entries() == 0
+
+
+@pytest.mark.parametrize("method", ["POST", "DELETE"])
+def test_batch_requires_collection_owner(client, batch_data, method):
+    response = client.request(method, _url(batch_data), json={"note_ids": [batch_data["own"][0]]},
+                              headers=batch_data["other_headers"])
+    assert response.status_code == 403
+
+    response = client.request(method, "/api/v1/collections/999999/notes:batch", json={"note_ids": [1]},
+                              headers=batch_data["headers"])
+    assert response.status_code == 404
+
+
+def test_batch_size_is_limited(client, batch_data, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "COLLECTION_BATCH_MAX_NOTES", 2)
+    response = client.post(_url(batch_data), json={"note_ids": [1, 2, 3]}, headers=batch_data["headers"])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "一次最多處理 2 則筆記"
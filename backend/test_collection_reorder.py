@@ -0,0 +1,118 @@
+"""
+合集排序測試 - 單一 UPDATE 的整批排序、移動單一筆記與唯一索引
+"""
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote
+from app.routers.collections import POSITION_GAP
+
+NOTE_COUNT = 6
+
+
+@pytest.fixture
+def reorder_data(db_session):
+    owner = db_session.query(User).filter(User.username == "reorder_owner").first()
+    if owner is None:
+        owner = User(username="reorder_owner", email="reorder_owner@example.com", hashed_password="not-a-real-hash")
+        db_session.add(owner)
+        db_session.flush()
+
+    notes = [Note(title=f"排序筆記 {i}", content="內容", user_id=owner.id) for i in range(NOTE_COUNT)]
+    collection = Collection(name="排序合集", user_id=owner.id)
+    db_session.add_all(notes + [collection])
+    db_session.flush()
+    # 舊資料的位置是連續整數，沒有間隔
+    db_session.add_all([
+        CollectionNote(collection_id=collection.id, note_id=note.id, position=i) for i, note in enumerate(notes)
+    ])
+    db_session.commit()
+
+    return {
+        "headers": {"Authorization": f"Bearer {create_access_token(data={'sub': owner.username})}"},
+        "collection_id": collection.id,
+        "note_ids": [note.id for note in notes],
+    }
+
+
+def _order(client, data):
+    response = client.get(f"/api/v1/collections/{data['collection_id']}/notes", headers=data["headers"])
+    return [note["id"] for note in response.json()]
+
+
+def _move(client, data, note_id, after_note_id):
+    return client.put(
+        f"/api/v1/collections/{data['collection_id']}/notes/{note_id}/position",
+        json={"after_note_id": after_note_id}, headers=data["headers"]
+    )
+
+
+def _updates(counter):
+    return [statement for statement in counter.statements if statement.startswith("UPDATE collection_notes")]
+
+
+def test_reorder_uses_single_update(client, reorder_data, count_queries):
+    new_order = list(reversed(reorder_data["note_ids"]))
+
+    with count_queries() as counter:
+        response = client.put(
+            f"/api/v1/collections/{reorder_data['collection_id']}/notes/reorder",
+            json={"note_ids": new_order + [999999]}, headers=reorder_data["headers"]
+        )
+
+    assert response.status_code == 200
+    assert len(_updates(counter)) == 1
+    assert not [s for s in counter.statements if s.startswith("SELECT collection_notes")]
+    assert _order(client, reorder_data) == new_order
+
+
+def test_move_without_gap_renumbers_then_moves_with_single_row_updates(client, reorder_data, count_queries):
+    ids = reorder_data["note_ids"]
+
+    # 連續位置之間沒有空隙：重新編號一次
+    assert _move(client, reorder_data, ids[4], ids[0]).status_code == 200
+    expected = [ids[0], ids[4], ids[1], ids[2], ids[3], ids[5]]
+    assert _order(client, reorder_data) == expected
+
+    # 之後的移動只改寫被移動的筆記
+    moves = [(ids[5], None), (ids[0], ids[3]), (ids[2], ids[5])]
+    for note_id, after in moves:
+        with count_queries() as counter:
+            assert _move(client, reorder_data, note_id, after).status_code == 200
+        (statement,) = _updates(counter)
+        assert "CASE" not in statement
+
+        expected.remove(note_id)
+        expected.insert(expected.index(after) + 1 if after is not None else 0, note_id)
+        assert _order(client, reorder_data) == expected
+
+
+def test_repeated_moves_into_same_gap_stay_ordered(client, reorder_data):
+    ids = reorder_data["note_ids"]
+    client.put(f"/api/v1/collections/{reorder_data['collection_id']}/notes/reorder",
+               json={"note_ids": ids}, headers=reorder_data["headers"])
+
+    # 反覆插入同一個空隙，直到空隙用完需要重新編號
+    expected = list(ids)
+    for _ in range(POSITION_GAP.bit_length() + 2):
+        moved = expected[-1]
+        assert _move(client, reorder_data, moved, expected[0]).status_code == 200
+        expected.remove(moved)
+        expected.insert(1, moved)
+        assert _order(client, reorder_data) == expected
+
+
+def test_move_rejects_notes_outside_collection(client, reorder_data):
+    ids = reorder_data["note_ids"]
+    assert _move(client, reorder_data, 999999, ids[0]).status_code == 404
+    assert _move(client, reorder_data, ids[0], 999999).status_code == 404
+    assert _move(client, reorder_data, ids[0], ids[0]).status_code == 400
+
+
+def test_collection_note_pairs_are_unique(db_session, reorder_data):
+    db_session.add(CollectionNote(
+        collection_id=reorder_data["collection_id"], note_id=reorder_data["note_ids"][0], position=99
+    ))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
@@ -0,0 +1,150 @@
+"""
+回應壓縮與 JSON 序列化測試 - Accept-Encoding 協商、大小門檻、串流與 ETag，以及直接序列化的輸出格式
+"""
+import asyncio
+import gzip
+import json
+import zlib
+from datetime import datetime
+import pytest
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+from app.core import create_access_token
+from app.core.compression import CompressionMiddleware, choose_encoding
+from app.core.responses import ORJSONResponse, dump_json
+from app.models import User, Note
+from app.schemas import NoteResponse
+
+
+@pytest.fixture(scope="module")
+def large_notes(db_session):
+    user = User(username="compress_owner", email="compress_owner@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.flush()
+    notes = [
+        Note(title=f"長筆記 {i}", content="# 壓縮測試\n\n" + "重複的課堂內容。" * 400, user_id=user.id)
+        for i in range(3)
+    ]
+    db_session.add_all(notes)
+    db_session.commit()
+    return {
+        "headers": {"Authorization": f"Bearer {create_access_token(data={'sub': user.username})}"},
+        "note_id": notes[0].id,
+    }
+
+
+def test_choose_encoding_follows_server_preference_and_q_values():
+    preferred = ["zstd", "br", "gzip"]
+    assert choose_encoding("gzip, deflate, br", preferred) == "br"
+    assert choose_encoding("gzip;q=0.5, zstd;q=0.1", preferred) == "zstd"
+    assert choose_encoding("br;q=0, gzip", preferred) == "gzip"
+    assert choose_encoding("*", ["gzip"]) == "gzip"
+    assert choose_encoding("*;q=0, identity", preferred) is None
+    assert choose_encoding("", preferred) is None
+
+
+def test_large_list_is_gzipped(api, large_notes):
+    response = api.get("/api/v1/notes/my", headers={**large_notes["headers"], "Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(response.content) / 5
+    assert sorted(note["title"] for note in response.json()) == ["長筆記 0", "長筆記 1", "長筆記 2"]
+
+
+def test_identity_and_small_responses_are_not_compressed(client, large_notes):
+    identity = client.get("/api/v1/notes/my", headers={**large_notes["headers"], "Accept-Encoding": "identity"})
+    refused = client.get("/api/v1/notes/my", headers={**large_notes["headers"], "Accept-Encoding": "gzip;q=0"})
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in identity.headers
+    assert "content-encoding" not in refused.headers
+    assert "content-encoding" not in small.headers
+    assert identity.json() == refused.json()
+
+
+def test_compressed_note_has_weak_etag_that_still_revalidates(api, large_notes):
+    url = f"/api/v1/notes/{large_notes['note_id']}"
+    response = api.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert api.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    # 未壓縮的回應仍使用強 ETag
+    assert api.get(url, headers={"Accept-Encoding": "identity"}).headers["etag"] == etag[2:]
+
+
+def test_ndjson_stream_is_compressed_incrementally(client, large_notes):
+    response = client.get(
+        "/api/v1/notes/my?stream=true", headers={**large_notes["headers"], "Accept-Encoding": "gzip"}
+    )
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+
+
+def _streaming_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, encodings=["gzip"], minimum_size=100)
+
+    @app.get("/events")
+    def events():
+        return StreamingResponse(iter(["event: a\ndata: 1\n\n"] * 50), media_type="text/event-stream")
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("x" * 200)
+
+    return app
+
+
+def test_event_streams_are_not_compressed():
+    client = TestClient(_streaming_app())
+
+    assert "content-encoding" not in client.get("/events", headers={"Accept-Encoding": "gzip"}).headers
+    assert client.get("/text", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+
+
+def test_stream_chunks_are_flushed_individually():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/x-ndjson")]})
+        await send({"type": "http.response.body", "body": "第一段\n".encode("utf-8"), "more_body": True})
+        await send({"type": "http.response.body", "body": "第二段\n".encode("utf-8"), "more_body": False})
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    middleware = CompressionMiddleware(app, encodings=["gzip"], minimum_size=1024)
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(middleware(scope, None, send))
+
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    decompressor = zlib.decompressobj(31)
+    # 每一段都已 flush，不需要等到串流結束就能解壓
+    assert decompressor.decompress(messages[1]["body"]).decode("utf-8") == "第一段\n"
+    assert gzip.decompress(messages[1]["body"] + messages[2]["body"]).decode("utf-8") == "第一段\n第二段\n"
+
+
+def test_dump_json_matches_json_response_format():
+    note = NoteResponse(
+        id=1, title="標題 \"引號\"", content="內容\n第二行", file_type="md", is_public=True, user_id=2,
+        created_at=datetime(2024, 3, 1, 8, 0, 0, 123), updated_at=datetime(2024, 3, 1, 8, 0, 0),
+        owner_username=None
+    )
+    expected = json.dumps(
+        jsonable_encoder([note]), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    assert dump_json([note]) == expected
+    assert json.loads(ORJSONResponse({"items": [1, "中文"], 2: None}).body) == {"items": [1, "中文"], "2": None}
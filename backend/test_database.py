@@ -0,0 +1,54 @@
+"""
+資料庫連線測試 - SQLite 連線設定與 /metrics 的連線池統計
+"""
+import pytest
+from sqlalchemy import create_engine, exc, text
+from app.core.config import settings
+from app.database import engine, InstrumentedQueuePool
+
+
+def test_sqlite_pragmas_are_applied(client):
+    if engine.dialect.name != "sqlite":
+        pytest.skip("僅適用於 SQLite")
+
+    with engine.connect() as connection:
+        journal_mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+        busy_timeout = connection.execute(text("PRAGMA busy_timeout")).scalar()
+        temp_store = connection.execute(text("PRAGMA temp_store")).scalar()
+
+    assert journal_mode == ("wal" if settings.SQLITE_WAL else "delete")
+    assert busy_timeout == settings.SQLITE_BUSY_TIMEOUT_MS
+    assert temp_store == 2  # MEMORY
+
+
+def test_metrics_pool_counters_move_with_requests(client):
+    before = client.get("/metrics").json()["db_pool"]
+
+    for _ in range(3):
+        assert client.get("/api/v1/notes/").status_code == 200
+
+    after = client.get("/metrics").json()["db_pool"]
+    assert after["checkouts"] >= before["checkouts"] + 3
+    assert after["size"] == settings.DB_POOL_SIZE
+    assert after["timeouts"] == before["timeouts"]
+    assert after["wait_seconds_avg"] >= 0
+
+
+def test_pool_counts_checkout_timeouts(tmp_path):
+    pool_engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+
+    with pool_engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            pool_engine.connect()
+
+    stats = pool_engine.pool.stats()
+    assert stats["timeouts"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["wait_seconds_max"] >= 0.05
+    pool_engine.dispose()
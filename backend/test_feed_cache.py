@@ -0,0 +1,178 @@
+"""
+公開列表快取測試 - 命中與失效、single-flight、儲存錯誤與 API 端點的寫入失效
+"""
+import threading
+import time
+import pytest
+from app.core import create_access_token
+from app.models import User
+from app.core.responses import dump_json
+from app.services.feed_cache import FeedCache, LocalFeedStore, feed_cache
+
+
+def _cache():
+    return FeedCache(ttl=30, store=LocalFeedStore(max_entries=16))
+
+
+def test_respond_caches_until_invalidated():
+    cache = _cache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"items": [len(builds)]}
+
+    first = cache.respond("notes", ("offset", 20), build)
+    second = cache.respond("notes", ("offset", 20), build)
+    other_limit = cache.respond("notes", ("offset", 5), build)
+
+    assert first.body == second.body == b'{"items":[1]}'
+    assert other_limit.body == b'{"items":[2]}'
+
+    cache.invalidate("collections")
+    assert cache.respond("notes", ("offset", 20), build).body == b'{"items":[1]}'
+    cache.invalidate("notes")
+    assert cache.respond("notes", ("offset", 20), build).body == b'{"items":[3]}'
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+    assert stats["invalidations"] == 2
+
+
+def test_concurrent_misses_build_once():
+    cache = _cache()
+    builds = []
+    barrier = threading.Barrier(8)
+    bodies = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return ["結果"]
+
+    def request():
+        barrier.wait()
+        bodies.append(cache.respond("notes", ("cursor", 20), build).body)
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert bodies == [dump_json(["結果"])] * 8
+    stats = cache.stats()
+    assert stats["coalesced"] == 7
+    assert stats["in_flight"] == 0
+
+
+def test_failed_build_lets_waiters_retry():
+    cache = _cache()
+    started = threading.Event()
+    calls = []
+
+    def failing_build():
+        calls.append("failing")
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("資料庫錯誤")
+
+    def waiter():
+        started.wait()
+        results.append(cache.respond("notes", ("offset", 20), lambda: calls.append("waiter") or ["ok"]).body)
+
+    results = []
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(RuntimeError):
+        cache.respond("notes", ("offset", 20), failing_build)
+    thread.join()
+
+    assert calls == ["failing", "waiter"]
+    assert results == [b'["ok"]']
+
+
+def test_store_errors_fall_back_to_uncached_responses():
+    class BrokenStore(LocalFeedStore):
+        def generation(self, feed):
+            raise ConnectionError("無法連線")
+
+    cache = FeedCache(ttl=30, store=BrokenStore(max_entries=16))
+
+    assert cache.respond("notes", ("offset", 20), lambda: [1]).body == b"[1]"
+    assert cache.respond("notes", ("offset", 20), lambda: [2]).body == b"[2]"
+    assert cache.stats()["errors"] == 2
+
+
+@pytest.fixture
+def enabled_feed_cache(monkeypatch):
+    monkeypatch.setattr(feed_cache, "ttl", 30)
+    feed_cache.clear()
+    yield feed_cache
+    feed_cache.clear()
+
+
+@pytest.fixture(scope="module")
+def feed_user(db_session):
+    user = User(username="feed_user", email="feed_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.username})}"}
+
+
+@pytest.mark.parametrize("url", ["/api/v1/notes/?limit=5", "/api/v1/collections/?cursor=&limit=5"])
+def test_cached_feed_matches_uncached_response(api, count_queries, enabled_feed_cache, monkeypatch, url):
+    monkeypatch.setattr(feed_cache, "ttl", 0)
+    uncached = api.get(url)
+    monkeypatch.setattr(feed_cache, "ttl", 30)
+
+    api.get(url)
+    with count_queries() as counter:
+        cached = api.get(url)
+
+    assert cached.status_code == 200
+    assert cached.content == uncached.content
+    assert cached.headers["content-type"] == "application/json"
+    assert counter.count == 0
+
+
+def test_later_pages_are_not_cached(client, enabled_feed_cache):
+    hits = enabled_feed_cache.hits
+    client.get("/api/v1/notes/?skip=5&limit=5")
+    client.get("/api/v1/notes/?skip=5&limit=5")
+
+    assert enabled_feed_cache.hits == hits
+
+
+def test_writes_invalidate_feeds(api, feed_user, enabled_feed_cache):
+    assert api.get("/api/v1/notes/?limit=1").status_code == 200
+
+    note = api.post("/api/v1/notes/", json={"title": "列表快取新筆記", "content": "內容"}, headers=feed_user).json()
+    assert api.get("/api/v1/notes/?limit=1").json()[0]["title"] == "列表快取新筆記"
+
+    api.put(f"/api/v1/notes/{note['id']}", json={"title": "列表快取改名"}, headers=feed_user)
+    assert api.get("/api/v1/notes/?limit=1").json()[0]["title"] == "列表快取改名"
+
+    collection = api.post("/api/v1/collections/", json={"name": "列表快取合集"}, headers=feed_user).json()
+    assert api.get("/api/v1/collections/?limit=1").json()[0]["note_count"] == 0
+
+    # 加入筆記的端點只有同步版本
+    api.post(f"/api/v1/collections/{collection['id']}/notes", json={"note_id": note["id"]}, headers=feed_user)
+    assert api.get("/api/v1/collections/?limit=1").json()[0]["note_count"] == 1
+
+    api.delete(f"/api/v1/collections/{collection['id']}", headers=feed_user)
+    assert collection["id"] not in [item["id"] for item in api.get("/api/v1/collections/?limit=1").json()]
+    api.delete(f"/api/v1/notes/{note['id']}", headers=feed_user)
+    assert note["id"] not in [item["id"] for item in api.get("/api/v1/notes/?limit=1").json()]
+
+
+def test_metrics_report_feed_cache(client, enabled_feed_cache):
+    client.get("/api/v1/notes/?limit=3")
+    client.get("/api/v1/notes/?limit=3")
+
+    stats = client.get("/metrics").json()["feed_cache"]
+    assert stats["enabled"] is True
+    assert stats["backend"] == "local"
+    assert stats["hits"] >= 1
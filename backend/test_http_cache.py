@@ -0,0 +1,142 @@
+"""
+HTTP 快取測試 - ETag / Last-Modified、304 回應、Cache-Control 與非同步路由的一致性
+"""
+from datetime import datetime
+import pytest
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote
+
+
+def _user(db_session, username):
+    user = db_session.query(User).filter(User.username == username).first()
+    if user is None:
+        user = User(username=username, email=f"{username}@example.com", hashed_password="not-a-real-hash")
+        db_session.add(user)
+        db_session.flush()
+    return user
+
+
+@pytest.fixture
+def cache_data(db_session):
+    owner = _user(db_session, "cache_owner")
+    other = _user(db_session, "cache_other")
+
+    public_note = Note(title="公開筆記", content="公開內容", user_id=owner.id, updated_at=datetime(2024, 3, 1, 8, 0, 0))
+    private_note = Note(title="私密筆記", content="私密內容", is_public=False, user_id=owner.id)
+    collection = Collection(name="快取合集", user_id=owner.id)
+    db_session.add_all([public_note, private_note, collection])
+    db_session.flush()
+    db_session.add_all([
+        CollectionNote(collection_id=collection.id, note_id=public_note.id, position=0),
+        CollectionNote(collection_id=collection.id, note_id=private_note.id, position=1024),
+    ])
+    db_session.commit()
+
+    return {
+        "owner": {"Authorization": f"Bearer {create_access_token(data={'sub': owner.username})}"},
+        "other": {"Authorization": f"Bearer {create_access_token(data={'sub': other.username})}"},
+        "public_note": public_note,
+        "private_note": private_note,
+        "collection_id": collection.id,
+    }
+
+
+def test_note_has_validators_and_revalidates(api, db_session, cache_data):
+    url = f"/api/v1/notes/{cache_data['public_note'].id}"
+    response = api.get(url)
+
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('"')
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 08:00:00 GMT"
+    assert response.headers["cache-control"] == "public, no-cache"
+
+    not_modified = api.get(url, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert api.get(url, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert api.get(url, headers={"If-Modified-Since": "Fri, 01 Mar 2024 08:00:00 GMT"}).status_code == 304
+    assert api.get(url, headers={"If-Modified-Since": "Fri, 01 Mar 2024 07:59:59 GMT"}).status_code == 200
+    # If-None-Match 優先於 If-Modified-Since
+    assert api.get(
+        url, headers={"If-None-Match": '"other"', "If-Modified-Since": "Fri, 01 Mar 2024 08:00:00 GMT"}
+    ).status_code == 200
+
+    cache_data["public_note"].content = "修改後的內容"
+    db_session.commit()
+
+    changed = api.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["content"] == "修改後的內容"
+    assert changed.headers["etag"] != etag
+
+
+def test_not_modified_note_skips_content(client, count_queries, cache_data):
+    url = f"/api/v1/notes/{cache_data['public_note'].id}"
+    etag = client.get(url).headers["etag"]
+
+    with count_queries() as counter:
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    assert counter.count == 1
+    assert "note_contents" not in counter.statements[0]
+
+
+def test_private_note_is_private_and_not_revalidated_for_others(api, cache_data):
+    url = f"/api/v1/notes/{cache_data['private_note'].id}"
+    response = api.get(url, headers=cache_data["owner"])
+
+    assert response.headers["cache-control"] == "private, no-cache"
+    assert "Authorization" in response.headers["vary"]
+    # 沒有權限時即使 ETag 相符也不能回傳 304
+    forbidden = api.get(url, headers={**cache_data["other"], "If-None-Match": response.headers["etag"]})
+    assert forbidden.status_code == 403
+
+
+def test_collection_etag_follows_note_count(api, client, cache_data):
+    url = f"/api/v1/collections/{cache_data['collection_id']}"
+    response = api.get(url)
+
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "last-modified" not in response.headers
+    assert api.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.delete(
+        f"/api/v1/collections/{cache_data['collection_id']}/notes/{cache_data['private_note'].id}",
+        headers=cache_data["owner"]
+    )
+    assert api.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_collection_notes_etag_depends_on_visible_notes(api, client, count_queries, cache_data):
+    url = f"/api/v1/collections/{cache_data['collection_id']}/notes"
+    anonymous = api.get(url)
+    owner = api.get(url, headers=cache_data["owner"])
+
+    assert [note["title"] for note in anonymous.json()] == ["公開筆記"]
+    assert [note["title"] for note in owner.json()] == ["公開筆記", "私密筆記"]
+    assert anonymous.headers["cache-control"] == "public, no-cache"
+    assert owner.headers["cache-control"] == "private, no-cache"
+    assert anonymous.headers["etag"] != owner.headers["etag"]
+    assert api.get(url, headers={"If-None-Match": owner.headers["etag"]}).status_code == 200
+
+    with count_queries() as counter:
+        not_modified = api.get(url, headers={**cache_data["owner"], "If-None-Match": owner.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert not any("note_contents" in statement for statement in counter.statements)
+
+    # 重新排序後內容不同，ETag 也不同
+    client.put(
+        f"/api/v1/collections/{cache_data['collection_id']}/notes/reorder",
+        json={"note_ids": [cache_data["private_note"].id, cache_data["public_note"].id]},
+        headers=cache_data["owner"]
+    )
+    reordered = api.get(url, headers={**cache_data["owner"], "If-None-Match": owner.headers["etag"]})
+    assert reordered.status_code == 200
+    assert [note["title"] for note in reordered.json()] == ["私密筆記", "公開筆記"]
+
+
+def test_missing_collection_is_404(api):
+    assert api.get("/api/v1/collections/999999/notes").status_code == 404
@@ -0,0 +1,107 @@
+"""
+請求效能量測測試 - Server-Timing 標頭、各路由的直方圖與 Prometheus 格式的 /metrics
+"""
+import re
+from app.core.instrumentation import (
+    AI_CALL_DURATION, REQUEST_DB_STATEMENTS, REQUEST_DURATION, RESPONSE_SIZE, UNMATCHED_ROUTE
+)
+from app.core.metrics import Histogram
+
+
+def _server_timing(response):
+    """解析 Server-Timing 標頭為 {名稱: (毫秒, 說明)}"""
+    timings = {}
+    for part in response.headers["server-timing"].split(","):
+        fields = dict(
+            field.strip().split("=", 1) if "=" in field else (field.strip(), "")
+            for field in part.split(";")
+        )
+        name = part.split(";")[0].strip()
+        timings[name] = (float(fields["dur"]), fields.get("desc", "").strip('"'))
+    return timings
+
+
+def _count(histogram, *labels):
+    return histogram.snapshot().get(tuple(str(label) for label in labels), {"count": 0})["count"]
+
+
+def test_server_timing_reports_db_statements(api, client, count_queries):
+    with count_queries() as counter:
+        response = api.get("/api/v1/notes/?skip=5&limit=3")
+
+    assert response.status_code == 200
+    timings = _server_timing(response)
+    assert set(timings) >= {"db", "app"}
+    # 非同步路由使用另一個引擎，不在 count_queries 的範圍
+    statements = counter.count if api is client else 1
+    assert timings["db"][1] == f"{statements} queries"
+    assert timings["app"][0] >= timings["db"][0]
+
+
+def test_requests_recorded_by_route_template(client):
+    before = _count(REQUEST_DURATION, "GET", "/api/v1/notes/{note_id}", 404)
+    statements_before = _count(REQUEST_DB_STATEMENTS, "GET", "/api/v1/notes/{note_id}")
+
+    assert client.get("/api/v1/notes/987654").status_code == 404
+    assert client.get("/api/v1/notes/987655").status_code == 404
+    client.get("/no-such-path")
+
+    assert _count(REQUEST_DURATION, "GET", "/api/v1/notes/{note_id}", 404) == before + 2
+    assert _count(REQUEST_DB_STATEMENTS, "GET", "/api/v1/notes/{note_id}") == statements_before + 2
+    assert _count(REQUEST_DURATION, "GET", UNMATCHED_ROUTE, 404) >= 1
+    assert _count(RESPONSE_SIZE, "GET", "/api/v1/notes/{note_id}") >= 2
+
+
+def test_metrics_negotiates_prometheus_format(client):
+    client.get("/health")
+
+    assert isinstance(client.get("/metrics").json(), dict)
+
+    response = client.get("/metrics", headers={"Accept": "text/plain;version=0.0.4;q=0.5,*/*;q=0.1"})
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert re.search(r'http_request_duration_seconds_count\{method="GET",route="/health",status="200"\} \d+', text)
+    assert 'le="+Inf"' in text
+    # 原有的 JSON 統計以 app_<元件>_<欄位> 輸出
+    assert re.search(r"^app_feed_cache_hits \d+$", text, re.MULTILINE)
+
+    assert client.get("/metrics?format=prometheus").text.startswith("# HELP")
+    assert isinstance(client.get("/metrics?format=json", headers={"Accept": "text/plain"}).json(), dict)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "測試", ("route",), (0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, 'a"b')
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="a\\"b",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="a\\"b",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="a\\"b",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="a\\"b"} 4' in lines
+    assert 'test_seconds_sum{route="a\\"b"} 6.05' in lines
+
+
+def test_ai_calls_are_timed():
+    from app.services.ai_integration import AIIntegrationService
+    from app.services.ai_providers import FakeProvider
+
+    service = AIIntegrationService(api_key="", provider=FakeProvider())
+    before = _count(AI_CALL_DURATION, "fake", "generate", "ok")
+    streams_before = _count(AI_CALL_DURATION, "fake", "stream", "ok")
+
+    service.integrate_notes([{"title": "a", "content": "內容"}])
+    "".join(service.integrate_notes_stream([{"title": "a", "content": "內容"}]))
+
+    assert _count(AI_CALL_DURATION, "fake", "generate", "ok") == before + 1
+    assert _count(AI_CALL_DURATION, "fake", "stream", "ok") == streams_before + 1
+
+    failing = AIIntegrationService(api_key="", provider=FakeProvider(failure_rate=1.0))
+    errors_before = _count(AI_CALL_DURATION, "fake", "generate", "error")
+    try:
+        failing.integrate_notes([{"title": "a", "content": "內容"}])
+    except RuntimeError:
+        pass
+    assert _count(AI_CALL_DURATION, "fake", "generate", "error") == errors_before + 1
@@ -0,0 +1,452 @@
+"""
+AI 整合測試 - 背景工作（排入、重試、容量上限、查詢）、結果快取與 SSE 串流
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote
+from app.services.ai_integration import AIIntegrationService, IntegrationResult
+from app.services.integration_jobs import (
+    IntegrationJobQueue, InMemoryJobStore, IntegrationQueueFull, QUEUED, RUNNING, SUCCEEDED, FAILED
+)
+
+
+def _result(content):
+    return IntegrationResult(content=content, chunk_count=1, timings={"total_ms": 1.0})
+
+
+def _make_queue(**overrides):
+    options = dict(
+        store=InMemoryJobStore(), workers=1, max_pending=4, max_retries=2,
+        retry_backoff=0, result_ttl=3600, stale_seconds=600
+    )
+    options.update(overrides)
+    return IntegrationJobQueue(**options)
+
+
+def _wait_until_finished(get_job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job()
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("整合工作未在時限內結束")
+
+
+def _job_dict(queue, job_id):
+    job = queue.get(job_id)
+    return {"status": job.status, "attempts": job.attempts, "job": job}
+
+
+def test_queue_retries_runtime_errors_then_succeeds():
+    queue = _make_queue()
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 2:
+            raise RuntimeError("暫時性錯誤")
+        return _result("整合結果")
+
+    job = queue.submit(flaky, collection_id=1, note_count=3)
+    finished = _wait_until_finished(lambda: _job_dict(queue, job.id))
+    queue.shutdown()
+
+    assert finished["status"] == SUCCEEDED
+    assert finished["attempts"] == 2
+    assert finished["job"].integrated_content == "整合結果"
+    assert queue.stats()["retries"] == 1
+
+
+def test_queue_does_not_retry_value_errors():
+    queue = _make_queue()
+
+    def invalid():
+        raise ValueError("筆記資料不能為空")
+
+    job = queue.submit(invalid, collection_id=1, note_count=0)
+    finished = _wait_until_finished(lambda: _job_dict(queue, job.id))
+    queue.shutdown()
+
+    assert finished["status"] == FAILED
+    assert finished["attempts"] == 1
+    assert finished["job"].error == "筆記資料不能為空"
+
+
+def test_queue_rejects_jobs_beyond_capacity():
+    queue = _make_queue(max_pending=1)
+    release = []
+
+    def blocked():
+        while not release:
+            time.sleep(0.01)
+        return _result("完成")
+
+    queue.submit(blocked, collection_id=1, note_count=1)
+    queue.submit(blocked, collection_id=1, note_count=1)
+    with pytest.raises(IntegrationQueueFull):
+        queue.submit(blocked, collection_id=1, note_count=1)
+
+    release.append(True)
+    queue.shutdown()
+    assert queue.stats()["rejected"] == 1
+
+
+class FailingResultStore(InMemoryJobStore):
+    """寫入成功結果時失敗的工作儲存"""
+
+    def transition(self, job_id, statuses, **fields):
+        if fields.get("status") == SUCCEEDED:
+            raise RuntimeError("資料庫已鎖定")
+        return super().transition(job_id, statuses, **fields)
+
+
+def test_queue_marks_job_failed_when_result_cannot_be_saved():
+    queue = _make_queue(store=FailingResultStore())
+
+    job = queue.submit(lambda: _result("整合結果"), collection_id=1, note_count=1)
+    finished = _wait_until_finished(lambda: _job_dict(queue, job.id))
+    queue.shutdown()
+
+    assert finished["status"] == FAILED
+    assert "資料庫已鎖定" in finished["job"].error
+    stats = queue.stats()
+    assert stats["failed"] == 1
+    assert stats["unfinished"] == 0
+
+
+def test_queue_purges_expired_results_while_running():
+    queue = _make_queue(result_ttl=0)
+    queue.start()
+    job = queue.complete("快取結果", collection_id=1, note_count=1)
+    assert queue.get(job.id) is not None
+
+    # 未到清除間隔時不會清除
+    queue.complete("快取結果", collection_id=1, note_count=1)
+    assert queue.get(job.id) is not None
+
+    # 超過清除間隔後，下一個工作順便清除過期結果
+    queue._next_purge = time.monotonic() - 1
+    latest = queue.complete("快取結果", collection_id=1, note_count=1)
+    queue.shutdown()
+
+    assert queue.get(job.id) is None
+    assert queue.get(latest.id) is not None
+
+
+def _wait_for_status(queue, job_id, status, timeout=5):
+    deadline = time.monotonic() + timeout
+    while queue.store.get(job_id).status != status:
+        if time.monotonic() > deadline:
+            raise AssertionError(f"工作未在時限內進入 {status}")
+        time.sleep(0.01)
+
+
+def test_stale_running_job_is_not_revived_and_owned_queued_job_waits():
+    queue = _make_queue(stale_seconds=0)
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return _result("完成")
+
+    running = queue.submit(blocked, collection_id=1, note_count=1)
+    queued = queue.submit(blocked, collection_id=1, note_count=1)
+    _wait_for_status(queue, running.id, RUNNING)
+    time.sleep(0.01)
+
+    # 目前行程排入、仍在排隊的工作不會因為等待而視為失敗
+    assert queue.get(queued.id).status == QUEUED
+    # 執行中但沒有心跳的工作視為中斷
+    assert queue.get(running.id).status == FAILED
+
+    release.set()
+    _wait_for_status(queue, queued.id, SUCCEEDED)
+    queue.shutdown()
+
+    # 已視為中斷的工作完成後仍維持失敗，不會改為成功
+    job = queue.store.get(running.id)
+    assert job.status == FAILED
+    assert job.integrated_content is None
+    assert queue.stats()["failed"] == 1
+
+
+def test_heartbeat_keeps_running_job_fresh():
+    queue = _make_queue(stale_seconds=60)
+    beat = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        beat.wait(5)
+        queue.heartbeat()
+        release.wait(5)
+        return _result("完成")
+
+    job = queue.submit(slow, collection_id=1, note_count=1)
+    _wait_for_status(queue, job.id, RUNNING)
+    queue.store.update(job.id, updated_at=datetime.utcnow() - timedelta(minutes=5))
+
+    beat.set()
+    deadline = time.monotonic() + 5
+    while queue.store.get(job.id).updated_at < datetime.utcnow() - timedelta(minutes=1):
+        assert time.monotonic() < deadline, "心跳未更新 updated_at"
+        time.sleep(0.01)
+    assert queue.get(job.id).status == RUNNING
+
+    release.set()
+    _wait_for_status(queue, job.id, SUCCEEDED)
+    queue.shutdown()
+
+    # 不在工作中呼叫時不做任何事
+    queue.heartbeat()
+
+
+@pytest.fixture(scope="module")
+def private_collection(db_session):
+    user = User(username="job_user", email="job_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.flush()
+
+    collection = Collection(name="整合測試", is_public=False, user_id=user.id)
+    db_session.add(collection)
+    db_session.flush()
+    for position in range(2):
+        note = Note(title=f"整合筆記 {position}", content="內容", user_id=user.id)
+        db_session.add(note)
+        db_session.flush()
+        db_session.add(CollectionNote(collection_id=collection.id, note_id=note.id, position=position))
+    db_session.commit()
+
+    token = create_access_token(data={"sub": user.username})
+    return {"headers": {"Authorization": f"Bearer {token}"}, "collection_id": collection.id}
+
+
+def test_integrate_endpoint_enqueues_job(client, private_collection, monkeypatch):
+    # 取代實際呼叫模型的 _generate，整合流程其餘部分照常執行
+    monkeypatch.setattr(
+        AIIntegrationService, "_generate",
+        lambda self, full_prompt: f"已整合 {full_prompt.count('## 筆記')} 份筆記"
+    )
+    headers = private_collection["headers"]
+
+    response = client.post(
+        f"/api/v1/collections/{private_collection['collection_id']}/integrate",
+        json={"api_key": "test-key"},
+        headers=headers
+    )
+    assert response.status_code == 202, response.text
+    job_id = response.json()["job_id"]
+
+    job = _wait_until_finished(
+        lambda: client.get(f"/api/v1/integrations/{job_id}", headers=headers).json()
+    )
+    assert job["status"] == SUCCEEDED
+    assert job["result"]["integrated_content"] == "已整合 2 份筆記"
+    assert job["result"]["note_count"] == 2
+    assert job["result"]["chunk_count"] == 1
+    assert set(job["result"]["timings"]) >= {"pack_ms", "map_ms", "reduce_ms", "total_ms"}
+
+    # 登入用戶的工作不能由其他人查詢
+    assert client.get(f"/api/v1/integrations/{job_id}").status_code == 404
+
+
+def test_repeated_integration_uses_cache_until_note_changes(client, db_session, private_collection, monkeypatch):
+    calls = []
+
+    def fake_generate(self, full_prompt):
+        calls.append(full_prompt)
+        return f"第 {len(calls)} 次整合"
+
+    monkeypatch.setattr(AIIntegrationService, "_generate", fake_generate)
+    headers = private_collection["headers"]
+    url = f"/api/v1/collections/{private_collection['collection_id']}/integrate"
+    body = {"api_key": "test-key", "custom_prompt": "快取測試"}
+
+    def integrate():
+        job_id = client.post(url, json=body, headers=headers).json()["job_id"]
+        return _wait_until_finished(
+            lambda: client.get(f"/api/v1/integrations/{job_id}", headers=headers).json()
+        )
+
+    first = integrate()
+    second = integrate()
+    assert len(calls) == 1
+    assert second["attempts"] == 0
+    assert second["result"]["integrated_content"] == first["result"]["integrated_content"]
+
+    # 編輯合集內的筆記後重新呼叫模型
+    note = db_session.query(Note).filter(Note.title == "整合筆記 0").one()
+    note.content = "更新後的內容"
+    db_session.commit()
+
+    third = integrate()
+    assert len(calls) == 2
+    assert third["result"]["integrated_content"] == "第 2 次整合"
+
+
+def _parse_sse(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_integrate_stream_emits_chunks_then_metadata(client, private_collection, monkeypatch):
+    monkeypatch.setattr(
+        AIIntegrationService, "integrate_notes_stream",
+        lambda self, notes_data, integration_prompt=None, timings=None, partials=None: iter(["# 標題\n", "內容"])
+    )
+    url = f"/api/v1/collections/{private_collection['collection_id']}/integrate/stream"
+    body = {"api_key": "test-key", "custom_prompt": "串流測試"}
+
+    response = client.post(url, json=body, headers=private_collection["headers"])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["chunk", "chunk", "done"]
+    assert "".join(data["text"] for name, data in events if name == "chunk") == "# 標題\n內容"
+    assert events[-1][1]["note_count"] == 2
+    assert events[-1][1]["cached"] is False
+
+    # 串流結果同樣寫入快取
+    cached = _parse_sse(client.post(url, json=body, headers=private_collection["headers"]).text)
+    assert cached[0] == ("chunk", {"text": "# 標題\n內容"})
+    assert cached[-1][1]["cached"] is True
+
+
+def test_integrate_stream_shares_queue_capacity(client, private_collection, monkeypatch):
+    from app.services.integration_jobs import integration_queue
+
+    monkeypatch.setattr(
+        AIIntegrationService, "integrate_notes_stream",
+        lambda self, notes_data, integration_prompt=None, timings=None, partials=None: iter(["內容"])
+    )
+    url = f"/api/v1/collections/{private_collection['collection_id']}/integrate/stream"
+    headers = private_collection["headers"]
+    unfinished = integration_queue.stats()["unfinished"]
+
+    monkeypatch.setattr(integration_queue, "capacity", unfinished)
+    response = client.post(url, json={"api_key": "test-key", "custom_prompt": "名額測試"}, headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+
+    monkeypatch.setattr(integration_queue, "capacity", unfinished + 1)
+    response = client.post(url, json={"api_key": "test-key", "custom_prompt": "名額測試"}, headers=headers)
+    assert [name for name, _ in _parse_sse(response.text)] == ["chunk", "done"]
+    # 串流結束後釋放名額
+    assert integration_queue.stats()["unfinished"] == unfinished
+
+
+def _conflicting_session_factory():
+    """模擬另一個工作同時寫入同一個快取鍵：flush 時發生唯一鍵衝突"""
+    from sqlalchemy.exc import IntegrityError
+    from app.database import SessionLocal
+
+    def factory():
+        db = SessionLocal()
+
+        def flush(*args, **kwargs):
+            raise IntegrityError("INSERT INTO integration_cache", {}, Exception("UNIQUE constraint failed"))
+
+        db.flush = flush
+        return db
+
+    return factory
+
+
+def test_cache_write_failure_does_not_fail_job_or_stream(client, private_collection, monkeypatch):
+    from app.services.integration_cache import integration_cache
+
+    monkeypatch.setattr(integration_cache, "session_factory", _conflicting_session_factory())
+    monkeypatch.setattr(AIIntegrationService, "_generate", lambda self, full_prompt: "整合結果")
+    monkeypatch.setattr(
+        AIIntegrationService, "integrate_notes_stream",
+        lambda self, notes_data, integration_prompt=None, timings=None, partials=None: iter(["串流結果"])
+    )
+    headers = private_collection["headers"]
+    url = f"/api/v1/collections/{private_collection['collection_id']}/integrate"
+    write_errors = integration_cache.stats()["write_errors"]
+
+    job_id = client.post(url, json={"api_key": "test-key", "custom_prompt": "寫入衝突"}, headers=headers).json()["job_id"]
+    job = _wait_until_finished(lambda: client.get(f"/api/v1/integrations/{job_id}", headers=headers).json())
+    assert job["status"] == SUCCEEDED
+    assert job["result"]["integrated_content"] == "整合結果"
+
+    response = client.post(f"{url}/stream", json={"api_key": "test-key", "custom_prompt": "串流寫入衝突"}, headers=headers)
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["chunk", "done"]
+    assert events[-1][1]["cached"] is False
+
+    assert integration_cache.stats()["write_errors"] == write_errors + 2
+
+
+def test_add_missing_columns_upgrades_existing_jobs_table(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from app.database import Base, add_missing_columns
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        # 加入 chunk_count / timings 之前的 integration_jobs 結構
+        connection.execute(text(
+            "CREATE TABLE integration_jobs (id VARCHAR(32) PRIMARY KEY, collection_id INTEGER NOT NULL, "
+            "user_id INTEGER, status VARCHAR(16) NOT NULL, attempts INTEGER NOT NULL, "
+            "note_count INTEGER NOT NULL, integrated_content TEXT, error TEXT, "
+            "created_at DATETIME, updated_at DATETIME, finished_at DATETIME)"
+        ))
+
+    added = add_missing_columns(engine, Base.metadata)
+
+    assert {"integration_jobs.chunk_count", "integration_jobs.timings"} <= set(added)
+    columns = {column["name"] for column in inspect(engine).get_columns("integration_jobs")}
+    assert {"chunk_count", "timings"} <= columns
+    assert add_missing_columns(engine, Base.metadata) == []
+
+
+def test_integrate_endpoint_with_fake_provider(client, private_collection, monkeypatch):
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "AI_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "FAKE_AI_LATENCY_SECONDS", 0)
+    headers = private_collection["headers"]
+
+    # 假模型不需要 API 金鑰
+    response = client.post(
+        f"/api/v1/collections/{private_collection['collection_id']}/integrate",
+        json={"custom_prompt": "假模型"},
+        headers=headers
+    )
+    assert response.status_code == 202, response.text
+
+    job = _wait_until_finished(
+        lambda: client.get(f"/api/v1/integrations/{response.json()['job_id']}", headers=headers).json()
+    )
+    assert job["status"] == SUCCEEDED
+    assert "- 整合筆記 0" in job["result"]["integrated_content"]
+
+
+def test_partial_summaries_are_reused_and_pruned(client, db_session, private_collection):
+    from app.services.integration_cache import IntegrationPartialCache
+
+    cache = IntegrationPartialCache(max_entries=100)
+    partials = cache.for_collection(private_collection["collection_id"], "增量測試", "model")
+
+    partials.put_many({"a" * 64: "區塊一", "b" * 64: "區塊二"})
+    assert partials.get_many(["a" * 64, "b" * 64, "c" * 64]) == {"a" * 64: "區塊一", "b" * 64: "區塊二"}
+
+    # 其他提示詞的結果不會被這次整合清除
+    other = cache.for_collection(private_collection["collection_id"], "其他提示詞", "model")
+    other.put_many({"d" * 64: "其他"})
+
+    partials.retain(["a" * 64])
+    assert partials.get_many(["a" * 64, "b" * 64]) == {"a" * 64: "區塊一"}
+    assert other.get_many(["d" * 64]) == {"d" * 64: "其他"}
+
+    stats = cache.stats()
+    assert stats["hits"] == 4 and stats["misses"] == 2
+    assert stats["pruned"] == 1
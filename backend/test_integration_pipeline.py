@@ -0,0 +1,294 @@
+"""
+AI 整合 map-reduce 測試 - token 估計、分區塊與以假模型執行的 map/reduce 流程
+"""
+import threading
+import pytest
+from app.services.ai_integration import (
+    AIIntegrationService, PartialSummaryStore, estimate_tokens, pack_notes, _split_content, _NOTE_OVERHEAD_TOKENS
+)
+
+
+def _note_tokens(note):
+    return estimate_tokens(note["title"]) + _NOTE_OVERHEAD_TOKENS + estimate_tokens(note["content"])
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens("中文筆記") == 4
+    assert estimate_tokens("中文 abcd") == 2 + 2
+
+
+def test_split_content_respects_budget_and_keeps_text():
+    paragraphs = ["第一段" * 10, "second paragraph " * 5, "很長的段落" * 40]
+    content = "\n\n".join(paragraphs)
+
+    parts = _split_content(content, 50)
+
+    assert len(parts) > 1
+    assert all(estimate_tokens(part) <= 50 for part in parts)
+    assert "".join(parts).replace("\n\n", "") == content.replace("\n\n", "")
+
+
+def test_pack_notes_keeps_order_and_splits_oversized_notes():
+    notes = [{"title": f"筆記 {i}", "content": "內容" * 20} for i in range(5)]
+    notes.insert(2, {"title": "長筆記", "content": "\n\n".join(["段落內容" * 20] * 6)})
+
+    chunks = pack_notes(notes, 120)
+
+    assert len(chunks) > 1
+    assert all(sum(_note_tokens(note) for note in chunk) <= 120 for chunk in chunks)
+
+    titles = [note["title"] for chunk in chunks for note in chunk]
+    long_parts = [title for title in titles if title.startswith("長筆記（第 ")]
+    assert len(long_parts) > 1
+    assert titles == ["筆記 0", "筆記 1"] + long_parts + ["筆記 2", "筆記 3", "筆記 4"]
+
+
+def test_pack_notes_single_chunk_when_within_budget():
+    notes = [{"title": "a", "content": "短內容"}, {"title": "b", "content": "短內容"}]
+    assert pack_notes(notes, 1000) == [notes]
+
+
+class FakeModel:
+    """記錄提示詞的假模型；fail_once 中的區塊第一次呼叫時失敗"""
+
+    def __init__(self, fail_once=()):
+        self.prompts = []
+        self.fail_once = set(fail_once)
+        self.lock = threading.Lock()
+
+    def generate(self, full_prompt):
+        with self.lock:
+            self.prompts.append(full_prompt)
+            for marker in list(self.fail_once):
+                if marker in full_prompt:
+                    self.fail_once.discard(marker)
+                    raise RuntimeError("暫時性錯誤")
+
+        if "各自的整理結果" in full_prompt:
+            return "最終整合"
+        return f"部分摘要 {full_prompt.count('## 筆記')}"
+
+
+def _service(**options):
+    return AIIntegrationService(api_key="test-key", map_retries=1, retry_backoff=0, **options)
+
+
+def test_small_collection_uses_single_call(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(AIIntegrationService, "_generate", lambda self, full_prompt: model.generate(full_prompt))
+    notes = [{"title": "a", "content": "內容"}, {"title": "b", "content": "內容"}]
+
+    result = _service(chunk_tokens=10000).integrate_notes_chunked(notes, "整合要求")
+
+    assert result.chunk_count == 1
+    assert len(model.prompts) == 1
+    assert model.prompts[0].startswith("整合要求")
+    assert result.timings["map_levels"] == 0
+
+
+def test_large_collection_maps_chunks_then_reduces(monkeypatch):
+    model = FakeModel(fail_once=["第 2/"])
+    monkeypatch.setattr(AIIntegrationService, "_generate", lambda self, full_prompt: model.generate(full_prompt))
+    notes = [{"title": f"筆記 {i}", "content": "課堂內容" * 30} for i in range(8)]
+
+    beats = []
+    result = _service(chunk_tokens=300, map_concurrency=2).integrate_notes_chunked(
+        notes, "整合要求", progress=lambda: beats.append(1)
+    )
+
+    assert result.content == "最終整合"
+    assert result.chunk_count > 1
+    # 每個區塊整理完成與 map 階段結束時各回報一次進度
+    assert len(beats) == result.chunk_count + 1
+    map_prompts = [prompt for prompt in model.prompts if "大型筆記集" in prompt]
+    # 失敗的區塊只重試自己一次
+    assert len(map_prompts) == result.chunk_count + 1
+    assert "各自的整理結果" in model.prompts[-1]
+    assert result.timings["map_levels"] == 1
+    assert set(result.timings) >= {"pack_ms", "map_ms", "reduce_ms", "total_ms"}
+
+
+def test_model_pool_reuses_models_per_key_and_evicts_lru():
+    from app.services.ai_providers import GeminiModelPool
+
+    created = []
+    pool = GeminiModelPool(max_size=2, factory=lambda api_key, model_name: created.append(api_key) or object())
+
+    first = pool.get("key-a", "model")
+    assert pool.get("key-a", "model") is first
+    pool.get("key-b", "model")
+    pool.get("key-a", "model")
+    pool.get("key-c", "model")  # 淘汰最久未使用的 key-b
+
+    assert pool.get("key-a", "model") is first
+    pool.get("key-b", "model")
+    assert created == ["key-a", "key-b", "key-c", "key-b"]
+    stats = pool.stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 3
+
+
+def test_services_with_different_keys_use_their_own_models(monkeypatch):
+    from app.services import ai_providers
+
+    class KeyedModel:
+        def __init__(self, api_key):
+            self.api_key = api_key
+
+        def generate_content(self, prompt):
+            return type("Response", (), {"text": f"{self.api_key}: 完成"})()
+
+    pool = ai_providers.GeminiModelPool(max_size=4, factory=lambda api_key, model_name: KeyedModel(api_key))
+    monkeypatch.setattr(ai_providers, "gemini_models", pool)
+    notes = [{"title": "a", "content": "內容"}]
+
+    assert AIIntegrationService(api_key="user-1").integrate_notes(notes) == "user-1: 完成"
+    assert AIIntegrationService(api_key="user-2").integrate_notes(notes) == "user-2: 完成"
+    assert AIIntegrationService(api_key="user-1").integrate_notes(notes) == "user-1: 完成"
+    assert pool.stats()["misses"] == 2
+
+
+def test_gemini_model_uses_public_client_per_key():
+    glm = pytest.importorskip("google.ai.generativelanguage")
+    from app.services.ai_providers import GeminiModel, _create_gemini_model
+
+    model = _create_gemini_model("test-key", "gemini-2.0-flash-lite")
+    assert isinstance(model.client, glm.GenerativeServiceClient)
+    assert model.model_name == "models/gemini-2.0-flash-lite"
+
+    class RecordingClient:
+        def __init__(self):
+            self.requests = []
+
+        def _response(self, *texts):
+            return glm.GenerateContentResponse(candidates=[
+                glm.Candidate(content=glm.Content(parts=[glm.Part(text=text) for text in texts]))
+            ])
+
+        def generate_content(self, request):
+            self.requests.append(request)
+            return self._response("整合", "結果")
+
+        def stream_generate_content(self, request):
+            self.requests.append(request)
+            return iter([self._response("第一段"), glm.GenerateContentResponse(), self._response("第二段")])
+
+    client = RecordingClient()
+    model = GeminiModel(client, "gemini-2.0-flash-lite")
+    assert model.generate_content("提示詞").text == "整合結果"
+    assert [chunk.text for chunk in model.generate_content("提示詞", stream=True)] == ["第一段", "", "第二段"]
+    assert client.requests[0].model == "models/gemini-2.0-flash-lite"
+    assert client.requests[0].contents[0].parts[0].text == "提示詞"
+
+
+def test_fake_provider_is_deterministic():
+    from app.services.ai_providers import FakeProvider
+
+    prompt = "整合要求\n\n## 筆記 1: 線性代數\n\n內容\n\n## 筆記 2: 微積分\n\n內容"
+    provider = FakeProvider()
+
+    output = provider.generate(prompt)
+    assert output == FakeProvider().generate(prompt)
+    assert "- 線性代數" in output and "- 微積分" in output
+    assert "".join(provider.stream(prompt)).strip() == output
+    assert FakeProvider().generate(prompt + "!") != output
+
+
+def test_fake_provider_failures_follow_seed():
+    from app.services.ai_providers import FakeProvider
+
+    def failures(seed):
+        provider = FakeProvider(failure_rate=0.5, seed=seed)
+        outcomes = []
+        for _ in range(20):
+            try:
+                provider.generate("提示詞")
+                outcomes.append(False)
+            except RuntimeError:
+                outcomes.append(True)
+        return outcomes
+
+    assert failures(1) == failures(1)
+    assert 0 < sum(failures(1)) < 20
+
+    provider = FakeProvider(failure_rate=1.0)
+    with pytest.raises(RuntimeError):
+        provider.generate("提示詞")
+    assert provider.stats() == {"calls": 1, "failures": 1}
+
+
+def test_fake_provider_runs_map_reduce_without_api_key():
+    from app.services.ai_providers import FakeProvider
+
+    service = AIIntegrationService(
+        api_key="", chunk_tokens=300, map_retries=0, retry_backoff=0, provider=FakeProvider()
+    )
+    notes = [{"title": f"筆記 {i}", "content": "課堂內容" * 30} for i in range(8)]
+
+    result = service.integrate_notes_chunked(notes, "整合要求")
+
+    assert service.model_name == "fake-integration"
+    assert result.chunk_count > 1
+    assert result.content.startswith("# 整合筆記")
+    assert "第 1 部分的整理結果" in result.content
+
+
+def _chunk_titles(chunks):
+    return [tuple(note["title"] for note in chunk) for chunk in chunks]
+
+
+def test_stable_packing_limits_changes_to_nearby_chunks():
+    notes = [{"title": f"筆記 {i}", "content": f"第 {i} 篇" + "內容" * (10 + i % 7)} for i in range(60)]
+    before = _chunk_titles(pack_notes(notes, 200, stable=True))
+    assert len(before) > 4
+
+    edited = [dict(note) for note in notes]
+    edited[30]["content"] += "（修正錯字）"
+    inserted = [{"title": "新筆記", "content": "新增的內容" * 5}] + notes
+
+    for changed in (edited, inserted):
+        after = set(_chunk_titles(pack_notes(changed, 200, stable=True)))
+        assert len(set(before) - after) <= 2
+
+
+class DictPartials(PartialSummaryStore):
+    def __init__(self):
+        self.summaries = {}
+
+    def get_many(self, keys):
+        return {key: self.summaries[key] for key in keys if key in self.summaries}
+
+    def put_many(self, summaries):
+        self.summaries.update(summaries)
+
+    def retain(self, keys):
+        self.summaries = {key: value for key, value in self.summaries.items() if key in keys}
+
+
+def test_incremental_integration_only_resummarizes_changed_chunks(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(AIIntegrationService, "_generate", lambda self, full_prompt: model.generate(full_prompt))
+    notes = [{"title": f"筆記 {i}", "content": f"第 {i} 篇" + "課堂內容" * 20} for i in range(40)]
+    partials = DictPartials()
+    service = _service(chunk_tokens=600)
+
+    first = service.integrate_notes_chunked(notes, "整合要求", partials=partials)
+    first_calls = len(model.prompts)
+    assert first.chunk_count > 4
+    assert first.timings["chunks_reused"] == 0
+    assert len(partials.summaries) == first.chunk_count
+
+    notes[20] = dict(notes[20], content=notes[20]["content"] + "（修正錯字）")
+    model.prompts.clear()
+    second = service.integrate_notes_chunked(notes, "整合要求", partials=partials)
+
+    # 只重新整理修改的筆記所在的區塊，再重跑最後的合併
+    map_calls = len(model.prompts) - 1
+    assert 1 <= map_calls <= 2 < first_calls - 1
+    assert second.timings["chunks_reused"] == second.chunk_count - map_calls
+    assert len(partials.summaries) == second.chunk_count
@@ -0,0 +1,102 @@
+"""
+我的筆記／合集列表測試 - 摘要模式、游標模式與 NDJSON 串流
+"""
+import json
+import pytest
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote
+from app.routers.notes import EXCERPT_LENGTH
+
+NOTE_COUNT = 7
+COLLECTION_COUNT = 5
+LONG_CONTENT = "很長的筆記內容。" * 100
+
+
+@pytest.fixture(scope="module")
+def list_user(db_session):
+    user = User(username="list_user", email="list_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.flush()
+
+    notes = [Note(title=f"列表筆記 {i}", content=LONG_CONTENT, user_id=user.id) for i in range(NOTE_COUNT)]
+    db_session.add_all(notes)
+    db_session.flush()
+    for i in range(COLLECTION_COUNT):
+        collection = Collection(name=f"列表合集 {i}", description="合集描述", user_id=user.id)
+        db_session.add(collection)
+        db_session.flush()
+        db_session.add(CollectionNote(collection_id=collection.id, note_id=notes[i].id, position=0))
+    db_session.commit()
+
+    token = create_access_token(data={"sub": user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _get(client, url, headers, **params):
+    response = client.get(url, params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_note_summary_has_excerpt_but_no_content(client, list_user):
+    notes = _get(client, "/api/v1/notes/my", list_user, view="summary").json()
+
+    assert len(notes) == NOTE_COUNT
+    for note in notes:
+        assert "content" not in note
+        assert note["excerpt"] == LONG_CONTENT[:EXCERPT_LENGTH]
+        assert note["owner_username"] == "list_user"
+
+
+def test_collection_summary_has_no_description(client, list_user):
+    collections = _get(client, "/api/v1/collections/my", list_user, view="summary").json()
+
+    assert len(collections) == COLLECTION_COUNT
+    for collection in collections:
+        assert "description" not in collection
+        assert "cover_image" not in collection
+        assert collection["note_count"] == 1
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/api/v1/notes/my", NOTE_COUNT),
+    ("/api/v1/collections/my", COLLECTION_COUNT),
+])
+def test_summary_cursor_mode_returns_summary_pages(client, list_user, url, expected):
+    page = _get(client, url, list_user, view="summary", cursor="", limit=expected - 1).json()
+
+    assert len(page["items"]) == expected - 1
+    assert page["next_cursor"] is not None
+    assert "content" not in page["items"][0] and "description" not in page["items"][0]
+
+    last = _get(client, url, list_user, view="summary", cursor=page["next_cursor"], limit=expected - 1).json()
+    assert len(last["items"]) == 1
+    assert last["next_cursor"] is None
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/api/v1/notes/my", NOTE_COUNT),
+    ("/api/v1/collections/my", COLLECTION_COUNT),
+])
+@pytest.mark.parametrize("view", ["full", "summary"])
+def test_stream_yields_one_line_per_row(client, list_user, url, expected, view):
+    response = _get(client, url, list_user, view=view, stream="true")
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) == expected
+
+    rows = [json.loads(line) for line in lines]
+    assert len({row["id"] for row in rows}) == expected
+    if view == "summary":
+        assert all("content" not in row and "description" not in row for row in rows)
+
+
+def test_stream_applies_skip_and_limit(client, list_user):
+    response = _get(client, "/api/v1/notes/my", list_user, stream="true", skip=2, limit=3)
+    assert len(response.text.splitlines()) == 3
+
+
+def test_invalid_view_is_rejected(client, list_user):
+    response = client.get("/api/v1/notes/my", params={"view": "compact"}, headers=list_user)
+    assert response.status_code == 400
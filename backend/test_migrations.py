@@ -0,0 +1,136 @@
+"""
+資料庫遷移測試 - 由空資料庫升級到最新版本後與模型一致，且可從舊版啟動建立的資料庫接續升級
+"""
+import os
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+alembic = pytest.importorskip("alembic")
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+
+from app.core.config import settings
+from app.database import Base
+import app.models  # noqa: F401
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.fixture
+def migrated_url(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    monkeypatch.setattr(settings, "DATABASE_URL", url)
+    return url
+
+
+def _config():
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "migrations"))
+    return config
+
+
+def _include_object(object, name, type_, reflected, compare_to):
+    # 全文索引 notes_fts* 不在模型中（與 migrations/env.py 相同）
+    return not (type_ == "table" and reflected and compare_to is None)
+
+
+def _diff(url):
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            context = MigrationContext.configure(connection, opts={"include_object": _include_object})
+            return compare_metadata(context, Base.metadata)
+    finally:
+        engine.dispose()
+
+
+def test_upgrade_head_matches_models(migrated_url):
+    command.upgrade(_config(), "head")
+
+    assert _diff(migrated_url) == []
+    engine = create_engine(migrated_url)
+    assert inspect(engine).has_table("notes_fts")
+    engine.dispose()
+
+
+def test_upgrade_adopts_database_created_at_startup(migrated_url):
+    # 舊版啟動時以 create_all 建立了所有資料表，但還沒有新的索引
+    engine = create_engine(migrated_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_collection_notes_note_id"))
+        connection.execute(text("DROP INDEX uq_collection_notes_collection_note"))
+        connection.execute(text("INSERT INTO collection_notes (collection_id, note_id, position) VALUES (1, 1, 0)"))
+        connection.execute(text("INSERT INTO collection_notes (collection_id, note_id, position) VALUES (1, 2, 1)"))
+
+    command.upgrade(_config(), "head")
+
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM collection_notes")).scalar() == 2
+    indexes = {index["name"] for index in inspect(engine).get_indexes("collection_notes")}
+    assert {"ix_collection_notes_note_id", "uq_collection_notes_collection_note"} <= indexes
+    engine.dispose()
+    assert _diff(migrated_url) == []
+
+
+def test_upgrade_stops_on_duplicate_collection_notes(migrated_url):
+    engine = create_engine(migrated_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX uq_collection_notes_collection_note"))
+        for position in range(3):
+            connection.execute(text(
+                "INSERT INTO collection_notes (collection_id, note_id, position) VALUES (1, 1, :position)"
+            ), {"position": position})
+
+    with pytest.raises(RuntimeError, match="1 組重複.*共 2 筆多餘資料"):
+        command.upgrade(_config(), "head")
+
+    # 重複的資料不會被刪除
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM collection_notes")).scalar() == 3
+    engine.dispose()
+
+
+def test_downgrade_to_base_drops_tables(migrated_url):
+    command.upgrade(_config(), "head")
+    command.downgrade(_config(), "base")
+
+    engine = create_engine(migrated_url)
+    assert set(inspect(engine).get_table_names()) <= {"alembic_version"}
+    engine.dispose()
+
+
+def test_upgrade_moves_note_contents(migrated_url):
+    command.upgrade(_config(), "0002")
+    engine = create_engine(migrated_url)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'u', 'u@example.com', 'x')"
+        ))
+        for note_id, content in [(1, "相同的內容"), (2, "相同的內容"), (3, "另一份內容" * 100)]:
+            connection.execute(
+                text("INSERT INTO notes (id, title, content, user_id) VALUES (:id, 'n', :content, 1)"),
+                {"id": note_id, "content": content}
+            )
+
+    command.upgrade(_config(), "head")
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM note_contents")).scalar() == 2
+        rows = connection.execute(text(
+            "SELECT notes.excerpt, note_contents.text FROM notes "
+            "JOIN note_contents ON note_contents.hash = notes.content_hash ORDER BY notes.id"
+        )).all()
+    assert [row.text for row in rows] == ["相同的內容", "相同的內容", "另一份內容" * 100]
+    assert rows[2].excerpt == ("另一份內容" * 100)[:200]
+    # 0004 建立全文索引並寫入既有的筆記
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM notes_fts")).scalar() == 3
+
+    command.downgrade(_config(), "0002")
+    with engine.connect() as connection:
+        contents = connection.execute(text("SELECT content FROM notes ORDER BY id")).scalars().all()
+    assert contents == ["相同的內容", "相同的內容", "另一份內容" * 100]
+    engine.dispose()
@@ -0,0 +1,173 @@
+"""
+筆記內容儲存測試 - 內容存於 note_contents、相同內容共用、壓縮存放，以及只讀取中繼資料的查詢不載入內容
+"""
+import uuid
+import pytest
+from sqlalchemy import select
+from app.core import create_access_token, settings
+from app.models import User, Note, NoteContent, note_content
+from app.models.note_content import compression_codec, content_hash, decode_content
+
+
+@pytest.fixture(scope="module")
+def storage_user(db_session):
+    user = User(username="storage_user", email="storage_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.commit()
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user.username})}"}
+
+
+def _content_row(hash):
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        return db.execute(select(NoteContent).where(NoteContent.hash == hash)).scalars().first()
+
+
+def _create(api, headers, title, content):
+    response = api.post("/api/v1/notes/", json={"title": title, "content": content}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_identical_contents_are_stored_once(client, storage_user):
+    content = f"共用的內容 {uuid.uuid4().hex}"
+    first = _create(client, storage_user, "原始筆記", content)
+    second = _create(client, storage_user, "複製的筆記", content)
+
+    assert _content_row(content_hash(content)) is not None
+    assert client.get(f"/api/v1/notes/{second['id']}").json()["content"] == content
+
+    assert client.delete(f"/api/v1/notes/{first['id']}", headers=storage_user).status_code == 204
+    assert _content_row(content_hash(content)) is not None
+
+    assert client.delete(f"/api/v1/notes/{second['id']}", headers=storage_user).status_code == 204
+    assert _content_row(content_hash(content)) is None
+
+
+def test_update_replaces_content_and_keeps_search_index(api, storage_user):
+    old_content = f"舊的內容 {uuid.uuid4().hex}"
+    new_content = f"線性代數的新內容 {uuid.uuid4().hex}"
+    note = _create(api, storage_user, "待修改的筆記", old_content)
+
+    # 只修改標題時回應仍包含原本的內容
+    response = api.put(f"/api/v1/notes/{note['id']}", json={"title": "改名的筆記"}, headers=storage_user)
+    assert response.status_code == 200, response.text
+    assert response.json()["content"] == old_content
+
+    response = api.put(f"/api/v1/notes/{note['id']}", json={"content": new_content}, headers=storage_user)
+    assert response.json()["content"] == new_content
+    assert _content_row(content_hash(old_content)) is None
+
+    results = api.get("/api/v1/notes/search", params={"q": new_content.split()[-1], "scope": "my"},
+                      headers=storage_user).json()
+    assert [result["title"] for result in results] == ["改名的筆記"]
+
+
+def test_large_contents_are_compressed(api, storage_user, monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION", "zlib")
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION_MIN_BYTES", 1024)
+    content = f"# 壓縮的筆記 {uuid.uuid4().hex}\n\n" + "重複的段落內容。" * 500
+    note = _create(api, storage_user, "很長的筆記", content)
+
+    row = _content_row(content_hash(content))
+    assert row.encoding == "zlib"
+    assert row.text is None
+    assert len(row.data) < row.size / 10
+    assert decode_content(row.encoding, row.text, row.data) == content
+
+    assert api.get(f"/api/v1/notes/{note['id']}").json()["content"] == content
+    summaries = api.get("/api/v1/notes/my", params={"view": "summary"}, headers=storage_user).json()
+    assert [item["excerpt"] for item in summaries if item["id"] == note["id"]] == [content[:200]]
+
+    # 小於門檻的內容仍以原文存放
+    small = f"短內容 {uuid.uuid4().hex}"
+    _create(api, storage_user, "短筆記", small)
+    assert _content_row(content_hash(small)).text == small
+
+
+def test_contents_stay_searchable_without_full_text_index(api, storage_user, monkeypatch):
+    from app.services import search
+
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION", "zlib")
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION_MIN_BYTES", 1024)
+    monkeypatch.setattr(settings, "SEARCH_FULL_TEXT", False)
+    monkeypatch.setitem(search._state, "enabled", False)
+    keyword = uuid.uuid4().hex
+    content = "重複的段落內容。" * 500 + keyword
+    _create(api, storage_user, "未壓縮的長筆記", content)
+
+    # ILIKE 比對原文，關鍵字在開頭片段之後也找得到
+    assert _content_row(content_hash(content)).encoding == "identity"
+    results = api.get("/api/v1/notes/search", params={"q": keyword, "scope": "my"}, headers=storage_user).json()
+    assert [result["title"] for result in results] == ["未壓縮的長筆記"]
+
+
+def test_default_compression_needs_no_optional_package():
+    # zstd 存放的內容在未安裝 zstandard 的行程無法讀取，預設使用標準函式庫的 zlib
+    assert type(settings).model_fields["NOTE_CONTENT_COMPRESSION"].default == "zlib"
+
+
+def test_zstd_falls_back_to_zlib_when_not_installed(monkeypatch):
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION", "zstd")
+    monkeypatch.setattr(note_content, "zstandard", None)
+    assert compression_codec() == "zlib"
+    # 不支援全文索引的資料庫以 ILIKE 搜尋原文，不壓縮
+    assert compression_codec("mysql") is None
+
+    monkeypatch.setattr(settings, "NOTE_CONTENT_COMPRESSION", "")
+    assert compression_codec() is None
+
+
+def test_metadata_queries_do_not_read_contents(client, count_queries, storage_user):
+    note = _create(client, storage_user, "中繼資料筆記", f"內容 {uuid.uuid4().hex}")
+    collection = client.post("/api/v1/collections/", json={"name": "中繼資料合集"}, headers=storage_user).json()
+
+    with count_queries() as counter:
+        assert client.get("/api/v1/notes/my", params={"view": "summary"}, headers=storage_user).status_code == 200
+        assert client.post(
+            f"/api/v1/collections/{collection['id']}/notes", json={"note_id": note["id"]}, headers=storage_user
+        ).status_code == 201
+
+    assert counter.count > 0
+    assert not any("note_contents" in statement for statement in counter.statements)
+
+
+def test_note_content_is_loaded_lazily(db_session, storage_user):
+    from app.database import SessionLocal
+
+    user = db_session.query(User).filter(User.username == "storage_user").one()
+    note = Note(title="延遲載入", content="延遲載入的內容", user_id=user.id)
+    db_session.add(note)
+    db_session.commit()
+
+    with SessionLocal() as db:
+        loaded = db.query(Note).filter(Note.id == note.id).one()
+        assert "body" not in loaded.__dict__
+        assert loaded.excerpt == "延遲載入的內容"
+        assert loaded.content == "延遲載入的內容"
+        assert "body" in loaded.__dict__
+
+
+def test_postgres_writes_lock_content_rows_against_concurrent_purge():
+    from types import SimpleNamespace
+    from sqlalchemy.dialects import postgresql
+    from app.models.note import purge_contents
+    from app.models.note_content import _insert_statement
+
+    # 已存在的內容以不改變資料的 UPDATE 鎖定到交易結束
+    insert_sql = str(_insert_statement("postgresql").compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (hash) DO UPDATE SET encoding = note_contents.encoding" in insert_sql
+
+    executed = []
+
+    def execute(statement):
+        executed.append(str(statement.compile(dialect=postgresql.dialect())))
+        return SimpleNamespace(rowcount=0)
+
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), execute=execute)
+    purge_contents(connection, ["b" * 64, "a" * 64, None])
+
+    # 刪除前先依雜湊順序鎖定內容列
+    assert executed[0].endswith("ORDER BY note_contents.hash FOR UPDATE")
+    assert executed[1].startswith("DELETE FROM note_contents")
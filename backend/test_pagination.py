@@ -0,0 +1,118 @@
+"""
+游標分頁測試 - 逐頁走訪、相同 created_at 不重複也不遺漏、最後一頁與無效游標
+"""
+import base64
+import json
+from datetime import datetime
+import pytest
+from app.core import create_access_token
+from app.core.pagination import encode_cursor, decode_cursor
+from app.models import User, Note, Collection
+
+NOTE_COUNT = 11
+COLLECTION_COUNT = 7
+
+
+@pytest.fixture(scope="module")
+def paged_user(db_session):
+    user = User(username="page_user", email="page_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.flush()
+
+    # 多筆資料共用同一個 created_at，分頁必須以 id 區分先後
+    same_time = datetime(2024, 1, 1, 12, 0, 0)
+    for i in range(NOTE_COUNT):
+        created_at = same_time if i % 2 == 0 else datetime(2024, 1, 1, 12, 0, i)
+        db_session.add(Note(title=f"分頁筆記 {i}", content="內容", user_id=user.id, created_at=created_at))
+    for i in range(COLLECTION_COUNT):
+        db_session.add(Collection(name=f"分頁合集 {i}", user_id=user.id, created_at=same_time))
+    db_session.commit()
+
+    token = create_access_token(data={"sub": user.username})
+    return {"user": user, "headers": {"Authorization": f"Bearer {token}"}}
+
+
+def _walk(client, url, headers, limit):
+    items = []
+    pages = 0
+    cursor = ""
+    while True:
+        response = client.get(url, params={"cursor": cursor, "limit": limit}, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages += 1
+        assert len(page["items"]) <= limit
+        items.extend(page["items"])
+        if page["next_cursor"] is None:
+            return items, pages
+        assert len(page["items"]) == limit
+        cursor = page["next_cursor"]
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/api/v1/notes/my", NOTE_COUNT),
+    ("/api/v1/collections/my", COLLECTION_COUNT),
+])
+@pytest.mark.parametrize("limit", [1, 3, 4, 50])
+def test_walking_pages_returns_every_row_once_in_order(client, paged_user, url, expected, limit):
+    items, pages = _walk(client, url, paged_user["headers"], limit)
+
+    ids = [item["id"] for item in items]
+    assert len(ids) == len(set(ids)) == expected
+    assert pages == max(-(-expected // limit), 1)
+
+    keys = [(item["created_at"], item["id"]) for item in items]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_public_feed_cursor_pages_do_not_overlap(client, paged_user):
+    first = client.get("/api/v1/notes/", params={"cursor": "", "limit": 5}).json()
+    second = client.get("/api/v1/notes/", params={"cursor": first["next_cursor"], "limit": 5}).json()
+
+    first_ids = {item["id"] for item in first["items"]}
+    second_ids = {item["id"] for item in second["items"]}
+    assert len(first_ids) == 5
+    assert not first_ids & second_ids
+
+
+def test_last_page_has_no_next_cursor(client, paged_user):
+    page = client.get(
+        "/api/v1/notes/my", params={"cursor": "", "limit": NOTE_COUNT}, headers=paged_user["headers"]
+    ).json()
+
+    assert len(page["items"]) == NOTE_COUNT
+    assert page["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_malformed_cursor_is_rejected(client, paged_user, cursor):
+    response = client.get("/api/v1/notes/my", params={"cursor": cursor}, headers=paged_user["headers"])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "無效的分頁游標"
+
+
+def _raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("payload", [
+    ["2024-01-01T00:00:00", 10 ** 30],
+    ["2024-01-01T00:00:00", -1],
+    ["2024-01-01T00:00:00", 1.5],
+    ["2024-01-01T00:00:00", True],
+    ["99999-01-01T00:00:00", 1],
+    ["2024-01-01T00:00:00+08:00", 1],
+    [20240101, 1],
+    {"created_at": "2024-01-01T00:00:00", "id": 1},
+])
+def test_out_of_range_cursor_is_rejected(client, paged_user, payload):
+    response = client.get("/api/v1/notes/my", params={"cursor": _raw_cursor(payload)}, headers=paged_user["headers"])
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "無效的分頁游標"
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
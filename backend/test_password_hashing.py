@@ -0,0 +1,64 @@
+"""
+密碼雜湊測試 - 工作池滿載時回傳 429，以及 bcrypt 成本變更後登入時重新雜湊
+"""
+import pytest
+from passlib.context import CryptContext
+from app.core.config import settings
+from app.core.security import password_hasher, pwd_context
+from app.models import User
+
+PASSWORD = "hash-test-password"
+
+
+@pytest.fixture(scope="module")
+def weak_hash_user(db_session):
+    # 以較低的成本建立雜湊，模擬調高 BCRYPT_ROUNDS 之前註冊的帳號
+    weak_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+    user = User(username="weak_hash_user", email="weak_hash_user@example.com",
+                hashed_password=weak_context.hash(PASSWORD))
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+def _login(client, username=None):
+    return client.post("/api/v1/auth/login", data={"username": username or "weak_hash_user", "password": PASSWORD})
+
+
+def test_login_rehashes_password_with_current_rounds(client, db_session, weak_hash_user):
+    old_hash = weak_hash_user.hashed_password
+    assert pwd_context.needs_update(old_hash)
+
+    response = _login(client)
+    assert response.status_code == 200, response.text
+
+    db_session.refresh(weak_hash_user)
+    new_hash = weak_hash_user.hashed_password
+    assert new_hash != old_hash
+    assert new_hash.split("$")[2] == f"{settings.BCRYPT_ROUNDS:02d}"
+    assert not pwd_context.needs_update(new_hash)
+
+    # 再次登入不需重新雜湊
+    assert _login(client).status_code == 200
+    db_session.refresh(weak_hash_user)
+    assert weak_hash_user.hashed_password == new_hash
+
+
+def test_full_hasher_returns_429_with_retry_after(client, weak_hash_user, monkeypatch):
+    monkeypatch.setattr(password_hasher, "capacity", 0)
+    rejected = password_hasher.stats()["rejected"]
+
+    response = _login(client)
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert response.json()["detail"] == "目前登入請求過多，請稍後再試"
+
+    stats = client.get("/metrics").json()["password_hasher"]
+    assert stats["rejected"] == rejected + 1
+    assert stats["in_flight"] == 0
+
+
+def test_in_flight_returns_to_zero_after_login(client, weak_hash_user):
+    assert _login(client).status_code == 200
+    assert password_hasher.stats()["in_flight"] == 0
@@ -0,0 +1,126 @@
+"""
+列表端點的 SQL 語句數量測試 - 確保不會退化成 N+1 查詢
+"""
+import pytest
+from app.core import create_access_token
+from app.models import User, Note, Collection, CollectionNote
+
+USER_COUNT = 5
+NOTES_PER_USER = 6
+COLLECTIONS_PER_USER = 5
+NOTES_PER_COLLECTION = 3
+
+
+@pytest.fixture(scope="module")
+def seeded(db_session):
+    """建立多位用戶的筆記與合集，回傳第一位用戶的認證標頭"""
+    users = []
+    for i in range(USER_COUNT):
+        user = User(
+            username=f"qc_user_{i}",
+            email=f"qc_user_{i}@example.com",
+            hashed_password="not-a-real-hash"
+        )
+        db_session.add(user)
+        users.append(user)
+    db_session.flush()
+
+    for user in users:
+        notes = [
+            Note(title=f"查詢計數 筆記 {j}", content=f"# 內容 {j}", user_id=user.id)
+            for j in range(NOTES_PER_USER)
+        ]
+        db_session.add_all(notes)
+        db_session.flush()
+
+        for j in range(COLLECTIONS_PER_USER):
+            collection = Collection(name=f"合集 {j}", user_id=user.id)
+            db_session.add(collection)
+            db_session.flush()
+            for position, note in enumerate(notes[:NOTES_PER_COLLECTION]):
+                db_session.add(CollectionNote(
+                    collection_id=collection.id,
+                    note_id=note.id,
+                    position=position
+                ))
+
+    db_session.commit()
+
+    token = create_access_token(data={"sub": users[0].username})
+    return {
+        "headers": {"Authorization": f"Bearer {token}"},
+        "collection_id": users[0].collections[0].id,
+    }
+
+
+def _query_count(client, count_queries, url, headers=None):
+    with count_queries() as counter:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.text
+    return counter.count, response.json()
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("/api/v1/notes/?limit={limit}", 1),
+    ("/api/v1/collections/?limit={limit}", 2),
+])
+def test_public_feeds_use_constant_queries(client, count_queries, seeded, url, expected):
+    small_count, small = _query_count(client, count_queries, url.format(limit=2))
+    large_count, large = _query_count(client, count_queries, url.format(limit=20))
+
+    assert len(small) == 2
+    assert len(large) == 20
+    assert small_count == large_count == expected
+
+
+def test_public_collections_include_owner_and_note_count(client, seeded):
+    collections = client.get("/api/v1/collections/?limit=20").json()
+
+    for collection in collections:
+        assert collection["owner_username"].startswith("qc_user_")
+        assert collection["note_count"] == NOTES_PER_COLLECTION
+
+
+def test_search_uses_constant_queries(client, count_queries, seeded):
+    count, notes = _query_count(client, count_queries, "/api/v1/notes/search?q=查詢計數")
+
+    assert len(notes) == USER_COUNT * NOTES_PER_USER
+    assert all(note["owner_username"] for note in notes)
+    assert count == 1
+
+
+def test_my_collections_use_constant_queries(client, count_queries, seeded):
+    # 認證查詢用戶 + 合集列表 + 分組計數
+    count, collections = _query_count(
+        client, count_queries, "/api/v1/collections/my", headers=seeded["headers"]
+    )
+
+    assert len(collections) == COLLECTIONS_PER_USER
+    assert count <= 3
+
+
+def test_collection_notes_use_constant_queries(client, count_queries, seeded):
+    # 合集 + 合集筆記（連同筆記與作者）
+    count, notes = _query_count(
+        client, count_queries, f"/api/v1/collections/{seeded['collection_id']}/notes"
+    )
+
+    assert len(notes) == NOTES_PER_COLLECTION
+    assert count == 2
+
+
+def test_authenticated_user_is_cached(client, count_queries, seeded):
+    from app.core import invalidate_user_cache
+    from app.core.deps import user_cache
+
+    user_id = client.get("/api/v1/auth/me", headers=seeded["headers"]).json()["id"]
+    invalidate_user_cache(user_id)
+
+    first_count, _ = _query_count(client, count_queries, "/api/v1/auth/me", headers=seeded["headers"])
+    hits = user_cache.hits
+    second_count, user = _query_count(client, count_queries, "/api/v1/auth/me", headers=seeded["headers"])
+
+    assert first_count == 1
+    assert second_count == 0
+    assert user_cache.hits == hits + 1
+    assert user["id"] == user_id
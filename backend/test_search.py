@@ -0,0 +1,104 @@
+"""
+全文搜尋測試 - 斷詞、查詢字串、索引同步與重建
+"""
+import pytest
+from sqlalchemy import text
+from app.core import create_access_token
+from app.models import User, Note
+from app.services import search
+from app.services.search import segment_text, build_match_query, configure_search
+
+
+def test_segment_text_splits_cjk_into_bigrams():
+    assert segment_text("機器學習") == "機器 器學 學習 習"
+    assert segment_text("學") == "學"
+    assert segment_text("Python3 筆記") == "python3 筆記 記"
+    assert segment_text("深度learning入門") == "深度 度 learning 入門 門"
+    assert segment_text(None) == ""
+
+
+def test_build_match_query_uses_phrases_and_prefix():
+    assert build_match_query("機器學習 pyth", "sqlite") == '"機器 器學 學習"* "pyth"*'
+    assert build_match_query("機器學習 pyth", "postgresql") == "(機器 <-> 器學 <-> 學習:*) & (pyth:*)"
+    assert build_match_query("學", "sqlite") == '"學"*'
+    assert build_match_query("  ！？ ", "sqlite") is None
+
+
+@pytest.fixture(scope="module")
+def search_user(client, db_session):
+    if not search.is_enabled():
+        pytest.skip("全文索引不可用（SQLite 未編譯 FTS5）")
+
+    user = User(username="search_user", email="search_user@example.com", hashed_password="not-a-real-hash")
+    db_session.add(user)
+    db_session.commit()
+    token = create_access_token(data={"sub": user.username})
+    return {"user": user, "headers": {"Authorization": f"Bearer {token}"}}
+
+
+def _search_titles(client, q, headers):
+    response = client.get("/api/v1/notes/search", params={"q": q, "scope": "my"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return [note["title"] for note in response.json()]
+
+
+def test_index_follows_note_updates_and_deletes(client, db_session, search_user):
+    headers = search_user["headers"]
+    note = Note(title="資料結構複習", content="鏈結串列與雜湊表", user_id=search_user["user"].id)
+    db_session.add(note)
+    db_session.commit()
+
+    assert _search_titles(client, "雜湊", headers) == ["資料結構複習"]
+    assert _search_titles(client, "資料結", headers) == ["資料結構複習"]
+
+    note.title = "演算法複習"
+    note.content = "動態規劃"
+    db_session.commit()
+
+    assert _search_titles(client, "雜湊", headers) == []
+    assert _search_titles(client, "動態", headers) == ["演算法複習"]
+
+    db_session.delete(note)
+    db_session.commit()
+
+    assert _search_titles(client, "動態", headers) == []
+
+
+def test_rebuild_command_adds_notes_written_while_disabled(client, db_session, search_user, monkeypatch, capsys):
+    from app.database import engine
+
+    # 模擬索引停用期間寫入的筆記：不經過索引同步
+    monkeypatch.setitem(search._state, "enabled", False)
+    db_session.add(Note(title="停用期間的筆記", content="離散數學", user_id=search_user["user"].id))
+    db_session.commit()
+    monkeypatch.setitem(search._state, "enabled", True)
+
+    assert _search_titles(client, "離散", search_user["headers"]) == []
+
+    assert search.main(["rebuild"]) == 0
+    assert "已重建全文索引" in capsys.readouterr().out
+    assert _search_titles(client, "離散", search_user["headers"]) == ["停用期間的筆記"]
+
+    with engine.connect() as connection:
+        indexed = connection.execute(text("SELECT count(*) FROM notes_fts")).scalar()
+        notes = connection.execute(text("SELECT count(*) FROM notes")).scalar()
+    assert indexed == notes
+
+
+def test_configure_search_only_sets_state(client, search_user, count_queries, monkeypatch):
+    from sqlalchemy import inspect
+    from app.core.config import settings
+    from app.database import engine
+
+    with count_queries() as counter:
+        monkeypatch.setattr(settings, "SEARCH_FULL_TEXT", False)
+        assert configure_search(engine) is False
+        assert not search.is_enabled()
+
+        monkeypatch.setattr(settings, "SEARCH_FULL_TEXT", True)
+        assert configure_search(engine) is True
+
+    # 啟動時不執行 DDL 或查詢，停用時也不刪除索引
+    assert counter.count == 0
+    assert inspect(engine).has_table("notes_fts")
+    assert _search_titles(client, "離散", search_user["headers"]) == ["停用期間的筆記"]
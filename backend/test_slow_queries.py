@@ -0,0 +1,125 @@
+"""
+慢查詢記錄測試 - 語句指紋、依指紋彙總、發出請求的路由與執行計畫的擷取
+"""
+from types import SimpleNamespace
+import pytest
+from app.core.slow_queries import SlowQueryLog, _explain_sql, fingerprint, normalize_statement
+
+
+def test_normalize_statement_collapses_literals_and_lists():
+    assert normalize_statement(
+        "SELECT * FROM notes\n  WHERE id IN (?, ?, ?) AND title = 'a''b' LIMIT 20"
+    ) == "SELECT * FROM notes WHERE id IN (?...) AND title = ? LIMIT ?"
+    assert fingerprint("SELECT * FROM notes WHERE id IN (1, 2)") == fingerprint(
+        "SELECT * FROM notes WHERE id IN (%(id_1)s, %(id_2)s, %(id_3)s)"
+    )
+    assert normalize_statement("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == \
+        "INSERT INTO t (a, b) VALUES (?...)..."
+    # 識別字中的數字不受影響
+    assert normalize_statement("SELECT notes_fts5.rowid FROM notes_fts5") == "SELECT notes_fts5.rowid FROM notes_fts5"
+    assert fingerprint("SELECT 1 FROM notes") != fingerprint("SELECT 1 FROM users")
+
+
+@pytest.fixture
+def slow_log(client):
+    """以極低門檻記錄測試資料庫的所有語句"""
+    from app.database import engine
+
+    log = SlowQueryLog(threshold_ms=1e-9, explain=True)
+    log.instrument(engine)
+    try:
+        yield log
+    finally:
+        log.remove(engine)
+
+
+def test_slow_queries_are_aggregated_with_route_and_plan(client, slow_log, count_queries, capsys):
+    with count_queries() as counter:
+        client.get("/api/v1/notes/?skip=3&limit=5")
+        client.get("/api/v1/notes/?skip=4&limit=5")
+
+    entries = slow_log.top()
+    # EXPLAIN 直接在 DBAPI 連線上執行，不計入請求的查詢數
+    assert sum(entry["count"] for entry in entries) == counter.count
+    feed = next(entry for entry in entries if "FROM notes" in entry["statement"] and "LIMIT ?" in entry["statement"])
+    assert feed["count"] == 2
+    assert feed["routes"] == {"GET /api/v1/notes/": 2}
+    assert feed["max_ms"] <= feed["total_ms"]
+    assert feed["plan"] and any("notes" in line for line in feed["plan"])
+    assert "慢查詢" in capsys.readouterr().out
+
+
+def test_statements_outside_requests_have_no_route(slow_log, db_session):
+    from sqlalchemy import text
+
+    db_session.execute(text("SELECT count(*) FROM users WHERE id > 0")).scalar()
+
+    entry = next(entry for entry in slow_log.top() if entry["statement"].startswith("SELECT count(*) FROM users"))
+    assert entry["routes"] == {"-": 1}
+    assert entry["statement"] == "SELECT count(*) FROM users WHERE id > ?"
+
+
+def test_least_costly_fingerprint_is_evicted():
+    log = SlowQueryLog(threshold_ms=1, max_fingerprints=2)
+    log.record("a", "SELECT a", (), 50.0, None)
+    log.record("b", "SELECT b", (), 5.0, None)
+    log.record("c", "SELECT c", (), 20.0, None)
+
+    assert [entry["fingerprint"] for entry in log.top()] == ["a", "c"]
+    assert log.stats()["evictions"] == 1
+    assert log.stats()["slow_statements"] == 3
+
+
+def test_slow_query_endpoint(client):
+    response = client.get("/metrics/slow-queries")
+
+    assert response.status_code == 200
+    assert response.json()["stats"]["enabled"] is False
+    assert "slow_queries" in client.get("/metrics").json()
+
+
+def test_explain_analyze_only_for_read_only_selects():
+    assert _explain_sql("postgresql", "SELECT * FROM notes").startswith("EXPLAIN (ANALYZE")
+    for statement in [
+        "WITH gone AS (DELETE FROM notes RETURNING id) SELECT count(*) FROM gone",
+        "SELECT * FROM note_contents WHERE hash = %(hash)s FOR UPDATE",
+        "SELECT * INTO notes_copy FROM notes",
+        "UPDATE notes SET title = %(title)s",
+    ]:
+        assert _explain_sql("postgresql", statement) == "EXPLAIN " + statement
+    assert _explain_sql("sqlite", "SELECT 1") == "EXPLAIN QUERY PLAN SELECT 1"
+
+
+class _RecordingCursor:
+    """記錄執行的語句；EXPLAIN 時拋出錯誤"""
+
+    def __init__(self, executed):
+        self.executed = executed
+
+    def execute(self, sql, parameters=None):
+        self.executed.append(sql)
+        if sql.startswith("EXPLAIN"):
+            raise RuntimeError("column does not exist")
+
+    def close(self):
+        pass
+
+
+def test_postgres_explain_runs_inside_savepoint(capsys):
+    executed = []
+    conn = SimpleNamespace(
+        dialect=SimpleNamespace(name="postgresql"),
+        connection=SimpleNamespace(cursor=lambda: _RecordingCursor(executed))
+    )
+    log = SlowQueryLog(threshold_ms=1, explain=True)
+
+    assert log._capture_plan(conn, "SELECT * FROM notes", {}, False) == []
+    # EXPLAIN 失敗後回復到 SAVEPOINT，請求的交易可以繼續使用
+    assert executed == [
+        "SAVEPOINT slow_query_explain",
+        "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM notes",
+        "ROLLBACK TO SAVEPOINT slow_query_explain",
+        "RELEASE SAVEPOINT slow_query_explain",
+    ]
+    assert log.explain_errors == 1
+    assert "擷取慢查詢的執行計畫失敗" in capsys.readouterr().out
@@ -24,6 +24,31 @@ export interface IntegrationResponse {
   created_at: string
 }
 
+export interface IntegrationJob {
+  job_id: string
+  collection_id: number
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  attempts: number
+  note_count: number
+  error?: string | null
+  result?: IntegrationResponse | null
+  created_at: string
+  updated_at: string
+}
+
+export interface CollectionNotesBatchResult {
+  succeeded: number
+  results: {
+    note_id: number
+    status: 'added' | 'removed' | 'already_in_collection' | 'not_in_collection' | 'not_found' | 'forbidden'
+  }[]
+}
+
+// 輪詢整合工作的間隔
+const INTEGRATION_POLL_INTERVAL_MS = 1500
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
 export const collectionsService = {
   async createCollection(collection: Collection) {
     const response = await api.post('/collections/', collection)
@@ -70,6 +95,21 @@ export const collectionsService = {
     await api.delete(`/collections/${collectionId}/notes/${noteId}`)
   },
 
+  // 一次請求添加多則筆記（依順序放到合集最後）
+  async addNotesToCollection(collectionId: number, noteIds: number[]): Promise<CollectionNotesBatchResult> {
+    const response = await api.post(`/collections/${collectionId}/notes:batch`, {
+      note_ids: noteIds
+    })
+    return response.data
+  },
+
+  async removeNotesFromCollection(collectionId: number, noteIds: number[]): Promise<CollectionNotesBatchResult> {
+    const response = await api.delete(`/collections/${collectionId}/notes:batch`, {
+      data: { note_ids: noteIds }
+    })
+    return response.data
+  },
+
   async reorderCollectionNotes(collectionId: number, noteIds: number[]) {
     const response = await api.put(`/collections/${collectionId}/notes/reorder`, {
       note_ids: noteIds
@@ -77,11 +117,35 @@ export const collectionsService = {
     return response.data
   },
 
+  // 移動單一筆記到 afterNoteId 之後（null 表示移到最前面），只更新這一筆
+  async moveCollectionNote(collectionId: number, noteId: number, afterNoteId: number | null) {
+    const response = await api.put(`/collections/${collectionId}/notes/${noteId}/position`, {
+      after_note_id: afterNoteId
+    })
+    return response.data
+  },
+
+  async getIntegrationJob(jobId: string): Promise<IntegrationJob> {
+    const response = await api.get(`/integrations/${jobId}`)
+    return response.data
+  },
+
+  // 建立整合工作並輪詢到完成，失敗時拋出帶有 detail 的錯誤（與其他 API 錯誤格式相同）
   async integrateCollectionNotes(
     collectionId: number,
     request: IntegrationRequest
   ): Promise<IntegrationResponse> {
     const response = await api.post(`/collections/${collectionId}/integrate`, request)
-    return response.data
+    let job: IntegrationJob = response.data
+
+    while (job.status === 'queued' || job.status === 'running') {
+      await sleep(INTEGRATION_POLL_INTERVAL_MS)
+      job = await this.getIntegrationJob(job.job_id)
+    }
+
+    if (job.status === 'failed' || !job.result) {
+      throw { response: { data: { detail: job.error || 'AI 整合失敗' } } }
+    }
+    return job.result
   },
 }